@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import chat, images
+from app.api.endpoints import admin, chat, chat_ws, images, metrics
 
 # Main API router that includes all endpoint routers
 api_router = APIRouter()
@@ -11,9 +11,30 @@ api_router.include_router(
     tags=["chat"]
 )
 
+# Include the chat WebSocket - concurrent queries over one long-lived connection
+api_router.include_router(
+    chat_ws.router,
+    prefix="/chat",
+    tags=["chat"]
+)
+
 # Include image endpoints - handles image generation and retrieval
 api_router.include_router(
     images.router, 
     prefix="/images", 
     tags=["images"]
-) 
\ No newline at end of file
+)
+
+# Include metrics endpoints - exposes runtime counters for monitoring
+api_router.include_router(
+    metrics.router,
+    prefix="/metrics",
+    tags=["metrics"]
+)
+
+# Include admin endpoints - query history and cache warming
+api_router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["admin"]
+)
@@ -0,0 +1,48 @@
+from fastapi import Header, HTTPException
+import hmac
+from starlette.requests import HTTPConnection
+from typing import TYPE_CHECKING, Optional
+from app.core import config
+
+if TYPE_CHECKING:
+    from app.services.crew_service import CrewService
+    from app.services.scheduler import QueryScheduler
+
+def get_crew_service(connection: HTTPConnection) -> "CrewService":
+    """
+    Dependency returning the CrewService created in the application lifespan.
+    
+    Takes the HTTPConnection so HTTP and WebSocket endpoints can both use it.
+    """
+    return connection.app.state.crew_service
+
+def get_scheduler(connection: HTTPConnection) -> "QueryScheduler":
+    """Dependency returning the QueryScheduler created in the application lifespan."""
+    return connection.app.state.scheduler
+
+def get_tenant(connection: HTTPConnection) -> str:
+    """
+    Dependency resolving the scheduler tenant of a request.
+    
+    Uses the X-API-Key header or an Authorization bearer token, falling back
+    to the X-Tenant-ID header.
+    """
+    api_key = connection.headers.get("x-api-key")
+    authorization = connection.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    return get_scheduler(connection).resolve_tenant(api_key, connection.headers.get("x-tenant-id"))
+
+def require_admin(x_admin_key: Optional[str] = Header(default=None)) -> None:
+    """
+    Dependency guarding admin endpoints with the X-Admin-Key header.
+    
+    Fails closed: admin endpoints (query history, replay, memory tracing,
+    profiling) are disabled until ADMIN_API_KEY is configured. The client
+    address is not trusted instead, since behind a local reverse proxy every
+    request comes from localhost.
+    """
+    if not config.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_API_KEY to enable them")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), config.ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Invalid or missing admin key")
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.api.deps import get_crew_service, get_scheduler, require_admin
+from app.core import config
+from app.services.crew_service import CrewService
+from app.services.memory_profiler import memory_profiler, sample_stacks
+from app.services.scheduler import QueryScheduler
+from typing import Dict, Any, List
+import asyncio
+import time
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+def _history(crew_service: CrewService):
+    if crew_service.query_history is None:
+        raise HTTPException(status_code=404, detail="Query history is disabled")
+    return crew_service.query_history
+
+@router.get("/history")
+async def get_history(
+    limit: int = Query(default=50, ge=1, le=1000),
+    crew_service: CrewService = Depends(get_crew_service)
+) -> Dict[str, Any]:
+    """
+    Return the latest recorded crew runs with their store statistics.
+
+    Each run holds its query, context, route, status, stage timings, token
+    usage, chart IDs and LLM cache counters.
+    """
+    history = _history(crew_service)
+    return {"stats": history.stats(), "runs": history.recent(limit)}
+
+@router.get("/history/top")
+async def get_top_queries(
+    limit: int = Query(default=10, ge=1, le=100),
+    days: float = Query(default=config.HISTORY_REPLAY_WINDOW_DAYS, gt=0),
+    crew_service: CrewService = Depends(get_crew_service)
+) -> List[Dict[str, Any]]:
+    """
+    Return the most frequent successful queries of the last `days` days.
+    """
+    return _history(crew_service).top_queries(limit, since=time.time() - days * 86400)
+
+@router.post("/replay", status_code=202)
+async def replay_top_queries(
+    limit: int = Query(default=10, ge=1, le=100),
+    parallelism: int = Query(default=config.HISTORY_REPLAY_PARALLELISM, ge=1, le=16),
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler)
+) -> Dict[str, Any]:
+    """
+    Replay the top `limit` historical queries in the background to warm caches.
+
+    Useful right after a deploy: the replayed runs refill the LLM completion
+    cache and exercise the chart render workers. Replays run in the rate
+    limiter's batch lane, behind interactive traffic, and take crew slots from the
+    scheduler at batch priority under the "replay" tenant. Poll GET /replay for
+    the outcome.
+
+    Raises:
+        HTTPException: 409 if a replay is already running
+    """
+    _history(crew_service)
+    if crew_service.start_replay(limit, scheduler, parallelism) is None:
+        raise HTTPException(status_code=409, detail="A replay is already running")
+    return {"status": "started", "limit": limit, "parallelism": parallelism}
+
+@router.get("/replay")
+async def get_replay_status(crew_service: CrewService = Depends(get_crew_service)) -> Dict[str, Any]:
+    """
+    Return whether a replay is running and the summary of the last one.
+    """
+    return crew_service.replay_status()
+
+@router.get("/memory")
+async def get_memory_report(
+    top: int = Query(default=20, ge=1, le=200),
+    objects: bool = Query(default=True, description="Count live agents, tasks, crews and figures (walks the heap)")
+) -> Dict[str, Any]:
+    """
+    Report process memory for leak hunting.
+
+    Includes RSS, tracemalloc totals and the source lines that grew most since
+    the last baseline, figures held open by pyplot, live CrewAI agent, task and
+    crew and Matplotlib figure counts, and garbage collector state.
+    """
+    return await asyncio.to_thread(memory_profiler.report, top, objects)
+
+@router.post("/memory/baseline")
+async def take_memory_baseline() -> Dict[str, Any]:
+    """
+    Start tracemalloc if needed and snapshot current allocations.
+
+    Later GET /memory reports show allocation growth since this baseline.
+    """
+    await asyncio.to_thread(memory_profiler.take_baseline)
+    return {"status": "baseline taken"}
+
+@router.post("/memory/tracing")
+async def set_memory_tracing(
+    enabled: bool = Query(...),
+    frames: int = Query(default=10, ge=1, le=100)
+) -> Dict[str, Any]:
+    """
+    Start or stop tracemalloc and per-run peak memory tracking on demand.
+    """
+    if enabled:
+        memory_profiler.start(tracemalloc_frames=frames)
+    else:
+        memory_profiler.stop()
+    return {"tracing": enabled, "run_tracking": memory_profiler.running}
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def sample_profile(
+    seconds: float = Query(default=5, gt=0, le=60),
+    interval: float = Query(default=0.01, ge=0.001, le=1),
+    idle: bool = Query(default=False, description="Include threads blocked waiting")
+) -> str:
+    """
+    Sample the stacks of every thread and return them in collapsed format.
+
+    The output matches `py-spy record --format raw` (one "frame;frame;... count"
+    line per stack) and can be rendered with flamegraph.pl or speedscope.
+    """
+    return await asyncio.to_thread(sample_stacks, seconds, interval, idle)
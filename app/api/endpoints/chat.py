@@ -1,17 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.schemas.chat import ChatRequest, ChatResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.api.deps import get_crew_service, get_scheduler, get_tenant
+from app.core import config
+from app.schemas.chat import BatchChatRequest, ChatRequest, ChatResponse
+from app.services.cancellation import CancellationToken, CrewCancelledError
 from app.services.crew_service import CrewService
+from app.services.rate_limiter import BATCH, LLMUnavailableError
+from app.services.scheduler import QueryScheduler, QueueRejectedError
+import asyncio
+import orjson
 import logging
-from typing import Dict, Any
+import statistics
+import time
+from typing import Dict, Any, AsyncIterator
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-crew_service = CrewService()
+
+async def cancel_on_disconnect(http_request: Request, cancel_token: CancellationToken) -> None:
+    """
+    Cancel a crew run as soon as the client that requested it disconnects.
+    
+    Args:
+        http_request: The incoming HTTP request to watch
+        cancel_token: The token passed to the crew run
+    """
+    while not cancel_token.cancelled:
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, cancelling crew run")
+            cancel_token.cancel("client disconnected")
+            return
+        await asyncio.sleep(config.DISCONNECT_POLL_INTERVAL)
+
+def queue_rejected(e: QueueRejectedError) -> HTTPException:
+    """The 429 response for a request the scheduler did not admit."""
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, int(e.retry_after))), "X-Queue-Wait-Ms": str(e.wait_ms)}
+    )
+
+def build_chat_response(result: Dict[str, Any]) -> ChatResponse:
+    """Construct the API response from a crew_service result."""
+    return ChatResponse(
+        response=result["result"],
+        images=result.get("images", []),
+        session_id=result.get("session_id")
+    )
 
 @router.post("/query", response_model=ChatResponse)
-async def chat_query(request: ChatRequest) -> ChatResponse:
+async def chat_query(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler),
+    tenant: str = Depends(get_tenant)
+) -> ChatResponse:
     """
     Process a natural language query using multiple AI agents working together.
     
@@ -25,30 +73,312 @@ async def chat_query(request: ChatRequest) -> ChatResponse:
     Returns:
         A response containing the AI-generated answer and any visualization images
         
+    If the client disconnects while the crew is running, the crew is cancelled
+    at its next step boundary so it stops spending tokens and frees its worker.
+    
+    The run waits for its turn in the query scheduler, in the caller's tenant
+    queue; the time spent waiting is returned in the X-Queue-Wait-Ms header.
+    
     Raises:
-        HTTPException: If there's an error processing the query
+        HTTPException: If there's an error processing the query, or 429 if the
+            scheduler rejects it
     """
+    cancel_token = CancellationToken()
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, cancel_token))
     try:
         logger.info(f"Received chat query: {request.query}")
         
-        # Process the query using CrewAI agents
-        result = await crew_service.process_query_with_crew(request.query, request.context)
+        # Start a new conversation session unless the client continues one
+        session_id = request.session_id or crew_service.session_store.new_session_id()
         
-        # Debug logging to track result structure
-        logger.debug(f"Result from crew_service: {result}")
+        # Process the query using CrewAI agents once the scheduler admits it
+        async with scheduler.slot(tenant, cancel_token=cancel_token) as ticket:
+            response.headers["X-Queue-Wait-Ms"] = str(ticket.wait_ms)
+            result = await crew_service.process_query_with_crew(
+                request.query,
+                request.context,
+                cancel_token=cancel_token,
+                session_id=session_id,
+                chart_format=request.chart_format,
+                inline_thumbnails=request.inline_thumbnails,
+                route="query"
+            )
+            ticket.charge(result)
         
-        # Construct response with text and any generated images
-        response = ChatResponse(
-            response=result["result"],
-            images=result.get("images", [])
-        )
+        # Debug logging to track result structure
+        logger.debug("Result from crew_service: %s", result)
         
         logger.info(f"Successfully processed query and returning response")
-        return response
+        # Construct response with text and any generated images
+        return build_chat_response(result)
         
+    except QueueRejectedError as e:
+        logger.warning(f"Chat query of tenant {tenant} rejected: {str(e)}")
+        raise queue_rejected(e)
+    except CrewCancelledError as e:
+        logger.info(f"Chat query cancelled: {str(e)}")
+        raise HTTPException(
+            status_code=499,
+            detail="Client closed request"
+        )
+    except LLMUnavailableError as e:
+        logger.warning(f"LLM unavailable for chat query: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"LLM temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
     except Exception as e:
         logger.error(f"Error processing chat query: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process query: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+    finally:
+        watcher.cancel()
+
+@router.post("/query/stream")
+async def chat_query_stream(
+    request: ChatRequest,
+    http_request: Request,
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler),
+    tenant: str = Depends(get_tenant)
+) -> StreamingResponse:
+    """
+    Process a chat query and stream its progress as NDJSON.
+    
+    Emits `status` and `step`/`tool` lines while the agents work, an `image`
+    line as soon as each chart is created, and finally a `result` line holding
+    the ChatResponse (or an `error` line). Lets clients render progressively
+    instead of blocking on a single long request.
+    
+    The stream starts once the query scheduler admits the run, with the time
+    spent queued in the X-Queue-Wait-Ms header.
+    
+    Args:
+        request: The chat request containing the query and optional context
+        
+    Returns:
+        A streaming NDJSON response
+        
+    Raises:
+        HTTPException: 429 if the scheduler rejects the query
+    """
+    logger.info(f"Received streaming chat query: {request.query}")
+    session_id = request.session_id or crew_service.session_store.new_session_id()
+    cancel_token = CancellationToken()
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, cancel_token))
+    try:
+        ticket = await scheduler.acquire(tenant, cancel_token=cancel_token)
+    except QueueRejectedError as e:
+        watcher.cancel()
+        logger.warning(f"Streaming chat query of tenant {tenant} rejected: {str(e)}")
+        raise queue_rejected(e)
+    except CrewCancelledError:
+        watcher.cancel()
+        raise HTTPException(status_code=499, detail="Client closed request")
+    
+    def close_run() -> None:
+        cancel_token.cancel("stream closed")
+        watcher.cancel()
+        scheduler.release(ticket)
+    
+    async def events() -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def on_event(event: Dict[str, Any]) -> None:
+            # Called from the crew's worker thread
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        
+        async def scheduled_run() -> Dict[str, Any]:
+            # The slot is held until the crew has actually stopped, and its
+            # tokens are charged before the slot is given back
+            try:
+                result = await crew_service.process_query_with_crew(
+                    request.query,
+                    request.context,
+                    cancel_token=cancel_token,
+                    session_id=session_id,
+                    on_event=on_event,
+                    chart_format=request.chart_format,
+                    inline_thumbnails=request.inline_thumbnails,
+                    route="stream"
+                )
+                ticket.charge(result)
+                return result
+            finally:
+                scheduler.release(ticket)
+        
+        run = asyncio.create_task(scheduled_run())
+        run.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+        
+        try:
+            yield orjson.dumps({"type": "status", "message": "Analyzing your question", "session_id": session_id}) + b"\n"
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                if event.get("type") == "artifact" and event.get("kind") == "image":
+                    image = crew_service.image_info(
+                        event["id"], spec=event.get("spec"), inline_thumbnail=request.inline_thumbnails
+                    )
+                    event = {"type": "image", "title": event.get("title"), "image": image.model_dump()}
+                yield orjson.dumps(event) + b"\n"
+            
+            try:
+                result = run.result()
+                yield orjson.dumps({"type": "result", "response": build_chat_response(result).model_dump()}) + b"\n"
+            except CrewCancelledError:
+                logger.info("Streaming chat query cancelled")
+            except Exception as e:
+                logger.error(f"Error processing streaming chat query: {str(e)}", exc_info=True)
+                yield orjson.dumps({"type": "error", "detail": f"Failed to process query: {str(e)}"}) + b"\n"
+        finally:
+            cancel_token.cancel("stream closed")
+            watcher.cancel()
+    
+    # Also releases the slot after the response if the stream never started the run
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"X-Queue-Wait-Ms": str(ticket.wait_ms)},
+        background=BackgroundTask(close_run)
+    )
+
+@router.post("/batch")
+async def chat_batch(
+    request: BatchChatRequest,
+    http_request: Request,
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler),
+    tenant: str = Depends(get_tenant)
+) -> StreamingResponse:
+    """
+    Process many chat queries concurrently for bulk report generation.
+    
+    Requests are scheduled across the crew worker pool with at most
+    `max_parallelism` running at once, all sharing the service's LLM cache and
+    rate limiter (in its batch lane, behind interactive queries). Each item
+    also queues in the query scheduler at batch priority, so interactive
+    queries of any tenant go first and the batch gets only its tenant's share.
+    Results are streamed back as NDJSON in completion order: one `item` line
+    per request with its `queue_wait_ms`, followed by a final `summary` line
+    with aggregated timing statistics.
+    
+    Args:
+        request: The batch of chat requests and optional parallelism limit
+        
+    Returns:
+        A streaming NDJSON response
+        
+    Raises:
+        HTTPException: If the batch exceeds BATCH_MAX_ITEMS
+    """
+    if len(request.requests) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.requests)} items (max {config.BATCH_MAX_ITEMS})"
+        )
+    
+    parallelism = min(
+        request.max_parallelism or config.BATCH_DEFAULT_PARALLELISM,
+        config.BATCH_MAX_PARALLELISM
+    )
+    logger.info(f"Received batch of {len(request.requests)} queries (parallelism {parallelism})")
+    
+    return StreamingResponse(
+        stream_batch(crew_service, request.requests, parallelism, http_request, scheduler, tenant),
+        media_type="application/x-ndjson"
+    )
+
+async def stream_batch(
+    crew_service: CrewService, requests: list, parallelism: int, http_request: Request,
+    scheduler: QueryScheduler, tenant: str
+) -> AsyncIterator[bytes]:
+    """
+    Run a batch of chat requests and yield one NDJSON line per completed item.
+    
+    Args:
+        crew_service: The service running the crew for each request
+        requests: The chat requests to process
+        parallelism: Maximum number of concurrent crew runs
+        http_request: The incoming HTTP request, watched for disconnects
+        scheduler: The query scheduler admitting each item's run
+        tenant: The scheduler tenant of the batch
+    """
+    cancel_token = CancellationToken()
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, cancel_token))
+    semaphore = asyncio.Semaphore(parallelism)
+    batch_start = time.perf_counter()
+    
+    async def run_item(index: int, item: ChatRequest) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            queue_wait_ms = 0.0
+            try:
+                async with scheduler.slot(tenant, BATCH, cancel_token) as ticket:
+                    queue_wait_ms = ticket.wait_ms
+                    result = await crew_service.process_query_with_crew(
+                        item.query,
+                        item.context,
+                        cancel_token=cancel_token,
+                        priority=BATCH,
+                        session_id=item.session_id,
+                        chart_format=item.chart_format,
+                        inline_thumbnails=item.inline_thumbnails,
+                        route="batch"
+                    )
+                    ticket.charge(result)
+                line = {
+                    "type": "item",
+                    "index": index,
+                    "status": "ok",
+                    "response": build_chat_response(result).model_dump(mode="json")
+                }
+            except CrewCancelledError:
+                raise
+            except QueueRejectedError as e:
+                logger.warning(f"Batch item {index} of tenant {tenant} rejected: {str(e)}")
+                queue_wait_ms = e.wait_ms
+                line = {"type": "item", "index": index, "status": "rejected", "error": str(e)}
+            except Exception as e:
+                logger.error(f"Error processing batch item {index}: {str(e)}", exc_info=True)
+                line = {"type": "item", "index": index, "status": "error", "error": str(e)}
+            line["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            line["queue_wait_ms"] = queue_wait_ms
+            return line
+    
+    tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(requests)]
+    durations = []
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            durations.append(line["elapsed_ms"])
+            if line["status"] != "ok":
+                failed += 1
+            yield orjson.dumps(line) + b"\n"
+        
+        durations.sort()
+        yield orjson.dumps({
+            "type": "summary",
+            "total": len(requests),
+            "succeeded": len(requests) - failed,
+            "failed": failed,
+            "max_parallelism": parallelism,
+            "wall_time_ms": round((time.perf_counter() - batch_start) * 1000, 1),
+            "mean_ms": round(statistics.fmean(durations), 1),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1]
+        }) + b"\n"
+    except CrewCancelledError:
+        logger.info("Batch cancelled: client disconnected")
+    finally:
+        # Stop every outstanding crew run if the client went away mid-batch
+        cancel_token.cancel("batch finished or client disconnected")
+        watcher.cancel()
+        for task in tasks:
+            task.cancel()
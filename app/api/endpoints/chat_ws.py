@@ -0,0 +1,285 @@
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.api.deps import get_crew_service, get_scheduler, get_tenant
+from app.api.endpoints.chat import build_chat_response
+from app.core import config
+from app.schemas.chat import ChatRequest
+from app.services.cancellation import CancellationToken, CrewCancelledError
+from app.services.crew_service import CrewService
+from app.services.rate_limiter import LLMUnavailableError
+from app.services.scheduler import QueryScheduler, QueueRejectedError
+import asyncio
+import orjson
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Frames that may be dropped when the client reads too slowly; results,
+# images and errors are always delivered
+DROPPABLE_FRAMES = {"step", "tool", "ping"}
+
+class ChatConnection:
+    """
+    One WebSocket connection multiplexing concurrent chat queries.
+
+    Every query frame carries a client-chosen correlation `id`; all frames sent
+    back for that query repeat it. Outgoing frames go through one bounded
+    queue drained by a single sender, so a slow client cannot make the server
+    buffer without limit: progress frames are dropped when the queue is full
+    (counted in the query's result frame), while result, image and error
+    frames wait for room, which pauses the queries producing them. Each query
+    waits for its turn in the query scheduler under the connection's tenant.
+    """
+
+    def __init__(self, websocket: WebSocket, crew_service: CrewService, scheduler: QueryScheduler, tenant: str):
+        self.websocket = websocket
+        self.crew_service = crew_service
+        self.scheduler = scheduler
+        self.tenant = tenant
+        self.loop = asyncio.get_running_loop()
+        self.outgoing: asyncio.Queue = asyncio.Queue(maxsize=config.WS_SEND_QUEUE_SIZE)
+        self.queries: Dict[str, asyncio.Task] = {}
+        self.tokens: Dict[str, CancellationToken] = {}
+        self.dropped: Dict[str, int] = {}
+        # Image frames of each query still waiting for room in the queue
+        self.pending: Dict[str, List[asyncio.Task]] = {}
+        self.last_received = time.monotonic()
+        # Done once the connection ends; frames sent after that are discarded
+        self.closed: asyncio.Future = self.loop.create_future()
+
+    async def serve(self) -> None:
+        """Run the connection until the client disconnects or stops answering."""
+        receiver = asyncio.create_task(self.receive_frames())
+        sender = asyncio.create_task(self.send_frames())
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            done, _ = await asyncio.wait({receiver, sender, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if heartbeat in done:
+                logger.info("WebSocket client silent for %.0fs, closing", config.WS_HEARTBEAT_TIMEOUT)
+                await self.websocket.close(code=1001, reason="heartbeat timeout")
+            for task in done:
+                error = task.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    logger.error(f"WebSocket connection failed: {str(error)}", exc_info=error)
+        finally:
+            logger.info("WebSocket connection closed with %d queries in flight", len(self.queries))
+            self.closed.set_result(None)
+            for token in list(self.tokens.values()):
+                token.cancel("connection closed")
+            pending = [task for tasks in self.pending.values() for task in tasks]
+            for task in [*pending, receiver, sender, heartbeat]:
+                task.cancel()
+            # Runs stop at their next cancellation check; waiting for them (with
+            # asyncio.wait, which does not cancel them if this task is cancelled)
+            # keeps their scheduler slots held until the crews have actually stopped
+            if self.queries:
+                await asyncio.wait(list(self.queries.values()))
+
+    async def receive_frames(self) -> None:
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            self.last_received = time.monotonic()
+            if message.get("text") is None:
+                await self.send({"type": "error", "id": None, "detail": "Frames must be JSON text, not binary"})
+                continue
+            await self.handle(message["text"])
+
+    async def handle(self, message: str) -> None:
+        """Dispatch one client frame."""
+        try:
+            frame = orjson.loads(message)
+        except orjson.JSONDecodeError:
+            await self.send({"type": "error", "id": None, "detail": "Frames must be JSON objects"})
+            return
+        if not isinstance(frame, dict):
+            await self.send({"type": "error", "id": None, "detail": "Frames must be JSON objects"})
+            return
+        frame_type = frame.get("type")
+        query_id = frame.get("id")
+        if frame_type == "ping":
+            await self.send({"type": "pong", "ts": frame.get("ts")})
+        elif frame_type == "pong":
+            pass
+        elif frame_type == "cancel":
+            token = self.tokens.get(query_id)
+            if token is None:
+                await self.send({"type": "error", "id": query_id, "detail": "No such query in flight"})
+            else:
+                token.cancel("cancelled by client")
+        elif frame_type == "query":
+            await self.start_query(query_id, frame)
+        else:
+            await self.send({"type": "error", "id": query_id, "detail": f"Unknown frame type: {frame_type}"})
+
+    async def start_query(self, query_id: Any, frame: Dict[str, Any]) -> None:
+        if not isinstance(query_id, str) or not query_id:
+            await self.send({"type": "error", "id": query_id, "detail": "Query frames need a string id"})
+            return
+        if query_id in self.queries:
+            await self.send({"type": "error", "id": query_id, "detail": "A query with this id is already in flight"})
+            return
+        if len(self.queries) >= config.WS_MAX_INFLIGHT_QUERIES:
+            await self.send({
+                "type": "error",
+                "id": query_id,
+                "detail": f"Too many queries in flight (max {config.WS_MAX_INFLIGHT_QUERIES})"
+            })
+            return
+        try:
+            request = ChatRequest(**{key: value for key, value in frame.items() if key not in ("type", "id")})
+        except ValidationError as e:
+            await self.send({"type": "error", "id": query_id, "detail": f"Invalid query: {e.errors()}"})
+            return
+
+        logger.info(f"Received WebSocket chat query {query_id}: {request.query}")
+        token = CancellationToken()
+        self.tokens[query_id] = token
+        self.dropped[query_id] = 0
+        self.pending[query_id] = []
+        self.queries[query_id] = asyncio.create_task(self.run_query(query_id, request, token))
+
+    async def run_query(self, query_id: str, request: ChatRequest, token: CancellationToken) -> None:
+        """Run one query, sending its progress and final frames."""
+        session_id = request.session_id or self.crew_service.session_store.new_session_id()
+
+        def on_event(event: Dict[str, Any]) -> None:
+            # Called from the crew's worker thread
+            self.loop.call_soon_threadsafe(self.forward_event, query_id, request, event)
+
+        try:
+            await self.send({"type": "accepted", "id": query_id, "session_id": session_id})
+            async with self.scheduler.slot(self.tenant, cancel_token=token) as ticket:
+                result = await self.crew_service.process_query_with_crew(
+                    request.query,
+                    request.context,
+                    cancel_token=token,
+                    session_id=session_id,
+                    on_event=on_event,
+                    chart_format=request.chart_format,
+                    inline_thumbnails=request.inline_thumbnails,
+                    route="websocket"
+                )
+                ticket.charge(result)
+            # Charts created during the run are announced before the result
+            await asyncio.gather(*self.pending.get(query_id, []))
+            await self.send({
+                "type": "result",
+                "id": query_id,
+                "response": build_chat_response(result).model_dump(mode="json"),
+                "dropped_progress": self.dropped.get(query_id, 0),
+                "queue_wait_ms": ticket.wait_ms
+            })
+        except QueueRejectedError as e:
+            logger.warning(f"WebSocket chat query {query_id} of tenant {self.tenant} rejected: {str(e)}")
+            await self.send({
+                "type": "error",
+                "id": query_id,
+                "detail": str(e),
+                "retry_after": max(1, int(e.retry_after))
+            })
+        except CrewCancelledError:
+            logger.info(f"WebSocket chat query {query_id} cancelled")
+            await self.send({"type": "cancelled", "id": query_id})
+        except LLMUnavailableError as e:
+            logger.warning(f"LLM unavailable for WebSocket chat query {query_id}: {str(e)}")
+            await self.send({
+                "type": "error",
+                "id": query_id,
+                "detail": f"LLM temporarily unavailable: {str(e)}",
+                "retry_after": max(1, int(e.retry_after))
+            })
+        except Exception as e:
+            logger.error(f"Error processing WebSocket chat query {query_id}: {str(e)}", exc_info=True)
+            await self.send({"type": "error", "id": query_id, "detail": f"Failed to process query: {str(e)}"})
+        finally:
+            self.queries.pop(query_id, None)
+            self.tokens.pop(query_id, None)
+            self.dropped.pop(query_id, None)
+            self.pending.pop(query_id, None)
+
+    def forward_event(self, query_id: str, request: ChatRequest, event: Dict[str, Any]) -> None:
+        """Queue a progress event of a query (runs on the event loop)."""
+        if self.closed.done() or query_id not in self.queries:
+            return
+        if event.get("type") == "artifact" and event.get("kind") == "image":
+            image = self.crew_service.image_info(
+                event["id"], spec=event.get("spec"), inline_thumbnail=request.inline_thumbnails
+            )
+            event = {"type": "image", "title": event.get("title"), "image": image.model_dump(mode="json")}
+        frame = {**event, "id": query_id}
+        if frame["type"] in DROPPABLE_FRAMES:
+            self.offer(frame, query_id)
+        else:
+            self.pending[query_id].append(asyncio.create_task(self.send(frame)))
+
+    def offer(self, frame: Dict[str, Any], query_id: Optional[str] = None) -> None:
+        """Queue a frame unless the queue is full, counting what is dropped."""
+        try:
+            self.outgoing.put_nowait(frame)
+        except asyncio.QueueFull:
+            if query_id in self.dropped:
+                self.dropped[query_id] += 1
+
+    async def send(self, frame: Dict[str, Any]) -> None:
+        """Queue a frame that must be delivered, waiting while the queue is full."""
+        if self.closed.done():
+            return
+        try:
+            self.outgoing.put_nowait(frame)
+            return
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(self.outgoing.put(frame))
+        try:
+            # Nothing drains the queue once the connection is closed
+            await asyncio.wait({put, self.closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            put.cancel()
+
+    async def send_frames(self) -> None:
+        while True:
+            frame = await self.outgoing.get()
+            await self.websocket.send_text(orjson.dumps(frame).decode())
+
+    async def heartbeat(self) -> None:
+        """Ping the client periodically and close connections that went silent."""
+        while True:
+            await asyncio.sleep(config.WS_HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_received > config.WS_HEARTBEAT_TIMEOUT:
+                return
+            self.offer({"type": "ping", "ts": time.time()})
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler),
+    tenant: str = Depends(get_tenant)
+) -> None:
+    """
+    Chat over one long-lived WebSocket connection with concurrent queries.
+
+    Client frames (JSON text):
+    - `{"type": "query", "id": "<correlation id>", ...ChatRequest fields}`
+    - `{"type": "cancel", "id": "<correlation id>"}`
+    - `{"type": "ping"}` (answered with `pong`) and `{"type": "pong"}`
+    Binary and malformed frames are answered with an `error` frame.
+
+    Server frames carry the query's `id`: `accepted` (with the session ID),
+    `step` and `tool` progress, `image` for each chart as soon as it exists,
+    then exactly one of `result` (the ChatResponse, with the time the query
+    waited for the scheduler in `queue_wait_ms`), `cancelled` or `error`.
+    The scheduler tenant comes from the handshake's X-API-Key, Authorization
+    or X-Tenant-ID header.
+    The server sends `ping` frames every WS_HEARTBEAT_INTERVAL seconds and
+    closes connections that sent nothing for WS_HEARTBEAT_TIMEOUT seconds.
+    Closing the connection cancels every query still in flight.
+    """
+    await websocket.accept()
+    await ChatConnection(websocket, crew_service, scheduler, tenant).serve()
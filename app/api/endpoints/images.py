@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse, FileResponse
 from typing import List
+import json
 import os
-from pydantic import BaseModel
 import time
+from app.schemas.chat import ImageInfo
 
 router = APIRouter()
 
@@ -16,26 +17,31 @@ BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 if BASE_URL.endswith("/api/v1"):
     BASE_URL = BASE_URL[:-7]
 
-class ImageInfo(BaseModel):
-    id: str
-    url: str
-
 @router.get("/{image_id}", response_model=ImageInfo)
 async def get_image_info(image_id: str, request: Request):
     """
     Get information about a specific image by ID.
     
-    Returns the image ID and URL that can be used to display the image.
+    Returns the image ID and URL that can be used to display the image, and
+    its Vega-Lite spec when the chart was also exported for client rendering.
     """
     image_path = os.path.join(IMAGES_DIR, f"{image_id}.png")
+    vega_lite_path = os.path.join(IMAGES_DIR, f"{image_id}.vl.json")
+    has_png = os.path.exists(image_path)
     
-    if not os.path.exists(image_path):
+    if not has_png and not os.path.exists(vega_lite_path):
         raise HTTPException(status_code=404, detail="Image not found")
     
+    vega_lite = None
+    if os.path.exists(vega_lite_path):
+        with open(vega_lite_path) as f:
+            vega_lite = json.load(f)
+    
     # 優先返回直接訪問 URL，這是最可靠的方式
     return ImageInfo(
         id=image_id,
-        url=f"{BASE_URL}/api/v1/images/direct/{image_id}?t={int(time.time())}"
+        url=f"{BASE_URL}/api/v1/images/direct/{image_id}?t={int(time.time())}" if has_png else None,
+        vega_lite=vega_lite
     )
 
 @router.get("/", response_model=List[ImageInfo])
@@ -157,8 +163,7 @@ async def test_image_access(image_id: str, request: Request):
         "file_size": file_size,
         "base_url": BASE_URL,
         "image_url": image_url,
-        "image_url_with_timestamp": f"{image_url}?t={int(time.time())}",
-        "request_headers": dict(request.headers)
+        "image_url_with_timestamp": f"{image_url}?t={int(time.time())}"
     } 
 
 @router.get("/direct/{image_id}")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+from app.api.deps import get_crew_service, get_scheduler
+from app.core import config
+from app.services.crew_service import CrewService
+from app.services.scheduler import QueryScheduler
+from app.tools.compute_pool import compute_pool_stats
+from app.tools.render_pool import render_pool_stats
+from typing import Dict, Any
+
+router = APIRouter()
+
+@router.get("/")
+async def get_metrics(
+    crew_service: CrewService = Depends(get_crew_service),
+    scheduler: QueryScheduler = Depends(get_scheduler)
+) -> Dict[str, Any]:
+    """
+    Return runtime metrics for monitoring.
+    
+    Includes the LLM rate limiter's queue depth per priority lane,
+    throttle and retry counters, circuit breaker state, and LLM completion
+    cache hit/miss counters, conversation session counts, chart render
+    and compute pool sizes, query history writer counters, metadata
+    catalog size and retrieval latency, the query scheduler's queue depth,
+    wait times and quota usage per tenant, and each crew role's model
+    settings (without API keys).
+    """
+    return {
+        "llm_rate_limiter": crew_service.rate_limiter.snapshot(),
+        "llm_cache": crew_service.llm_cache.stats() if crew_service.llm_cache else None,
+        "sessions": crew_service.session_store.stats(),
+        "chart_render_pool": render_pool_stats(),
+        "compute_pool": compute_pool_stats(),
+        "query_history": crew_service.query_history.stats() if crew_service.query_history else None,
+        "metadata_catalog": crew_service.metadata_catalog.stats(),
+        "scheduler": scheduler.stats(),
+        "llm_roles": {role: settings.public() for role, settings in config.LLM_ROLES.items()}
+    }
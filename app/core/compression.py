@@ -0,0 +1,125 @@
+"""
+Response compression middleware.
+
+Compresses complete responses with brotli (when the optional `brotli` package
+is installed and the client accepts it) or gzip, once they reach a minimum
+size. Streamed responses (NDJSON progress, batch results, files) are passed
+through untouched, so their lines reach the client as soon as they are
+written instead of waiting in a compressor buffer, and already compressed
+content such as PNG charts is never compressed again.
+"""
+
+import gzip
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Content types that are compressed
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def _accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings the client accepts, ignoring those it rejects with q=0."""
+    encodings = []
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.append(name.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of at least `minimum_size` bytes."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope: Scope) -> Optional[str]:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether the
+                # response is complete and large enough to be worth compressing
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = Headers(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+                or len(body) < self.minimum_size
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            response_headers = MutableHeaders(raw=start["headers"])
+            response_headers["Content-Encoding"] = encoding
+            response_headers["Content-Length"] = str(len(compressed))
+            response_headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,168 @@
+"""
+Application configuration loaded from environment variables.
+"""
+
+import os
+from dotenv import load_dotenv
+
+from app.core.llm_roles import load_role_configs
+from app.core.tenants import load_tenant_policies
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between client-disconnect checks while a crew run is in flight
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# Client-side LLM rate limiting shared by every agent created by CrewService
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+# Longest a call may wait in the limiter queue before failing with 503
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+# Retries with jittered exponential backoff on rate-limit and transient errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Consecutive failed calls that open the circuit, and how long it stays open
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Memoization of low-temperature LLM completions in a local SQLite store
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "llm_cache.sqlite3")
+)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Completions are only cached when the sampling temperature is at most this
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))
+# Comma-separated roles that never use the cache (planner, manager, analyst)
+LLM_CACHE_DISABLED_ROLES = {
+    role.strip() for role in os.getenv("LLM_CACHE_DISABLED_ROLES", "").split(",") if role.strip()
+}
+
+# Model, token limit, timeout, concurrency and backend of each crew role, from
+# LLM_*, LLM_<ROLE>_* variables and the optional LLM_ROLES_FILE (see llm_roles.py)
+LLM_ROLES = load_role_configs()
+
+# Batch query endpoint: default and maximum concurrent crew runs per batch
+BATCH_DEFAULT_PARALLELISM = int(os.getenv("BATCH_DEFAULT_PARALLELISM", "4"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# Server-side conversation sessions
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "10"))
+# Upper bound on the conversation summary fed into each crew run
+SESSION_SUMMARY_MAX_CHARS = int(os.getenv("SESSION_SUMMARY_MAX_CHARS", "2000"))
+
+# Load CrewAI and the chart renderer (font cache, first render) during startup
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Pre-warmed chart rendering processes (0 renders charts in-process)
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "0"))
+# Seconds to wait for a render worker before rendering in-process instead
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+
+# Chart output: "png" (rendered on the server), "vega_lite" (a spec rendered
+# by the client) or "both"; clients can override it per request
+CHART_OUTPUT = os.getenv("CHART_OUTPUT", "png").lower()
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli is used when the optional brotli package is installed
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Requests with inline_thumbnails get each chart downscaled to at most
+# THUMBNAIL_MAX_PIXELS on its longer side and inlined as base64, when the
+# thumbnail PNG is at most INLINE_THUMBNAIL_MAX_BYTES (0 disables inlining)
+THUMBNAIL_MAX_PIXELS = int(os.getenv("THUMBNAIL_MAX_PIXELS", "320"))
+INLINE_THUMBNAIL_MAX_BYTES = int(os.getenv("INLINE_THUMBNAIL_MAX_BYTES", "65536"))
+
+# Append-only SQLite history of crew runs (timings, tokens, charts, cache outcome)
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_PATH = os.getenv(
+    "HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "query_history.sqlite3")
+)
+# Runs buffered for the background writer before new ones are dropped
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "1000"))
+# Number of top historical queries replayed at startup to warm caches (0 disables)
+HISTORY_REPLAY_ON_STARTUP = int(os.getenv("HISTORY_REPLAY_ON_STARTUP", "0"))
+# Only runs from this many recent days count towards the top queries
+HISTORY_REPLAY_WINDOW_DAYS = float(os.getenv("HISTORY_REPLAY_WINDOW_DAYS", "7"))
+HISTORY_REPLAY_PARALLELISM = int(os.getenv("HISTORY_REPLAY_PARALLELISM", "2"))
+
+# Key required in the X-Admin-Key header by the admin endpoints (unset
+# disables them)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Opt-in memory profiling: per-run peak RSS, and tracemalloc with this many
+# frames per allocation (0 leaves tracemalloc off until enabled via the admin API)
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "false").lower() in ("1", "true", "yes")
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))
+# Seconds between RSS samples taken while crew runs are active
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "0.05"))
+
+# Print CrewAI's agent reasoning to stdout (large; turn off for long-running workers)
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "true").lower() in ("1", "true", "yes")
+
+# Multi-part questions are split into at most this many independent parts,
+# each analyzed by its own analyst crew in parallel (below 2 disables splitting)
+CREW_MAX_SUBTASKS = int(os.getenv("CREW_MAX_SUBTASKS", "4"))
+
+# Chat WebSocket: queries in flight per connection, frames buffered for slow
+# clients before progress frames are dropped, and heartbeat timing in seconds
+WS_MAX_INFLIGHT_QUERIES = int(os.getenv("WS_MAX_INFLIGHT_QUERIES", "8"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+WS_HEARTBEAT_TIMEOUT = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))
+
+# Datasets the analyst can compute over (CSV or Parquet files, named by file
+# stem), where compute results are kept, and for how many seconds
+DATASETS_DIR = os.getenv(
+    "DATASETS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+)
+DATASET_RESULTS_DIR = os.getenv(
+    "DATASET_RESULTS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "datasets")
+)
+DATASET_RESULT_TTL = float(os.getenv("DATASET_RESULT_TTL", "86400"))
+
+# Sandboxed compute worker processes (0 runs computations in-process, without
+# limits), per-computation CPU seconds and memory, wall-clock timeout in
+# seconds, and computations per worker before it is replaced
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "2"))
+COMPUTE_CPU_SECONDS = float(os.getenv("COMPUTE_CPU_SECONDS", "10"))
+COMPUTE_MEMORY_MB = int(os.getenv("COMPUTE_MEMORY_MB", "1024"))
+COMPUTE_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", "30"))
+COMPUTE_MAX_TASKS_PER_WORKER = int(os.getenv("COMPUTE_MAX_TASKS_PER_WORKER", "100"))
+# Result rows shown to the analyst after each computation
+COMPUTE_PREVIEW_ROWS = int(os.getenv("COMPUTE_PREVIEW_ROWS", "10"))
+
+# Metadata catalog: tables and columns retrieved into the analyst's prompt per
+# query, the embedding backend ("auto" uses the local MiniLM ONNX model when
+# downloaded, "onnx" downloads it, "hashing" needs no model), seconds between
+# checks for changed datasets, and how many recent successful questions from
+# the query history are indexed
+METADATA_TOP_TABLES = int(os.getenv("METADATA_TOP_TABLES", "3"))
+METADATA_TOP_K = int(os.getenv("METADATA_TOP_K", "12"))
+METADATA_EMBEDDINGS = os.getenv("METADATA_EMBEDDINGS", "auto").lower()
+METADATA_REFRESH_INTERVAL = float(os.getenv("METADATA_REFRESH_INTERVAL", "30"))
+METADATA_PAST_QUERIES = int(os.getenv("METADATA_PAST_QUERIES", "200"))
+METADATA_PAST_QUERY_WINDOW_DAYS = float(os.getenv("METADATA_PAST_QUERY_WINDOW_DAYS", "30"))
+
+# Query scheduler in front of the crews: crew runs at once across all tenants,
+# seconds a request may wait in its tenant's queue before it is rejected, and
+# the tokens a run is assumed to cost before a tenant's runs have reported any
+SCHEDULER_MAX_CONCURRENT_RUNS = int(os.getenv("SCHEDULER_MAX_CONCURRENT_RUNS", "8"))
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "120"))
+SCHEDULER_DEFAULT_RUN_TOKENS = int(os.getenv("SCHEDULER_DEFAULT_RUN_TOKENS", "20000"))
+
+# Weight, concurrency, queue and token quotas of tenants without a section, and
+# of each named tenant, from SCHEDULER_TENANT_* variables and the optional
+# SCHEDULER_TENANTS_FILE (see tenants.py)
+SCHEDULER_TENANT_DEFAULT, SCHEDULER_TENANTS = load_tenant_policies()
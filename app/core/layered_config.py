@@ -0,0 +1,82 @@
+"""
+Helpers for settings layered from defaults, environment variables and a file.
+
+Used by llm_roles.py and tenants.py: each resolves a frozen dataclass from
+built-in defaults, then <PREFIX>_<FIELD> variables, then an optional JSON or
+YAML file holding a "default" section and one section per named entry.
+"""
+
+import json
+import os
+from dataclasses import fields, replace
+from typing import Any, Callable, Collection, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+def env_settings(cls: type, prefix: str, skip: Collection[str] = ()) -> Dict[str, Any]:
+    """The non-empty <prefix><FIELD> variables of a dataclass's fields, by field name."""
+    settings = {}
+    for field in fields(cls):
+        if field.name in skip:
+            continue
+        value = os.getenv(f"{prefix}{field.name.upper()}")
+        if value:
+            settings[field.name] = value
+    return settings
+
+
+def apply_settings(
+    current: T,
+    settings: Dict[str, Any],
+    source: str,
+    convert: Callable[[str, Any], Any],
+    label: str,
+    nullable: Collection[str] = (),
+) -> T:
+    """Override fields of a frozen dataclass with converted settings.
+
+    Args:
+        current: The lower layer
+        settings: Raw values by field name
+        source: Where the settings come from, for error messages
+        convert: Converts a raw value of the named field; may return None
+        label: What the settings configure, for error messages ("LLM", "tenant")
+        nullable: Fields a None value clears; others keep the lower layer's value
+
+    Raises:
+        ValueError: If settings holds names that are not fields
+    """
+    known = {field.name for field in fields(current)}
+    unknown = set(settings) - known
+    if unknown:
+        raise ValueError(f"Unknown {label} settings in {source}: {', '.join(sorted(unknown))}")
+    changes = {name: convert(name, value) for name, value in settings.items()}
+    changes = {name: value for name, value in changes.items() if value is not None or name in nullable}
+    return replace(current, **changes)
+
+
+def load_settings_file(path: str, kind: str) -> Dict[str, Dict[str, Any]]:
+    """Parse a settings file (JSON, or YAML with PyYAML installed) into sections.
+
+    Args:
+        path: The file to read
+        kind: What the sections name ("roles", "tenants"), for error messages
+
+    Raises:
+        ValueError: If the file is not a mapping of names to settings mappings
+        RuntimeError: If the file is YAML and PyYAML is not installed
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml  # optional dependency, imported only for YAML files
+        except ImportError:
+            raise RuntimeError(f"PyYAML is required to read {path}; install it or use JSON")
+        data = yaml.safe_load(text) or {}
+    else:
+        data = json.loads(text)
+    if not isinstance(data, dict) or not all(settings is None or isinstance(settings, dict) for settings in data.values()):
+        raise ValueError(f"{path} must contain a mapping of {kind} to settings")
+    return {name: settings or {} for name, settings in data.items()}
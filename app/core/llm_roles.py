@@ -0,0 +1,113 @@
+"""
+Per-role LLM configuration.
+
+Each crew role (planner, manager, analyst) gets its own model, sampling and
+token limits, request timeout, concurrency limit and backend, so cheap, fast
+models can handle planning and delegation while the analyst keeps a stronger
+one. Settings are layered, later layers winning:
+
+1. built-in defaults (gpt-4o-mini on OpenAI, temperature 0.1)
+2. the shared LLM_* variables (LLM_MODEL, LLM_BASE_URL, ...)
+3. the file named by LLM_ROLES_FILE: JSON, or YAML when PyYAML is installed,
+   holding an optional "default" section and one section per role
+4. per-role variables such as LLM_PLANNER_MODEL or LLM_ANALYST_TIMEOUT
+
+A role whose base_url points at a local OpenAI-compatible server (vLLM,
+llama.cpp, Ollama, LM Studio) uses litellm's "openai/<model>" naming, e.g.
+
+    planner:
+      model: openai/qwen2.5-7b-instruct
+      base_url: http://localhost:8001/v1
+      rate_limited: false
+"""
+
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional
+
+from app.core.layered_config import apply_settings, env_settings, load_settings_file
+
+ROLES = ("planner", "manager", "analyst")
+
+
+@dataclass(frozen=True)
+class RoleLLMConfig:
+    """LLM settings of one crew role.
+
+    Attributes:
+        model: litellm model name ("gpt-4o-mini", "openai/<local model>", ...)
+        temperature: Sampling temperature
+        max_tokens: Completion token limit (None for the provider default)
+        timeout: Seconds before a completion request fails
+        max_concurrency: Completions of this role in flight at once (0 for no limit)
+        base_url: OpenAI-compatible endpoint; None for the provider default
+        api_key: Key for the backend; None to use the provider's environment variable
+        rate_limited: Whether calls go through the shared rate limiter, which
+            models the OpenAI account's limits (turn off for local servers)
+    """
+
+    model: str = "gpt-4o-mini"
+    temperature: float = 0.1
+    max_tokens: Optional[int] = None
+    timeout: float = 120.0
+    max_concurrency: int = 0
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    rate_limited: bool = True
+
+    def public(self) -> Dict[str, Any]:
+        """The settings without the API key, for metrics and logs."""
+        settings = {field.name: getattr(self, field.name) for field in fields(self)}
+        settings.pop("api_key")
+        return settings
+
+
+def _convert(name: str, value: Any) -> Any:
+    if value is None or value == "":
+        return None
+    if name in ("max_tokens", "max_concurrency"):
+        return int(value)
+    if name in ("temperature", "timeout"):
+        return float(value)
+    if name == "rate_limited":
+        return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    return str(value)
+
+
+def _apply(config: RoleLLMConfig, settings: Dict[str, Any], source: str) -> RoleLLMConfig:
+    # Only the optional settings can be cleared with null; others keep the lower layer
+    return apply_settings(config, settings, source, _convert, "LLM", nullable=("max_tokens", "base_url", "api_key"))
+
+
+def load_roles_file(path: str) -> Dict[str, Any]:
+    """Parse a role configuration file (JSON, or YAML with PyYAML installed)."""
+    data = load_settings_file(path, "roles")
+    unknown = set(data) - set(ROLES) - {"default"}
+    if unknown:
+        raise ValueError(f"Unknown roles in {path}: {', '.join(sorted(unknown))}")
+    return data
+
+
+def load_role_configs(path: Optional[str] = None) -> Dict[str, RoleLLMConfig]:
+    """Resolve the LLM configuration of every role.
+
+    Args:
+        path: Role configuration file; defaults to the LLM_ROLES_FILE variable
+
+    Returns:
+        The configuration of each role in ROLES
+
+    Raises:
+        ValueError: If the file or the variables hold unknown settings or roles
+    """
+    base = _apply(RoleLLMConfig(), env_settings(RoleLLMConfig, "LLM_"), "LLM_* variables")
+    path = path or os.getenv("LLM_ROLES_FILE")
+    file_settings = load_roles_file(path) if path else {}
+    base = _apply(base, file_settings.get("default", {}), f"{path} (default)")
+    configs = {}
+    for role in ROLES:
+        role_config = _apply(base, file_settings.get(role, {}), f"{path} ({role})")
+        configs[role] = _apply(
+            role_config, env_settings(RoleLLMConfig, f"LLM_{role.upper()}_"), f"LLM_{role.upper()}_* variables"
+        )
+    return configs
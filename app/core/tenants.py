@@ -0,0 +1,111 @@
+"""
+Per-tenant scheduling policies.
+
+Callers are grouped into configured tenants by API key (X-API-Key, or an
+Authorization bearer token) or, without a key, by the X-Tenant-ID header (see
+app.services.scheduler); unknown keys and names share the "anonymous" tenant. A tenant's policy sets its weight in weighted fair
+queuing and its quotas. Settings are layered, later layers winning:
+
+1. built-in defaults (weight 1, no per-tenant concurrency limit or token
+   quota, so tenants are only bounded by SCHEDULER_MAX_CONCURRENT_RUNS)
+2. the SCHEDULER_TENANT_* variables (SCHEDULER_TENANT_WEIGHT, ...)
+3. the file named by SCHEDULER_TENANTS_FILE: JSON, or YAML when PyYAML is
+   installed, holding an optional "default" section and one section per
+   named tenant, e.g.
+
+    default:
+      max_concurrency: 2
+    analysts:
+      weight: 3
+      max_concurrency: 6
+    reporting:
+      api_keys: [key-of-the-nightly-report-job]
+      weight: 0.5
+      tokens_per_minute: 200000
+
+A tenant listing api_keys is only reachable with one of its keys; the others
+can also be selected with X-Tenant-ID, e.g. by a gateway that sets it.
+"""
+
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.layered_config import apply_settings, env_settings, load_settings_file
+
+
+@dataclass(frozen=True)
+class TenantPolicy:
+    """Scheduling policy of one tenant.
+
+    Attributes:
+        weight: Share of the crew capacity relative to other backlogged tenants
+        max_concurrency: Crew runs of the tenant at once (0 for no per-tenant limit)
+        max_queued: Requests the tenant may have waiting before new ones are rejected
+        tokens_per_minute: LLM tokens the tenant's runs may use per minute,
+            enforced before new runs start (0 for no quota)
+        api_keys: Keys identifying the tenant
+    """
+
+    weight: float = 1.0
+    max_concurrency: int = 0
+    max_queued: int = 50
+    tokens_per_minute: int = 0
+    api_keys: Tuple[str, ...] = ()
+
+    def public(self) -> Dict[str, Any]:
+        """The policy without the API keys, for metrics and logs."""
+        policy = {field.name: getattr(self, field.name) for field in fields(self)}
+        policy["api_keys"] = len(self.api_keys)
+        return policy
+
+
+def _convert(name: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if name == "weight":
+        return float(value)
+    if name == "api_keys":
+        if isinstance(value, str):
+            return tuple(key.strip() for key in value.split(",") if key.strip())
+        return tuple(str(key) for key in value)
+    return int(value)
+
+
+def _apply(policy: TenantPolicy, settings: Dict[str, Any], source: str) -> TenantPolicy:
+    policy = apply_settings(policy, settings, source, _convert, "tenant")
+    if policy.weight <= 0:
+        raise ValueError(f"Tenant weight must be positive in {source}")
+    return policy
+
+
+def load_tenant_policies(path: Optional[str] = None) -> Tuple[TenantPolicy, Dict[str, TenantPolicy]]:
+    """Resolve the default policy and the policy of every named tenant.
+
+    Args:
+        path: Tenant configuration file; defaults to the SCHEDULER_TENANTS_FILE variable
+
+    Returns:
+        The policy of tenants without a section, and the named tenants' policies
+
+    Raises:
+        ValueError: If the file or the variables hold unknown settings, or an
+            API key is listed by two tenants
+    """
+    # Keys only come from the file, never from the default policy's variables
+    variables = env_settings(TenantPolicy, "SCHEDULER_TENANT_", skip=("api_keys",))
+    default = _apply(TenantPolicy(), variables, "SCHEDULER_TENANT_* variables")
+    path = path or os.getenv("SCHEDULER_TENANTS_FILE")
+    file_settings = load_settings_file(path, "tenants") if path else {}
+    default = _apply(default, file_settings.get("default", {}), f"{path} (default)")
+    tenants = {}
+    owners: Dict[str, str] = {}
+    for name, settings in file_settings.items():
+        if name == "default":
+            continue
+        tenants[name] = _apply(default, settings, f"{path} ({name})")
+        for key in tenants[name].api_keys:
+            if key in owners:
+                raise ValueError(f"API key listed by both {owners[key]} and {name} in {path}")
+            owners[key] = name
+    return default, tenants
@@ -1,8 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 from app.api.api import api_router
+from app.core import config
+from app.core.compression import CompressionMiddleware
+from app.services.memory_profiler import memory_profiler
+from app.services.crew_service import CrewService
+from app.services.scheduler import QueryScheduler
+from app.tools.compute_pool import shutdown_compute_pool, start_compute_pool
+from app.tools.render_pool import shutdown_render_pool, start_render_pool
 from starlette.responses import FileResponse
 from starlette.staticfiles import StaticFiles as StarletteStaticFiles
 from contextlib import asynccontextmanager
@@ -17,10 +26,49 @@ async def lifespan(app: FastAPI):
     static_dir = os.path.join(os.path.dirname(__file__), "static")
     os.makedirs(os.path.join(static_dir, "images"), exist_ok=True)
     
+    if config.MEMORY_PROFILING:
+        memory_profiler.start(tracemalloc_frames=config.MEMORY_TRACEMALLOC_FRAMES)
+    
+    # Create the service here rather than at import time; CrewAI and the
+    # plotting stack are only loaded on first use unless warm-up is enabled
+    app.state.crew_service = CrewService()
+    if config.STARTUP_WARMUP:
+        await asyncio.to_thread(app.state.crew_service.warm_up)
+    
+    # Chat endpoints take turns for the crews through the scheduler, per tenant
+    app.state.scheduler = QueryScheduler(
+        config.SCHEDULER_MAX_CONCURRENT_RUNS,
+        config.SCHEDULER_TENANT_DEFAULT,
+        config.SCHEDULER_TENANTS,
+        queue_timeout=config.SCHEDULER_QUEUE_TIMEOUT,
+        default_run_tokens=config.SCHEDULER_DEFAULT_RUN_TOKENS
+    )
+    
+    # Chart rendering processes warm themselves up as they start
+    await asyncio.to_thread(start_render_pool, config.CHART_RENDER_WORKERS, config.CHART_RENDER_TIMEOUT)
+    
+    # Sandboxed compute workers, only when there are datasets to compute over
+    if os.path.isdir(config.DATASETS_DIR):
+        await asyncio.to_thread(
+            start_compute_pool, config.COMPUTE_WORKERS, config.COMPUTE_CPU_SECONDS,
+            config.COMPUTE_MEMORY_MB, config.COMPUTE_TIMEOUT, config.COMPUTE_MAX_TASKS_PER_WORKER
+        )
+        # Index dataset metadata now rather than on the first query
+        await asyncio.to_thread(app.state.crew_service.metadata_catalog.refresh, True)
+    
+    # Replay the most common recent queries in the background so their LLM
+    # completions are cached again after a deploy
+    if config.HISTORY_REPLAY_ON_STARTUP > 0:
+        app.state.crew_service.start_replay(config.HISTORY_REPLAY_ON_STARTUP, app.state.scheduler)
+    
     yield  # This is where the application runs
     
     # Shutdown: code to run on application shutdown
     print("Shutting down ChatalystBI application...")
+    app.state.crew_service.close()
+    memory_profiler.stop()
+    shutdown_render_pool()
+    shutdown_compute_pool()
 
 # Create FastAPI application
 app = FastAPI(
@@ -28,6 +76,9 @@ app = FastAPI(
     description="LLM-powered Chat to BI service",
     version="0.1.0",
     lifespan=lifespan,
+    # orjson serializes the long agent answers and chart specs much faster
+    # than the standard json module
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS middleware
@@ -39,6 +90,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses (agent text, Vega-Lite specs, thumbnails)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+)
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
@@ -1,5 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Literal
+
+# Chart outputs a client can ask for: a server-rendered PNG, a Vega-Lite spec
+# rendered by the client, or both
+ChartFormat = Literal["png", "vega_lite", "both"]
 
 class ImageInfo(BaseModel):
     """
@@ -7,10 +11,23 @@ class ImageInfo(BaseModel):
     
     Attributes:
         id: The unique identifier of the image
-        url: The URL to access the image
+        url: The URL to access the image, if it was rendered as a PNG
+        vega_lite: The chart as a Vega-Lite spec, if one was requested
+        thumbnail: A downscaled PNG inlined as a data URI, if requested
     """
     id: str = Field(..., description="Unique identifier for the image")
-    url: str = Field(..., description="URL to access the image")
+    url: Optional[str] = Field(
+        default=None,
+        description="URL to access the image; omitted when only a Vega-Lite spec was produced"
+    )
+    vega_lite: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Vega-Lite spec of the chart for client-side rendering"
+    )
+    thumbnail: Optional[str] = Field(
+        default=None,
+        description="With inline_thumbnails: a downscaled PNG as a base64 data URI, for previews without a second request"
+    )
     
     class Config:
         schema_extra = {
@@ -27,18 +44,36 @@ class ChatRequest(BaseModel):
     Attributes:
         query: The natural language query from the user
         context: Optional context information for the query
+        session_id: Optional conversation session to continue
+        chart_format: Optional chart output format for this query
+        inline_thumbnails: Whether downscaled chart PNGs are inlined into the response
     """
     query: str = Field(..., description="Natural language query from the user")
     context: Optional[Dict[str, Any]] = Field(
         default=None, 
         description="Optional context information for the query"
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Conversation session to continue; a new session is started when omitted"
+    )
+    chart_format: Optional[ChartFormat] = Field(
+        default=None,
+        description="Chart output: png, vega_lite or both; the server default is used when omitted"
+    )
+    inline_thumbnails: bool = Field(
+        default=False,
+        description="Inline downscaled chart PNGs into the response as base64 thumbnails"
+    )
     
     class Config:
         schema_extra = {
             "example": {
                 "query": "Show me sales trends for the last quarter",
-                "context": {"data_source": "sales_data"}
+                "context": {"data_source": "sales_data"},
+                "session_id": "9b2f6c1e-3d4a-4f5b-8c7d-1e2f3a4b5c6d",
+                "chart_format": "png",
+                "inline_thumbnails": False
             }
         }
 
@@ -49,12 +84,17 @@ class ChatResponse(BaseModel):
     Attributes:
         response: The response from the AI agents
         images: Optional list of images generated during the response
+        session_id: The conversation session this response belongs to
     """
     response: str = Field(..., description="Text response from the AI agents")
     images: List[ImageInfo] = Field(
         default=[], 
         description="List of images generated during the response"
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Conversation session to pass with follow-up queries"
+    )
     
     class Config:
         schema_extra = {
@@ -65,6 +105,37 @@ class ChatResponse(BaseModel):
                         "id": "123e4567-e89b-12d3-a456-426614174000",
                         "url": "http://localhost:8000/static/images/123e4567-e89b-12d3-a456-426614174000.png"
                     }
-                ]
+                ],
+                "session_id": "9b2f6c1e-3d4a-4f5b-8c7d-1e2f3a4b5c6d"
+            }
+        }
+
+class BatchChatRequest(BaseModel):
+    """
+    Request model for batch chat queries.
+    
+    Attributes:
+        requests: The chat requests to process
+        max_parallelism: Optional limit on how many requests run concurrently
+    """
+    requests: List[ChatRequest] = Field(
+        ...,
+        min_length=1,
+        description="Chat requests to process"
+    )
+    max_parallelism: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of requests processed concurrently (capped by the server)"
+    )
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "requests": [
+                    {"query": "Show me sales trends for the last quarter"},
+                    {"query": "Compare revenue by region for 2024"}
+                ],
+                "max_parallelism": 4
             }
-        } 
\ No newline at end of file
+        }
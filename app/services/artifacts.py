@@ -0,0 +1,81 @@
+"""
+Per-request registry of artifacts created by tools.
+
+Chart tools register every image they create in the registry of the crew run
+calling them, so the service can return exactly those images without parsing
+IDs back out of the LLM's final answer. The registry also carries the chart
+output format requested for the run.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core import config
+from app.services.progress import emit_progress
+
+
+@dataclass
+class Artifact:
+    """Something a tool produced during a crew run."""
+    id: str
+    kind: str
+    title: str = ""
+    spec: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+
+class ArtifactRegistry:
+    """Thread-safe, insertion-ordered collection of the artifacts of one run."""
+
+    def __init__(self, chart_format: Optional[str] = None, inline_thumbnails: bool = False):
+        # "png", "vega_lite" or "both"; None uses config.CHART_OUTPUT
+        self.chart_format = chart_format
+        # Whether the run's response inlines chart thumbnails
+        self.inline_thumbnails = inline_thumbnails
+        self._artifacts: Dict[str, Artifact] = {}
+        self._lock = threading.Lock()
+
+    def add(self, artifact: Artifact) -> None:
+        with self._lock:
+            self._artifacts.setdefault(artifact.id, artifact)
+
+    def list(self, kind: Optional[str] = None) -> List[Artifact]:
+        """All artifacts in creation order, optionally filtered by kind."""
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+        if kind is None:
+            return artifacts
+        return [artifact for artifact in artifacts if artifact.kind == kind]
+
+
+# Registry of the crew run executing in the current context (see cancellation.py
+# for how the context reaches the crew's worker thread)
+current_artifact_registry: ContextVar[Optional[ArtifactRegistry]] = ContextVar(
+    "current_artifact_registry", default=None
+)
+
+
+def requested_chart_format() -> str:
+    """Chart output format of the current run: "png", "vega_lite" or "both"."""
+    registry = current_artifact_registry.get()
+    if registry is not None and registry.chart_format:
+        return registry.chart_format
+    return config.CHART_OUTPUT
+
+
+def thumbnails_requested() -> bool:
+    """Whether the current run's response inlines chart thumbnails."""
+    registry = current_artifact_registry.get()
+    return registry is not None and registry.inline_thumbnails
+
+
+def register_artifact(kind: str, artifact_id: str, title: str = "", spec: Dict[str, Any] = None) -> None:
+    """Record an artifact in the current run's registry, if there is one."""
+    registry = current_artifact_registry.get()
+    if registry is not None:
+        registry.add(Artifact(id=artifact_id, kind=kind, title=title, spec=spec or {}))
+    # Let streaming clients show the artifact before the final answer arrives
+    emit_progress({"type": "artifact", "kind": kind, "id": artifact_id, "title": title, "spec": spec or {}})
@@ -0,0 +1,59 @@
+"""
+Cooperative cancellation for crew runs.
+
+A CancellationToken is created per request and checked at every step boundary
+of a crew run (agent steps, LLM calls and tool executions). Once the token is
+cancelled the next check raises CrewCancelledError, which unwinds the crew and
+frees the worker thread it was running on.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+
+class CrewCancelledError(Exception):
+    """Raised inside a crew run after its cancellation token has been triggered."""
+
+
+class CancellationToken:
+    """Thread-safe cancellation flag shared between a request and its crew run."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Mark the run as cancelled. Only the first reason is kept."""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """Raise CrewCancelledError if the run has been cancelled."""
+        if self._event.is_set():
+            raise CrewCancelledError(self.reason or "cancelled")
+
+
+# Token of the crew run executing in the current context. Crew runs are started
+# with asyncio.to_thread, which copies the context into the worker thread, so
+# the module-level tool instances can see the token of the run calling them.
+current_cancellation_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "current_cancellation_token", default=None
+)
+
+
+def raise_if_cancelled(*_args, **_kwargs) -> None:
+    """Raise CrewCancelledError if the current crew run has been cancelled.
+
+    Accepts and ignores any arguments so it can be used directly as a CrewAI
+    step callback.
+    """
+    token = current_cancellation_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
@@ -1,10 +1,23 @@
-from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
+import asyncio
+import logging
 import os
-import re
+import threading
+import uuid
 from dotenv import load_dotenv
-from app.tools.visualization_tools import create_line_chart, create_multi_line_chart
 from app.schemas.chat import ImageInfo
+from app.services.artifacts import ArtifactRegistry, current_artifact_registry
+from app.services.cancellation import CancellationToken, CrewCancelledError, current_cancellation_token
+from app.services.datasets import dataset_catalog
+from app.services.decomposition import build_decomposition_messages, may_have_parts, merge_token_usage, parse_sub_analyses
+from app.services.llm_cache import LLMResponseCache
+from app.services.memory_profiler import memory_profiler
+from app.services.progress import agent_step_callback, current_progress_listener
+from app.services.query_history import QueryHistoryStore, QueryRecord
+from app.services.rate_limiter import BATCH, INTERACTIVE, LLMRateLimiter, current_llm_priority
+from app.services.run_metrics import RunMetrics, current_run_metrics, record_counter, timed_stage, token_usage_dict
+from app.services.scheduler import REPLAY_TENANT
+from app.services.session_store import ConversationTurn, SessionStore
+from app.core import config
 import time
 
 # 獲取基礎 URL - 優先使用環境變量，否則使用默認值
@@ -16,8 +29,39 @@ if BASE_URL.endswith("/api/v1"):
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Characters of long results included in debug logs
+LOG_EXCERPT_CHARS = 500
+
+def release_finished_task_spans():
+    """Drop finished tasks from CrewAI's global event listener.
+
+    CrewAI's EventListener singleton keys its execution_spans dict by Task and
+    sets a finished task's span to None instead of removing it. Each entry
+    keeps the task alive, and with it the agent, crew, executor and results
+    of its run, so a long-running worker would keep every crew it ever ran.
+    Entries of tasks still running keep their spans.
+    """
+    try:
+        from crewai.utilities.events.event_listener import event_listener
+    except ImportError:
+        return
+    spans = getattr(event_listener, "execution_spans", None)
+    if not spans:
+        return
+    # list() copies the items atomically, while other runs may be adding spans
+    for task, span in list(spans.items()):
+        if span is None:
+            spans.pop(task, None)
+
 class CrewService:
-    """Service for managing CrewAI operations."""
+    """Service for managing CrewAI operations.
+    
+    CrewAI, LiteLLM and the plotting stack are imported on first use rather
+    than at module import, so importing the API stays fast. Call warm_up() to
+    load them ahead of the first query.
+    """
     
     def __init__(self):
         """Initialize the CrewAI service with OpenAI model."""
@@ -28,19 +72,140 @@ class CrewService:
                 
             print(f"Initializing CrewService with API key: {api_key[:5]}..." if api_key else "Initializing CrewService without API key")
             
-            self.llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                temperature=0.1,
-                api_key=api_key
+            # 所有代理共用同一個限流器，避免突發流量觸發 OpenAI 的速率限制
+            self.rate_limiter = LLMRateLimiter(
+                requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+                queue_timeout=config.LLM_QUEUE_TIMEOUT,
+                max_retries=config.LLM_MAX_RETRIES,
+                backoff_base=config.LLM_BACKOFF_BASE,
+                backoff_max=config.LLM_BACKOFF_MAX,
+                failure_threshold=config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                cooldown=config.LLM_CIRCUIT_COOLDOWN
+            )
+            
+            # 低溫度的呼叫（規劃、委派、工具說明）經常完全相同，快取其結果
+            self.llm_cache = None
+            if config.LLM_CACHE_ENABLED:
+                self.llm_cache = LLMResponseCache(
+                    path=config.LLM_CACHE_PATH,
+                    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                    max_temperature=config.LLM_CACHE_MAX_TEMPERATURE
+                )
+            
+            # 對話狀態：讓後續問題延續先前的分析，而不是重新開始
+            self.session_store = SessionStore(
+                max_sessions=config.SESSION_MAX_SESSIONS,
+                ttl_seconds=config.SESSION_TTL_SECONDS,
+                max_turns=config.SESSION_MAX_TURNS,
+                max_summary_chars=config.SESSION_SUMMARY_MAX_CHARS
             )
             
+            # 查詢歷史：背景寫入 SQLite，不阻塞請求
+            self.query_history = None
+            if config.HISTORY_ENABLED:
+                self.query_history = QueryHistoryStore(
+                    path=config.HISTORY_PATH,
+                    max_pending=config.HISTORY_MAX_PENDING
+                )
+            self._replay_task = None
+            self._last_replay = None
+            
+            # 資料集中繼資料索引：每個查詢只把相關的表格與欄位放進提示
+            # (imported here: it loads numpy, which app.main should not import)
+            from app.services.metadata_catalog import MetadataCatalog
+            
+            self.metadata_catalog = MetadataCatalog(
+                dataset_catalog,
+                query_history=self.query_history,
+                top_tables=config.METADATA_TOP_TABLES,
+                top_k=config.METADATA_TOP_K,
+                embeddings=config.METADATA_EMBEDDINGS,
+                refresh_interval=config.METADATA_REFRESH_INTERVAL,
+                past_queries=config.METADATA_PAST_QUERIES,
+                past_query_days=config.METADATA_PAST_QUERY_WINDOW_DAYS
+            )
+            
+            self.api_key = api_key
+            # 每個角色的 LLM 於第一次使用時建立（見 get_llm）
+            self._llms = {}
+            self._llms_lock = threading.Lock()
+            
             print("CrewService initialized successfully")
         except Exception as e:
             print(f"Error initializing CrewService: {str(e)}")
             raise
     
-    def create_data_consultant_agent(self):
-        """Create a data consultant agent that communicates with users and delegates tasks."""
+    def create_llm(self, role):
+        """Create the LLM used by one crew role.
+        
+        Args:
+            role (str): "planner", "manager" or "analyst"
+            
+        Returns:
+            ManagedLLM: An LLM configured from config.LLM_ROLES[role], sharing the
+            service's rate limiter unless the role opts out, and its completion
+            cache unless the role is listed in LLM_CACHE_DISABLED_ROLES
+        """
+        from app.services.llm import ManagedLLM
+        
+        settings = config.LLM_ROLES[role]
+        api_key = settings.api_key or self.api_key
+        # 本地 OpenAI 相容端點通常不檢查金鑰，但 litellm 仍要求提供一個
+        if settings.base_url and not api_key:
+            api_key = "not-needed"
+        cache = None if role in config.LLM_CACHE_DISABLED_ROLES else self.llm_cache
+        return ManagedLLM(
+            model=settings.model,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            timeout=settings.timeout,
+            base_url=settings.base_url,
+            api_key=api_key,
+            role=role,
+            rate_limiter=self.rate_limiter if settings.rate_limited else None,
+            cache=cache,
+            max_concurrency=settings.max_concurrency
+        )
+    
+    def get_llm(self, role):
+        """Return the LLM for a crew role, creating it on first use.
+        
+        Args:
+            role (str): "planner", "manager" or "analyst"
+            
+        Returns:
+            ManagedLLM: The role's shared LLM instance
+        """
+        with self._llms_lock:
+            if role not in self._llms:
+                self._llms[role] = self.create_llm(role)
+            return self._llms[role]
+    
+    def warm_up(self):
+        """Load CrewAI, the LLMs and the chart renderer ahead of the first query.
+        
+        Imports the heavy dependencies, builds every role's LLM and renders a
+        throwaway chart so Matplotlib's font cache and backend are ready. Blocking;
+        run it in a worker thread.
+        """
+        start = time.perf_counter()
+        import crewai  # noqa: F401
+        for role in ("planner", "manager", "analyst"):
+            self.get_llm(role)
+        from app.tools.chart_rendering import warm_up_renderer
+        warm_up_renderer()
+        print(f"CrewService warm-up finished in {time.perf_counter() - start:.2f}s")
+    
+    def create_data_consultant_agent(self, allow_delegation=True):
+        """Create a data consultant agent that communicates with users and delegates tasks.
+        
+        Args:
+            allow_delegation (bool, optional): False for a consultant that only
+                merges findings its analysts have already produced
+        """
+        from crewai import Agent
+        
         return Agent(
             role="Data Consultant",
             goal="Understand user needs, delegate analysis tasks, and communicate results effectively",
@@ -49,10 +214,11 @@ class CrewService:
             You excel at understanding client needs, communicating technical concepts in accessible language, 
             and ensuring that data analysis delivers actionable business insights. 
             Your background includes an MBA and a Master's in Data Science, giving you the perfect blend of business acumen and technical knowledge.""",
-            verbose=True,
-            llm=self.llm,
-            allow_delegation=True,  # 允許委派任務
+            verbose=config.CREW_VERBOSE,
+            llm=self.get_llm("manager"),
+            allow_delegation=allow_delegation,  # 允許委派任務
             max_iter=5,  # 限制最大迭代次數
+            step_callback=agent_step_callback,  # 每一步之後檢查是否已取消並回報進度
             # 添加管理者的特殊說明
             agent_executor_kwargs={
                 "system_message": """You are a data consultant manager who coordinates the work of data analysts.
@@ -60,20 +226,27 @@ class CrewService:
                 
                 IMPORTANT: You should NEVER perform data analysis or create visualizations yourself.
                 Always delegate these tasks to your Data Analyst team member.
-                
-                When your analysts create visualizations, they will include Image IDs in their response.
-                You MUST include these exact Image IDs in your final response without changing their format.
-                The correct format is: "Image ID: [uuid]" (e.g., "Image ID: 123e4567-e89b-12d3-a456-426614174000")
-                
-                DO NOT convert these Image IDs into URLs or markdown image links.
-                DO NOT modify the Image ID format in any way.
-                DO NOT remove the "Image ID: " prefix.
+                Charts created by your analysts are delivered to the user automatically.
                 """
             }
         )
     
-    def create_data_analyst_agent(self):
-        """Create a data analyst agent that performs data analysis tasks."""
+    def create_data_analyst_agent(self, with_compute=False):
+        """Create a data analyst agent that performs data analysis tasks.
+        
+        Args:
+            with_compute (bool, optional): Give the analyst the compute_data tool
+                over the registered datasets
+        """
+        from crewai import Agent
+        from app.tools.visualization_tools import create_chart
+        
+        # 單一圖表工具涵蓋所有圖表類型，讓提示中的工具說明保持精簡
+        tools = [create_chart]
+        if with_compute:
+            from app.tools.compute_tools import compute_data
+            tools.append(compute_data)
+        
         return Agent(
             role="Data Analyst",
             goal="Analyze data thoroughly and produce accurate, insightful results",
@@ -82,197 +255,424 @@ class CrewService:
             Your analytical skills are exceptional - you can identify patterns, outliers, and insights that others miss. 
             You're proficient with various data analysis methodologies and can adapt your approach based on the specific requirements of each task. 
             You take pride in producing clear, accurate analyses that drive business decisions.""",
-            verbose=True,
-            llm=self.llm,
-            tools=[create_line_chart, create_multi_line_chart]
+            verbose=config.CREW_VERBOSE,
+            llm=self.get_llm("analyst"),
+            tools=tools,
+            step_callback=agent_step_callback  # 每一步之後檢查是否已取消並回報進度
         )
     
     def create_task(self, agent, description, expected_output):
         """Create a task for an agent."""
+        from crewai import Task
+        
         return Task(
             description=description,
             expected_output=expected_output,
             agent=agent
         )
     
-    def extract_image_ids(self, text):
-        """Extract image IDs from the agent's response.
+    async def run_hierarchical_crew(self, query, history_section="", datasets_section=""):
+        """Answer the query with the consultant managing a single analyst.
         
         Args:
-            text (str): The agent's response text
+            query (str): The user's query about data
+            history_section (str, optional): Prompt section summarizing earlier turns
+            datasets_section (str, optional): Prompt section listing the registered
+                datasets; the analyst gets the compute tool when it is set
             
         Returns:
-            list: A list of image IDs extracted from the text
+            tuple: The final answer text and the run's token usage
         """
-        # 處理 None 或空字符串
-        if text is None or text.strip() == "":
-            print("Warning: Empty text provided to extract_image_ids")
-            return []
+        from crewai import Crew, Process
+        
+        with timed_stage("prepare"):
+            consultant = self.create_data_consultant_agent()
+            analyst = self.create_data_analyst_agent(with_compute=bool(datasets_section))
             
-        # List to store all found image IDs
-        all_image_ids = []
-        
-        print(f"Extracting image IDs from text: {text[:200]}...")  # Print first 200 chars for debugging
-        
-        # 主要模式：標準格式 "Image ID: [uuid]"
-        pattern1 = r"Image ID: ([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})"
-        matches1 = re.findall(pattern1, text)
-        if matches1:
-            print(f"Found {len(matches1)} image IDs using standard pattern: {matches1}")
-            all_image_ids.extend(matches1)
-        
-        # 如果沒有找到標準格式，嘗試其他可能的格式
-        if not all_image_ids:
-            # 嘗試找出任何 UUID 格式的字符串
-            pattern2 = r"([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})"
-            matches2 = re.findall(pattern2, text)
-            if matches2:
-                print(f"Found {len(matches2)} potential image IDs using fallback pattern: {matches2}")
-                # 驗證這些是否真的是圖片 ID
-                verified_ids = []
-                for image_id in matches2:
-                    image_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "images", f"{image_id}.png")
-                    if os.path.exists(image_path):
-                        verified_ids.append(image_id)
+            # Create tasks
+            analysis_task = self.create_task(
+                agent=analyst,
+                description=f"""
+                Perform data analysis based on the requirements provided by the Data Consultant for this query: {query}
+                {history_section}
+                {datasets_section}
+                Your responsibilities:
+                1. Understand the analysis requirements from the Data Consultant
+                2. Determine the appropriate analytical approach
+                3. Conduct thorough data analysis
+                4. Identify key patterns, trends, and insights
+                5. Prepare clear visualizations and explanations of your findings using the visualization tools available to you
+                6. Provide actionable recommendations based on your analysis
+                
+                Use the create_chart tool for visualizations (line, multi_line, bar, stacked_bar,
+                scatter, histogram, area, pie or heatmap charts).
+                
+                Charts you create are delivered to the user automatically; refer to them by title.
+                """,
+                expected_output="Detailed data analysis with visualizations, insights, and recommendations"
+            )
+            
+            consultation_task = self.create_task(
+                agent=consultant,
+                description=f"""
+                Review the following user query about data: {query}
+                {history_section}
+                Your responsibilities:
+                1. Understand what the user is asking for
+                2. Formulate a clear analysis request for the Data Analyst
+                3. Provide context and specific requirements for the analysis
+                4. Review the analyst's work and ensure it addresses the user's needs
+                5. Communicate the final results back to the user in a clear, business-friendly manner
+                
+                IMPORTANT: You should NEVER perform data analysis or create visualizations yourself.
+                Always delegate these tasks to your Data Analyst team member.
                 
-                if verified_ids:
-                    print(f"Verified {len(verified_ids)} image IDs: {verified_ids}")
-                    all_image_ids.extend(verified_ids)
-        
-        # 移除重複項並保持順序
-        unique_image_ids = []
-        for image_id in all_image_ids:
-            if image_id not in unique_image_ids:
-                unique_image_ids.append(image_id)
-        
-        if unique_image_ids:
-            print(f"Final extracted image IDs: {unique_image_ids}")
-        else:
-            print("No image IDs found in the response")
+                Charts created by the Data Analyst are delivered to the user automatically.
+                """,
+                expected_output="A comprehensive response that addresses the user's query with insights from the data analysis"
+            )
+            
+            # 不再設置 dependencies，因為 Task 對象沒有這個字段
+            # consultation_task.dependencies = [analysis_task]
             
-        return unique_image_ids
+            # Create crew with hierarchical process
+            # Set consultant as the manager and analyst as the worker
+            crew = Crew(
+                agents=[analyst],  # 只包含工作者代理，不包含管理者代理
+                tasks=[analysis_task],  # 只包含工作者的任務，管理者的任務由 CrewAI 自動處理
+                verbose=config.CREW_VERBOSE,
+                process=Process.hierarchical,  # Use hierarchical process instead of sequential
+                manager_agent=consultant,  # Explicitly set consultant as the manager
+                planning=True,  # 啟用規劃功能，幫助管理者更好地組織任務
+                planning_llm=self.get_llm("planner")  # 規劃步驟也要經過可取消的 LLM
+            )
+        
+        result = await crew.kickoff_async()
+        # 確保 result.raw 是字符串類型
+        result_text = str(result.raw) if result.raw is not None else ""
+        return result_text, token_usage_dict(getattr(result, "token_usage", None))
     
-    async def process_query_with_crew(self, query, context=None):
-        """Process a BI query using multiple CrewAI agents.
+    async def decompose_query(self, query, history=""):
+        """Split a multi-part question into independent sub-analyses.
+        
+        Only questions containing list separators are sent to the planner LLM;
+        see app.services.decomposition.
         
         Args:
             query (str): The user's query about data
-            context (dict, optional): Additional context for the query
+            history (str, optional): Summary of the session's earlier turns
             
         Returns:
-            dict: The response from the CrewAI agents with image information
+            list[SubAnalysis]: Two or more parts to analyze in parallel, or an
+            empty list when the question is a single analysis, decomposition is
+            disabled (CREW_MAX_SUBTASKS < 2) or the planner's answer is unusable
         """
-        # Create agents
-        consultant = self.create_data_consultant_agent()
-        analyst = self.create_data_analyst_agent()
-        
-        # Create tasks
-        analysis_task = self.create_task(
-            agent=analyst,
-            description=f"""
-            Perform data analysis based on the requirements provided by the Data Consultant for this query: {query}
-            
-            Your responsibilities:
-            1. Understand the analysis requirements from the Data Consultant
-            2. Determine the appropriate analytical approach
-            3. Conduct thorough data analysis
-            4. Identify key patterns, trends, and insights
-            5. Prepare clear visualizations and explanations of your findings using the visualization tools available to you
-            6. Provide actionable recommendations based on your analysis
-            
-            You have access to visualization tools:
-            - create_line_chart: For creating line charts with a single line
-            - create_multi_line_chart: For creating line charts with multiple lines
+        limit = config.CREW_MAX_SUBTASKS
+        if limit < 2 or not may_have_parts(query):
+            return []
+        messages = build_decomposition_messages(query, limit, history or "")
+        try:
+            with timed_stage("decompose"):
+                answer = await asyncio.to_thread(self.get_llm("planner").call, messages)
+        except CrewCancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Query decomposition failed, using a single crew: %s", e)
+            return []
+        parts = parse_sub_analyses(str(answer or ""), limit)
+        return parts if len(parts) > 1 else []
+    
+    async def run_parallel_analyses(self, query, parts, history_section, artifacts, datasets_section=""):
+        """Analyze each part with its own analyst crew concurrently, then merge.
+        
+        Every part gets a separate analyst agent (an agent's executor is not
+        safe to share between threads) in a one-task crew. The crews run
+        together through kickoff_async; CrewAI's own async task execution
+        starts bare threads that would lose the run's cancellation token,
+        artifact registry and metrics. A consultant without delegation then
+        merges the findings and the charts into one answer.
+        
+        Args:
+            query (str): The user's query about data
+            parts (list[SubAnalysis]): Independent parts of the query
+            history_section (str): Prompt section summarizing earlier turns
+            artifacts (ArtifactRegistry): The run's registry, for chart titles
+            datasets_section (str, optional): Prompt section listing the registered
+                datasets; the analysts get the compute tool when it is set
             
-            IMPORTANT: When you use these tools, they will save the chart and return an Image ID.
-            You MUST include these exact Image IDs in your response exactly as returned by the tool.
-            The correct format is: "Image ID: [uuid]"
-            DO NOT modify this format in any way.
-            DO NOT convert these Image IDs into URLs or markdown image links.
+        Returns:
+            tuple: The merged answer text and the summed token usage
             
-            Example of what you SHOULD do:
-            "Here is the analysis result with a visualization. Image ID: 123e4567-e89b-12d3-a456-426614174000"
+        Raises:
+            CrewCancelledError: If the run is cancelled
+            Exception: The first sub-analysis error when every part failed
+        """
+        from crewai import Crew, Process
+        
+        with timed_stage("prepare"):
+            crews = []
+            for part in parts:
+                analyst = self.create_data_analyst_agent(with_compute=bool(datasets_section))
+                task = self.create_task(
+                    agent=analyst,
+                    description=f"""
+                    Analyze one part of the user's question: {part.question}
+                    (The full question was: {query}. Other analysts cover its other parts.)
+                    {history_section}
+                    {datasets_section}
+                    Your responsibilities:
+                    1. Determine the appropriate analytical approach for this part only
+                    2. Conduct thorough data analysis
+                    3. Identify key patterns, trends, and insights
+                    4. Prepare clear visualizations of your findings using the visualization tools available to you
+                    5. Provide actionable recommendations based on your analysis
+                    
+                    Use the create_chart tool for visualizations (line, multi_line, bar, stacked_bar,
+                    scatter, histogram, area, pie or heatmap charts).
+                    
+                    Charts you create are delivered to the user automatically; refer to them by title.
+                    """,
+                    expected_output=f"Data analysis of {part.title} with visualizations, insights, and recommendations"
+                )
+                crews.append(Crew(
+                    agents=[analyst],
+                    tasks=[task],
+                    verbose=config.CREW_VERBOSE,
+                    process=Process.sequential
+                ))
+        
+        record_counter("subtasks", len(parts))
+        with timed_stage("subtasks"):
+            outcomes = await asyncio.gather(
+                *(crew.kickoff_async() for crew in crews), return_exceptions=True
+            )
+        
+        findings = []
+        usages = []
+        errors = []
+        for part, outcome in zip(parts, outcomes):
+            if isinstance(outcome, CrewCancelledError):
+                raise outcome
+            if isinstance(outcome, Exception):
+                errors.append(outcome)
+                logger.warning("Sub-analysis '%s' failed: %s", part.title, outcome)
+                findings.append(f"## {part.title}\nQuestion: {part.question}\nThis part could not be analyzed: {outcome}")
+                continue
+            usages.append(token_usage_dict(getattr(outcome, "token_usage", None)))
+            findings.append(f"## {part.title}\nQuestion: {part.question}\n{outcome.raw or ''}")
+        if len(errors) == len(parts):
+            raise errors[0]
+        record_counter("subtasks_failed", len(errors))
+        
+        chart_titles = "\n".join(
+            f"- {chart.title or chart.id}" for chart in artifacts.list(kind="image")
+        ) or "- (none)"
+        findings_text = "\n\n".join(findings)
+        
+        with timed_stage("merge"):
+            consultant = self.create_data_consultant_agent(allow_delegation=False)
+            merge_task = self.create_task(
+                agent=consultant,
+                description=f"""
+                The user asked: {query}
+                {history_section}
+                Your Data Analysts worked on its parts in parallel. Their findings:
+                
+                {findings_text}
+                
+                Charts they created, delivered to the user automatically (refer to them by title):
+                {chart_titles}
+                
+                Your responsibilities:
+                1. Combine the findings into one coherent answer to the user's question
+                2. Compare the parts where the user asked for a comparison
+                3. Say which parts could not be analyzed, if any
+                4. Communicate the results in a clear, business-friendly manner
+                
+                Work only from the findings above; do not repeat the analysis.
+                """,
+                expected_output="A comprehensive response that addresses the user's query with insights from the data analysis"
+            )
+            merge_crew = Crew(
+                agents=[consultant],
+                tasks=[merge_task],
+                verbose=config.CREW_VERBOSE,
+                process=Process.sequential
+            )
+            result = await merge_crew.kickoff_async()
+        
+        usages.append(token_usage_dict(getattr(result, "token_usage", None)))
+        result_text = str(result.raw) if result.raw is not None else ""
+        return result_text, merge_token_usage(usages)
+    
+    def image_info(self, image_id, timestamp=None, spec=None, inline_thumbnail=False):
+        """Build the API representation of a generated chart image.
+        
+        Args:
+            image_id (str): ID of the image in static/images
+            timestamp (int, optional): Cache-busting timestamp; defaults to now
+            spec (dict, optional): The chart's artifact spec (see save_chart)
+            inline_thumbnail (bool, optional): Inline the chart's downscaled PNG
+                as a base64 data URI when the chart tool made one
             
-            Example of what you should NOT do:
-            "Here is the analysis result with a visualization. ![Chart](https://example.com/image/123e4567-e89b-12d3-a456-426614174000)"
-            """,
-            expected_output="Detailed data analysis with visualizations, insights, and recommendations"
+        Returns:
+            ImageInfo: The image ID with its URL, Vega-Lite spec and/or thumbnail
+        """
+        spec = spec or {}
+        # 添加時間戳以防止緩存問題
+        if timestamp is None:
+            timestamp = int(time.time())
+        has_png = spec.get("png", True)
+        thumbnail = spec.get("thumbnail") if inline_thumbnail else None
+        return ImageInfo(
+            id=image_id,
+            url=f"{BASE_URL}/static/images/{image_id}.png?t={timestamp}" if has_png else None,
+            vega_lite=spec.get("vega_lite"),
+            thumbnail=f"data:image/png;base64,{thumbnail}" if thumbnail else None
         )
+    
+    async def process_query_with_crew(self, query, context=None, cancel_token=None, priority=INTERACTIVE, session_id=None, on_event=None, chart_format=None, inline_thumbnails=False, route="query"):
+        """Process a BI query using multiple CrewAI agents.
         
-        consultation_task = self.create_task(
-            agent=consultant,
-            description=f"""
-            Review the following user query about data: {query}
-            
-            Your responsibilities:
-            1. Understand what the user is asking for
-            2. Formulate a clear analysis request for the Data Analyst
-            3. Provide context and specific requirements for the analysis
-            4. Review the analyst's work and ensure it addresses the user's needs
-            5. Communicate the final results back to the user in a clear, business-friendly manner
-            
-            IMPORTANT: You should NEVER perform data analysis or create visualizations yourself.
-            Always delegate these tasks to your Data Analyst team member.
-            
-            CRITICAL: When the Data Analyst creates visualizations, they will include Image IDs in their response.
-            You MUST include these exact Image IDs in your final response without changing their format.
-            The correct format is: "Image ID: [uuid]" (e.g., "Image ID: 123e4567-e89b-12d3-a456-426614174000")
-            
-            DO NOT convert these Image IDs into URLs or markdown image links.
-            DO NOT modify the Image ID format in any way.
-            DO NOT remove the "Image ID: " prefix.
-            
-            Example of what you SHOULD do:
-            "Here is the analysis result with a visualization. Image ID: 123e4567-e89b-12d3-a456-426614174000"
+        Args:
+            query (str): The user's query about data
+            context (dict, optional): Additional context for the query
+            cancel_token (CancellationToken, optional): Token that stops the crew at
+                its next step boundary once cancelled
+            priority (str, optional): Rate limiter lane for the run's LLM calls,
+                "interactive" or "batch"
+            session_id (str, optional): Conversation session; a summary of its prior
+                turns is given to the crew and this turn is recorded into it
+            on_event (callable, optional): Thread-safe listener for progress events
+                (agent steps, tool calls, created artifacts) emitted during the run
+            chart_format (str, optional): Chart output, "png", "vega_lite" or "both";
+                defaults to config.CHART_OUTPUT
+            inline_thumbnails (bool, optional): Make downscaled chart PNGs and
+                inline them into the returned image information
+            route (str, optional): Entry point that started the run ("query",
+                "stream", "batch" or "replay"), recorded in the query history
             
-            Example of what you should NOT do:
-            "Here is the analysis result with a visualization. ![Chart](https://example.com/image/123e4567-e89b-12d3-a456-426614174000)"
+        Returns:
+            dict: The response from the CrewAI agents with image information
             
-            The system needs the exact Image ID format to properly display the images to the user.
-            If you change the format, the images will not be displayed correctly.
-            """,
-            expected_output="A comprehensive response that addresses the user's query with insights from the data analysis"
-        )
+        Raises:
+            CrewCancelledError: If cancel_token is cancelled before the run completes
+        """
+        if cancel_token is None:
+            cancel_token = CancellationToken()
         
-        # 不再設置 dependencies，因為 Task 對象沒有這個字段
-        # consultation_task.dependencies = [analysis_task]
+        # Timings, token usage and cache outcome of this run, for the query history
+        run_start = time.perf_counter()
+        metrics = RunMetrics()
+        record = QueryRecord(
+            run_id=str(uuid.uuid4()),
+            query=query,
+            route=route,
+            status="error",
+            context=context,
+            session_id=session_id,
+            priority=priority
+        )
         
+        # Summary of earlier turns so follow-ups build on previous analysis
+        history = ""
+        history_section = ""
+        if session_id:
+            history = self.session_store.summarize(session_id)
+            if history:
+                history_section = f"""
+            Conversation so far (use it to interpret follow-up questions and reuse earlier results
+            instead of repeating the analysis from scratch):
+            {history}
+            """
+
         try:
             print(f"Starting crew with query: {query}")
             
-            # Create crew with hierarchical process
-            # Set consultant as the manager and analyst as the worker
-            crew = Crew(
-                agents=[analyst],  # 只包含工作者代理，不包含管理者代理
-                tasks=[analysis_task],  # 只包含工作者的任務，管理者的任務由 CrewAI 自動處理
-                verbose=True,
-                process=Process.hierarchical,  # Use hierarchical process instead of sequential
-                manager_agent=consultant,  # Explicitly set consultant as the manager
-                planning=True  # 啟用規劃功能，幫助管理者更好地組織任務
-            )
+            # Only the tables, columns and past questions relevant to this query
+            # (the index may read datasets from disk, so not on the event loop)
+            with metrics.stage("metadata_retrieval"):
+                datasets = await asyncio.to_thread(self.metadata_catalog.prompt_section, query)
+            datasets_section = ""
+            if datasets:
+                datasets_section = f"""
+            Datasets and columns relevant to this question (use the compute_data tool on them;
+            never invent numbers):
+            {datasets}
+            compute_data runs filter/derive/groupby/resample/rolling/pivot/sort/select/limit steps
+            and returns a summary with a dataset_id. Pass that dataset_id to create_chart instead
+            of copying rows into data, or to compute_data for further steps.
+            """
             
-            # Run the crew
-            result = crew.kickoff()
-            print(f"Raw result from crew: {result.raw}")
-            print(f"Result type: {type(result)}")
-            print(f"Result.raw type: {type(result.raw)}")
+            # Run the crews in worker threads so the event loop stays free to
+            # notice client disconnects. The token is visible to the agents, the
+            # LLM and the tools through the copied context.
+            cancel_token.raise_if_cancelled()
+            artifacts = ArtifactRegistry(chart_format=chart_format, inline_thumbnails=inline_thumbnails)
+            token_reset = current_cancellation_token.set(cancel_token)
+            priority_reset = current_llm_priority.set(priority)
+            artifacts_reset = current_artifact_registry.set(artifacts)
+            listener_reset = current_progress_listener.set(on_event)
+            metrics_reset = current_run_metrics.set(metrics)
+            try:
+                with metrics.stage("crew"), memory_profiler.track_run(metrics):
+                    # Independent parts of a multi-part question run as parallel analyst crews
+                    parts = await self.decompose_query(query, history)
+                    if parts:
+                        result_text, token_usage = await self.run_parallel_analyses(
+                            query, parts, history_section, artifacts, datasets_section
+                        )
+                    else:
+                        result_text, token_usage = await self.run_hierarchical_crew(
+                            query, history_section, datasets_section
+                        )
+            finally:
+                release_finished_task_spans()
+                current_run_metrics.reset(metrics_reset)
+                current_progress_listener.reset(listener_reset)
+                current_artifact_registry.reset(artifacts_reset)
+                current_llm_priority.reset(priority_reset)
+                current_cancellation_token.reset(token_reset)
+            cancel_token.raise_if_cancelled()
             
-            # 確保 result.raw 是字符串類型
-            result_text = str(result.raw) if result.raw is not None else ""
+            # 只記錄摘要：完整結果可能很大，長時間運行的 worker 不應重複輸出
+            logger.debug(f"Crew result ({len(result_text)} chars): {result_text[:LOG_EXCERPT_CHARS]}")
             
-            # Extract image IDs from the result
-            image_ids = self.extract_image_ids(result_text)
+            # Images registered by the chart tools during this run
+            charts = artifacts.list(kind="image")
+            image_ids = [chart.id for chart in charts]
+            record.chart_ids = image_ids
+            record.token_usage = token_usage
             
             # Create image info objects with full URLs
-            images = []
-            # 添加時間戳以防止緩存問題
             timestamp = int(time.time())
+            images = [
+                self.image_info(chart.id, timestamp, chart.spec, inline_thumbnails)
+                for chart in charts
+            ]
             
-            for image_id in image_ids:
-                images.append(
-                    ImageInfo(
-                        id=image_id,
-                        url=f"{BASE_URL}/static/images/{image_id}.png?t={timestamp}"
+            if session_id:
+                self.session_store.record_turn(
+                    session_id,
+                    ConversationTurn(
+                        query=query,
+                        response=result_text,
+                        # Specs only; image IDs mean nothing to the crew in a later turn
+                        charts=[
+                            {
+                                "title": chart.title,
+                                "chart_type": chart.spec.get("chart_type"),
+                                "x": chart.spec.get("x"),
+                                "y": chart.spec.get("y") or [],
+                                "value": chart.spec.get("value"),
+                            }
+                            for chart in charts
+                        ],
+                        # Computed results stay addressable by follow-up questions
+                        datasets=[
+                            {"id": dataset.id, "description": dataset.title}
+                            for dataset in artifacts.list(kind="dataset")
+                        ]
                     )
                 )
             
@@ -280,16 +680,101 @@ class CrewService:
                 "query": query,
                 "result": result_text,
                 "images": images,
-                "context": context
+                "context": context,
+                "session_id": session_id,
+                "token_usage": token_usage
             }
             
-            print(f"Returning response data: {response_data}")
-            print(f"Response data keys: {response_data.keys()}")
-            print(f"Response data['result'] type: {type(response_data['result'])}")
-            print(f"Response data['images'] type: {type(response_data['images'])}")
+            logger.debug(f"Returning response with {len(images)} images for session {session_id}")
             
+            record.status = "ok"
             return response_data
+        except CrewCancelledError:
+            record.status = "cancelled"
+            raise
         except Exception as e:
             print(f"Error in process_query_with_crew: {str(e)}")
+            record.error = str(e)
             # 重新拋出異常，以便上層處理
-            raise 
\ No newline at end of file
+            raise
+        finally:
+            if self.query_history is not None:
+                record.total_ms = round((time.perf_counter() - run_start) * 1000, 1)
+                record.stages_ms = metrics.stages_ms()
+                record.counters = metrics.counters()
+                self.query_history.record(record)
+    
+    async def replay_top_queries(self, limit, scheduler, parallelism=None):
+        """Re-run the most frequent recent queries to warm the caches.
+        
+        Replays go through the normal crew path in the rate limiter's batch
+        lane, so their LLM completions land in the completion cache and the
+        chart render workers are exercised, without delaying interactive users.
+        Each replay also waits for a crew slot in the query scheduler at batch
+        priority under the replay tenant, like /chat/batch items.
+        
+        Args:
+            limit (int): Number of top historical queries to replay
+            scheduler (QueryScheduler): Admits each replayed run
+            parallelism (int, optional): Concurrent replays; defaults to
+                config.HISTORY_REPLAY_PARALLELISM
+            
+        Returns:
+            dict: Summary of the replay (queries, succeeded, failed, wall time)
+        """
+        since = time.time() - config.HISTORY_REPLAY_WINDOW_DAYS * 86400
+        queries = self.query_history.top_queries(limit, since=since) if self.query_history else []
+        semaphore = asyncio.Semaphore(max(1, parallelism or config.HISTORY_REPLAY_PARALLELISM))
+        start = time.perf_counter()
+        
+        async def replay(entry):
+            async with semaphore:
+                try:
+                    async with scheduler.slot(REPLAY_TENANT, BATCH) as ticket:
+                        result = await self.process_query_with_crew(
+                            entry["query"], entry["context"], priority=BATCH, route="replay"
+                        )
+                        ticket.charge(result)
+                    return True
+                except Exception as e:
+                    print(f"Replay of '{entry['query']}' failed: {str(e)}")
+                    return False
+        
+        outcomes = await asyncio.gather(*(replay(entry) for entry in queries))
+        summary = {
+            "queries": [entry["query"] for entry in queries],
+            "succeeded": sum(outcomes),
+            "failed": len(outcomes) - sum(outcomes),
+            "wall_time_ms": round((time.perf_counter() - start) * 1000, 1),
+            "finished_at": time.time()
+        }
+        self._last_replay = summary
+        return summary
+    
+    def start_replay(self, limit, scheduler, parallelism=None):
+        """Start replay_top_queries in the background unless one is running.
+        
+        Returns:
+            asyncio.Task or None: The replay task, or None if a replay is
+            already in progress
+        """
+        if self._replay_task is not None and not self._replay_task.done():
+            return None
+        self._replay_task = asyncio.create_task(self.replay_top_queries(limit, scheduler, parallelism))
+        return self._replay_task
+    
+    def replay_status(self):
+        """Whether a replay is running, and the summary of the last finished one."""
+        return {
+            "running": self._replay_task is not None and not self._replay_task.done(),
+            "last_replay": self._last_replay
+        }
+    
+    def close(self):
+        """Release the completion cache and flush the query history."""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+        if self.llm_cache:
+            self.llm_cache.close()
+        if self.query_history:
+            self.query_history.close()
@@ -0,0 +1,136 @@
+"""
+Registered datasets and compute results.
+
+Datasets are CSV or Parquet files dropped into DATASETS_DIR and addressed by
+their file name without extension ("sales" for sales.csv). Every computation
+writes its result as a new Parquet dataset in DATASET_RESULTS_DIR, addressed
+by the returned dataset_id, so later computations and the chart tools can use
+it without the rows passing through the LLM. Results expire after
+DATASET_RESULT_TTL seconds.
+
+pandas is only imported when a schema or rows are actually read.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+# Dataset IDs are file stems; anything else (paths, "..") is rejected
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+_EXTENSIONS = (".parquet", ".csv")
+_RESULT_PREFIX = "result_"
+
+
+class DatasetNotFoundError(LookupError):
+    """No registered dataset or live result has this ID."""
+
+
+class DatasetCatalog:
+    """Registered datasets, their schemas (cached by file mtime) and compute results."""
+
+    def __init__(self, datasets_dir: str, results_dir: str, result_ttl: float = 86400):
+        self.datasets_dir = datasets_dir
+        self.results_dir = results_dir
+        self.result_ttl = result_ttl
+        self._schemas: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, dataset_id: str) -> str:
+        """
+        File of a registered dataset or of a compute result.
+
+        Raises:
+            DatasetNotFoundError: If the ID is unknown, malformed or expired
+        """
+        if not dataset_id or not _SAFE_NAME.match(dataset_id):
+            raise DatasetNotFoundError(f"Invalid dataset ID: {dataset_id!r}")
+        if dataset_id.startswith(_RESULT_PREFIX):
+            path = os.path.join(self.results_dir, f"{dataset_id}.parquet")
+            if os.path.isfile(path):
+                return path
+        else:
+            for extension in _EXTENSIONS:
+                path = os.path.join(self.datasets_dir, f"{dataset_id}{extension}")
+                if os.path.isfile(path):
+                    return path
+        raise DatasetNotFoundError(f"Unknown dataset: {dataset_id!r}")
+
+    def new_result(self) -> Tuple[str, str]:
+        """Allocate a result dataset, returning its ID and the path to write it to."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.cleanup_results()
+        dataset_id = f"{_RESULT_PREFIX}{uuid.uuid4().hex}"
+        return dataset_id, os.path.join(self.results_dir, f"{dataset_id}.parquet")
+
+    def cleanup_results(self) -> int:
+        """Delete results older than the TTL; returns how many were removed."""
+        if not os.path.isdir(self.results_dir):
+            return 0
+        cutoff = time.time() - self.result_ttl
+        removed = 0
+        for entry in os.scandir(self.results_dir):
+            if not entry.name.startswith(_RESULT_PREFIX):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _schema(self, dataset_id: str, path: str) -> Dict[str, Any]:
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._schemas.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        from app.tools.compute_engine import read_schema
+
+        # Metadata and a small sample only; whole datasets are loaded in compute workers
+        schema = {"id": dataset_id, **read_schema(path)}
+        # Results are read once by the tools; only registered datasets are cached
+        if not dataset_id.startswith(_RESULT_PREFIX):
+            with self._lock:
+                self._schemas[path] = (mtime, schema)
+        return schema
+
+    def registered(self) -> List[Dict[str, Any]]:
+        """Schemas of the registered datasets, sorted by ID."""
+        if not os.path.isdir(self.datasets_dir):
+            return []
+        schemas = []
+        for name in sorted(os.listdir(self.datasets_dir)):
+            stem, extension = os.path.splitext(name)
+            if extension not in _EXTENSIONS or not _SAFE_NAME.match(stem) or stem.startswith(_RESULT_PREFIX):
+                continue
+            try:
+                schemas.append(self._schema(stem, os.path.join(self.datasets_dir, name)))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable dataset {name}: {str(e)}")
+        return schemas
+
+    def info(self, dataset_id: str) -> Dict[str, Any]:
+        """Schema of a registered dataset or result."""
+        return self._schema(dataset_id, self.path(dataset_id))
+
+    def load_rows(self, dataset_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rows of a dataset as JSON-safe dicts (at most `limit`)."""
+        from app.tools.compute_engine import frame_records, load_frame
+
+        return frame_records(load_frame(self.path(dataset_id), limit), limit)
+
+
+dataset_catalog = DatasetCatalog(
+    datasets_dir=config.DATASETS_DIR,
+    results_dir=config.DATASET_RESULTS_DIR,
+    result_ttl=config.DATASET_RESULT_TTL
+)
@@ -0,0 +1,111 @@
+"""
+Decomposition of multi-part questions into independent sub-analyses.
+
+A question such as "compare revenue, churn and CAC by quarter" holds several
+analyses that do not depend on each other. CrewService asks the planner LLM to
+split such questions, runs one analyst crew per part concurrently and has the
+consultant merge their findings. Only questions that look like several
+analyses (see may_have_parts) are sent to the planner; a plain breakdown such
+as "sales by region and month" skips the LLM call.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+# Separators of list items (English and Chinese); "vs" lists compared targets
+_LIST_SEPARATORS = re.compile(r",|;|\band\b|\bvs\.?\b|\bversus\b|、|，|；|以及|和|與|跟", re.IGNORECASE)
+# Words introducing the dimensions an analysis is broken down by
+_BREAKDOWNS = re.compile(r"\bby\b|\bper\b|\bfor each\b|\bacross\b", re.IGNORECASE)
+_QUESTION_MARKS = re.compile(r"[?？]")
+
+DECOMPOSITION_PROMPT = """You split business data questions into independent sub-analyses.
+
+A sub-analysis is independent when it can be answered without the results of
+the others, so all of them can be worked on in parallel. Do not split a
+question whose parts depend on each other (for example "find the best region,
+then break down its sales"), and do not invent parts the user did not ask for.
+
+Return only JSON of the form
+{{"sub_analyses": [{{"title": "<short title>", "question": "<self-contained question>"}}]}}
+with at most {limit} entries. Each question must make sense on its own: repeat
+the shared dimensions, filters and time ranges of the original question.
+Return a single entry when the question is one analysis.
+{history}
+User question: {query}"""
+
+
+@dataclass
+class SubAnalysis:
+    """One independent part of a user question."""
+
+    title: str
+    question: str
+
+
+def may_have_parts(query: str) -> bool:
+    """Whether the query may hold several analyses, so is worth a planner call.
+
+    True for several questions (lines or question marks), for several
+    breakdowns joined by a separator ("sales by region and revenue by
+    quarter"), and for a list of metrics or targets ahead of the breakdown
+    ("revenue, churn and CAC by quarter", "revenue vs cost by month"). A list
+    of dimensions after "by" is one analysis; without a breakdown, it takes a
+    list of three items to count as an enumeration.
+    """
+    lines = [line for line in query.splitlines() if line.strip()]
+    if len(lines) > 1 or len(_QUESTION_MARKS.findall(query)) > 1:
+        return True
+    breakdowns = list(_BREAKDOWNS.finditer(query))
+    if len(breakdowns) > 1 and _LIST_SEPARATORS.search(query[breakdowns[0].end():breakdowns[-1].start()]):
+        return True
+    head = query[:breakdowns[0].start()] if breakdowns else query
+    return len(_LIST_SEPARATORS.findall(head)) >= (1 if breakdowns else 2)
+
+
+def build_decomposition_messages(query: str, limit: int, history: str = "") -> List[Dict[str, str]]:
+    """Chat messages asking the LLM to split `query` into at most `limit` parts."""
+    history_section = f"\nEarlier conversation, for context:\n{history}\n" if history else ""
+    return [{
+        "role": "user",
+        "content": DECOMPOSITION_PROMPT.format(limit=limit, history=history_section, query=query),
+    }]
+
+
+def parse_sub_analyses(text: str, limit: int) -> List[SubAnalysis]:
+    """Sub-analyses from the LLM's JSON answer; empty if it cannot be parsed.
+
+    Tolerates code fences and text around the JSON object, drops entries
+    without a question and keeps at most `limit` of them.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return []
+    try:
+        data: Any = json.loads(text[start:end + 1])
+    except ValueError:
+        return []
+    entries = data.get("sub_analyses") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return []
+    parts = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        question = str(entry.get("question") or "").strip()
+        if not question:
+            continue
+        title = str(entry.get("title") or "").strip() or question[:60]
+        parts.append(SubAnalysis(title=title, question=question))
+    return parts[:limit]
+
+
+def merge_token_usage(usages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum the numeric token usage fields of several crew runs."""
+    total: Dict[str, Any] = {}
+    for usage in usages:
+        for name, value in usage.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[name] = total.get(name, 0) + value
+    return total
@@ -0,0 +1,97 @@
+"""
+LLM wrapper used by the CrewAI agents.
+
+CrewAI converts any LangChain chat model it is given into its own litellm-based
+LLM, so per-call behaviour has to be hooked in by subclassing crewai.LLM.
+"""
+
+import threading
+
+from crewai import LLM
+
+from app.services.cancellation import raise_if_cancelled
+from app.services.llm_cache import LLMResponseCache
+from app.services.rate_limiter import LLMRateLimiter, estimate_tokens
+from app.services.run_metrics import record_counter, timed_stage
+
+
+class ManagedLLM(LLM):
+    """crewai.LLM with cancellation checks, rate limiting and memoization.
+
+    Args:
+        role: Crew role this instance serves (planner, manager or analyst)
+        rate_limiter: Limiter shared by every agent of the owning CrewService;
+            calls go straight to the provider when omitted
+        cache: Completion cache; low-temperature text completions are served
+            from it when given
+        max_concurrency: Completions of this instance in flight at once; further
+            calls wait (0 for no limit)
+        **kwargs: Passed through to crewai.LLM
+    """
+
+    def __init__(
+        self,
+        *args,
+        role: str = None,
+        rate_limiter: LLMRateLimiter = None,
+        cache: LLMResponseCache = None,
+        max_concurrency: int = 0,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.role = role
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        raise_if_cancelled()
+
+        # Function-calling responses depend on tool state, so only plain text
+        # completions are memoized
+        cache_key = None
+        if self.cache is not None and not tools and self.cache.is_cacheable(self.temperature):
+            cache_key = self.cache.make_key(self.model, self.temperature, messages, self.stop)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                record_counter("llm_cache_hits")
+                return cached
+            record_counter("llm_cache_misses")
+
+        def send():
+            raise_if_cancelled()
+            return self._complete(messages, tools, callbacks, available_functions)
+
+        record_counter("llm_calls")
+        self._acquire_slot()
+        try:
+            with timed_stage("llm"):
+                if self.rate_limiter is None:
+                    response = send()
+                else:
+                    response = self.rate_limiter.call(send, estimate_tokens(messages, self.max_tokens))
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+        if cache_key is not None and isinstance(response, str) and response:
+            self.cache.set(cache_key, self.model, response)
+        return response
+
+    def _acquire_slot(self):
+        """Wait for one of the role's concurrency slots, staying cancellable."""
+        if self._slots is None or self._slots.acquire(blocking=False):
+            return
+        with timed_stage("llm_slot_wait"):
+            while not self._slots.acquire(timeout=0.25):
+                raise_if_cancelled()
+
+    def _complete(self, messages, tools=None, callbacks=None, available_functions=None):
+        """Send one completion request to the provider (through litellm)."""
+        return super().call(
+            messages,
+            tools=tools,
+            callbacks=callbacks,
+            available_functions=available_functions,
+        )
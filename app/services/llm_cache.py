@@ -0,0 +1,121 @@
+"""
+Persistent memoization of LLM completions.
+
+Planning prompts and tool-description preambles repeat verbatim across crew
+runs. LLMResponseCache stores completions in a local SQLite database keyed by
+a hash of (model, temperature, stop words, messages) and evicts the least
+recently used entries once it grows past `max_entries`.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+
+class LLMResponseCache:
+    """Size-bounded, thread-safe SQLite cache of LLM completions.
+
+    Args:
+        path: Location of the SQLite database file
+        max_entries: Number of completions kept before LRU eviction
+        max_temperature: Calls sampled above this temperature are never cached
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, max_temperature: float = 0.2):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used)"
+        )
+        self._conn.commit()
+
+    def is_cacheable(self, temperature: Optional[float]) -> bool:
+        """Whether a call at this temperature is deterministic enough to memoize."""
+        return temperature is not None and temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: Optional[float],
+        messages: Union[str, List[Dict[str, Any]]],
+        stop: Optional[List[str]] = None,
+    ) -> str:
+        """Hash everything that determines a completion into a cache key."""
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "stop": stop or [], "messages": messages},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self._stats["hits"] += 1
+            return row[0]
+
+    def set(self, key: str, model: str, response: str) -> None:
+        """Store a completion, evicting the least recently used entries if needed."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._stats["stores"] += 1
+            count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_entries:
+                # Evict down to 90% so eviction does not run on every insert
+                excess = count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._stats["evictions"] += excess
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            return {"entries": entries, "max_entries": self.max_entries, **self._stats}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
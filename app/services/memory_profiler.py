@@ -0,0 +1,264 @@
+"""
+Opt-in memory profiling and stack sampling for long-running workers.
+
+MemoryProfiler reports what tends to accumulate in a worker that runs for days:
+tracemalloc allocation growth since a baseline snapshot, live Matplotlib
+figures, live CrewAI agents, tasks and crews, and process RSS. While it is
+running, a background thread samples RSS so every crew run records the peak
+memory reached while it was active (the process-wide peak, since concurrent
+runs share the heap).
+
+sample_stacks() is an in-process sampling profiler whose output uses the
+collapsed-stack format of `py-spy record --format raw`, so it can be fed to
+flamegraph.pl or speedscope without installing py-spy on the server.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core import config
+from app.services.run_metrics import RunMetrics
+
+# Objects counted by live_object_counts: label -> (module, class name)
+TRACKED_TYPES = {
+    "crewai_agents": ("crewai.agent", "Agent"),
+    "crewai_tasks": ("crewai.task", "Task"),
+    "crewai_crews": ("crewai.crew", "Crew"),
+    "managed_llms": ("app.services.llm", "ManagedLLM"),
+    "matplotlib_figures": ("matplotlib.figure", "Figure"),
+}
+
+# Innermost functions of threads that are waiting rather than working
+_IDLE_FUNCTIONS = {"wait", "select", "poll", "epoll", "sleep", "accept", "_wait_for_tstate_lock", "get"}
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, in KiB on Linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def open_pyplot_figures() -> Optional[int]:
+    """Figures held open by pyplot's global figure manager, if pyplot is loaded."""
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return len(pyplot.get_fignums()) if pyplot is not None else None
+
+
+def live_object_counts() -> Dict[str, int]:
+    """Live instances of the TRACKED_TYPES whose modules are loaded.
+
+    Walks every object tracked by the garbage collector after a full
+    collection, so only call it on demand.
+    """
+    classes = {}
+    for label, (module_name, class_name) in TRACKED_TYPES.items():
+        module = sys.modules.get(module_name)
+        cls = getattr(module, class_name, None) if module is not None else None
+        if isinstance(cls, type):
+            classes[label] = cls
+    counts = {label: 0 for label in classes}
+    if not classes:
+        return counts
+    gc.collect()
+    # type() rather than isinstance(), which would trigger __class__ lookups on
+    # lazy proxy objects (openai's module client loads itself on any access)
+    labels_by_type: Dict[type, List[str]] = {}
+    for obj in gc.get_objects():
+        obj_type = type(obj)
+        labels = labels_by_type.get(obj_type)
+        if labels is None:
+            labels = labels_by_type[obj_type] = [
+                label for label, cls in classes.items() if issubclass(obj_type, cls)
+            ]
+        for label in labels:
+            counts[label] += 1
+    return counts
+
+
+def sample_stacks(duration: float, interval: float = 0.01, include_idle: bool = False) -> str:
+    """Sample the Python stacks of every other thread for `duration` seconds.
+
+    Args:
+        duration: How long to sample
+        interval: Seconds between samples
+        include_idle: Also count threads that are blocked waiting
+
+    Returns:
+        One "thread;frame;...;frame count" line per distinct stack, outermost
+        frame first, most frequent first (py-spy's raw format)
+    """
+    me = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if not include_idle and frame.f_code.co_name in _IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(f"{names.get(ident, 'thread')} ({ident})")
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+
+
+class MemoryProfiler:
+    """Process-wide memory reporting with per-run peak tracking.
+
+    Args:
+        sample_interval: Seconds between RSS samples taken for active runs
+    """
+
+    def __init__(self, sample_interval: float = 0.05):
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, RunMetrics] = {}
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def start(self, tracemalloc_frames: int = 0) -> None:
+        """Start per-run peak tracking, and tracemalloc when frames > 0."""
+        if tracemalloc_frames > 0:
+            self.start_tracing(tracemalloc_frames)
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="memory-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        self.stop_tracing()
+
+    def start_tracing(self, frames: int = 10) -> None:
+        """Start tracemalloc (it slows allocation-heavy code noticeably)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracing(self) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._baseline = None
+        self._baseline_at = None
+
+    def take_baseline(self) -> None:
+        """Snapshot current allocations; later reports show growth since then."""
+        self.start_tracing()
+        gc.collect()
+        self._baseline = tracemalloc.take_snapshot()
+        self._baseline_at = time.time()
+
+    def top_growth(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Source lines whose allocations grew most since the baseline."""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return []
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        stats = snapshot.filter_traces(filters).compare_to(self._baseline.filter_traces(filters), "lineno")
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ]
+
+    @contextmanager
+    def track_run(self, metrics: RunMetrics) -> Iterator[None]:
+        """Record the run's peak RSS and RSS change into its metrics."""
+        if not self.running:
+            yield
+            return
+        start_rss = current_rss_bytes()
+        key = id(metrics)
+        with self._lock:
+            self._active[key] = metrics
+        if start_rss is not None:
+            metrics.observe_max("peak_rss_bytes", start_rss)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+            end_rss = current_rss_bytes()
+            if start_rss is not None and end_rss is not None:
+                metrics.observe_max("peak_rss_bytes", end_rss)
+                metrics.incr("rss_delta_bytes", end_rss - start_rss)
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            rss = current_rss_bytes()
+            if rss is None:
+                continue
+            for metrics in active:
+                metrics.observe_max("peak_rss_bytes", rss)
+
+    def report(self, top: int = 20, include_objects: bool = True) -> Dict[str, Any]:
+        """Everything the profiler knows, for the admin endpoint."""
+        tracing = tracemalloc.is_tracing()
+        traced_current, traced_peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+        with self._lock:
+            active_runs = len(self._active)
+        return {
+            "rss_bytes": current_rss_bytes(),
+            "run_tracking": self.running,
+            "active_runs": active_runs,
+            "tracemalloc": {
+                "tracing": tracing,
+                "current_bytes": traced_current,
+                "peak_bytes": traced_peak,
+                "baseline_at": self._baseline_at,
+                "top_growth": self.top_growth(top),
+            },
+            "pyplot_open_figures": open_pyplot_figures(),
+            "live_objects": live_object_counts() if include_objects else None,
+            "gc": {"counts": gc.get_count(), "garbage": len(gc.garbage)},
+            "threads": threading.active_count(),
+        }
+
+
+# Profiler shared by the whole process (started in the application lifespan
+# when MEMORY_PROFILING is enabled)
+memory_profiler = MemoryProfiler(sample_interval=config.MEMORY_SAMPLE_INTERVAL)
@@ -0,0 +1,500 @@
+"""
+Metadata catalog: retrieval of the schema fragments relevant to a question.
+
+Listing every table and column in the analyst's prompt stops scaling after a
+few wide tables. The catalog indexes one document per registered dataset
+(table), one per column and one per past successful question, with
+descriptions from optional `<dataset>.meta.json` files next to the data:
+
+    {"description": "One row per order", "columns": {"revenue": "Net revenue in USD"}}
+
+Every document is scored by reciprocal rank fusion of a BM25 lexical index
+and the cosine similarity of embeddings. Tables are ranked by their own score
+plus the scores of their best columns, and each query gets only the top
+tables, the top-k columns within them and the closest past questions. The
+embeddings come from the all-MiniLM-L6-v2 ONNX model bundled with chromadb
+when the model is available locally, else from hashed word and character
+trigram features; both run on CPU.
+
+The index is refreshed incrementally: each source (a dataset with its
+description file, or a past question) has a fingerprint, only sources whose
+fingerprint changed are re-read, and embeddings are cached by document text.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.datasets import DatasetCatalog
+from app.services.query_history import query_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters and the reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Documents ranked by embedding similarity (above the embedder's floor) that
+# take part in the fusion
+SEMANTIC_CANDIDATES = 100
+
+# Column scores added to their table's score when ranking tables, and the
+# fraction of the best table's score other tables need to be included
+TABLE_COLUMN_VOTES = 3
+TABLE_SCORE_RATIO = 0.5
+
+# Columns listed for a retrieved table when none of its columns was retrieved
+DEFAULT_TABLE_COLUMNS = 10
+
+# Past questions included per query
+MAX_PAST_QUESTIONS = 3
+
+_CAMEL_CASE = re.compile(r"([a-z])([A-Z])")
+_WORDS = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our per show "
+    "than that the their this to us was we what when which who why with".split()
+)
+
+# Where chromadb keeps the downloaded MiniLM model (see ONNXMiniLM_L6_V2.DOWNLOAD_PATH)
+_ONNX_MODEL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "chroma", "onnx_models", "all-MiniLM-L6-v2", "onnx")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of a text for the lexical index.
+
+    snake_case and camelCase identifiers are split into words, common English
+    stopwords are dropped, so is a trailing plural "s", and Chinese runs become
+    character bigrams.
+    """
+    tokens = []
+    for word in _WORDS.findall(_CAMEL_CASE.sub(r"\1 \2", text).lower()):
+        if "\u4e00" <= word[0] <= "\u9fff":
+            tokens.extend([word] if len(word) == 1 else [word[i:i + 2] for i in range(len(word) - 1)])
+        elif word in _STOPWORDS:
+            continue
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            tokens.append(word[:-1])
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over tokenized documents."""
+
+    def __init__(self, documents: List[List[str]]):
+        self.size = len(documents)
+        self.lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if self.size else 0.0
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for number, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                self.postings[term].append((number, count))
+
+    def scores(self, query: List[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        if not self.size:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.average_length, 1e-9))
+        for term in set(query):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            numbers = np.fromiter((number for number, _ in postings), dtype=np.int64, count=len(postings))
+            counts = np.fromiter((count for _, count in postings), dtype=np.float32, count=len(postings))
+            scores[numbers] += idf * counts * (BM25_K1 + 1) / (counts + norm[numbers])
+        return scores
+
+
+class HashingEmbedder:
+    """Normalized vectors of hashed words and character trigrams (no model needed)."""
+    name = "hashing"
+    # Hash collisions give unrelated texts small positive similarities
+    min_similarity = 0.2
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                features = [(token, 1.0)]
+                if len(token) > 3:
+                    padded = f"#{token}#"
+                    features.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+                for feature, weight in features:
+                    bucket = zlib.crc32(feature.encode("utf-8"))
+                    sign = 1.0 if bucket & 0x80000000 else -1.0
+                    vectors[row, bucket % self.dimensions] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class OnnxMiniLMEmbedder:
+    """all-MiniLM-L6-v2 sentence embeddings through chromadb's ONNX runtime wrapper."""
+    name = "onnx-minilm"
+    min_similarity = 0.2
+
+    def __init__(self):
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+        self._model = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self._model(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+def create_embedder(mode: str):
+    """
+    Embedding backend for a METADATA_EMBEDDINGS setting.
+
+    "onnx" uses MiniLM, downloading it on first use; "auto" uses it only when
+    it is already downloaded; "hashing", or any failure, uses HashingEmbedder.
+    """
+    if mode == "onnx" or (mode == "auto" and os.path.isdir(_ONNX_MODEL_DIR)):
+        try:
+            embedder = OnnxMiniLMEmbedder()
+            embedder.embed(["warm up"])
+            return embedder
+        except Exception as e:
+            logger.warning(f"MiniLM embeddings unavailable, using hashed features: {str(e)}")
+    return HashingEmbedder()
+
+
+@dataclass
+class MetadataDocument:
+    """One retrievable fragment: a table, a column or a past question."""
+    id: str
+    kind: str
+    text: str
+    table: Optional[str] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Index:
+    """Immutable snapshot searched by retrieve(); replaced as a whole on refresh."""
+    documents: List[MetadataDocument]
+    bm25: BM25Index
+    vectors: np.ndarray
+    tables: Dict[str, MetadataDocument]
+
+
+def _file_fingerprint(*paths: str) -> str:
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append("-")
+    return "/".join(parts)
+
+
+class MetadataCatalog:
+    """Hybrid lexical/embedding index over dataset metadata and past questions."""
+
+    def __init__(
+        self,
+        datasets: DatasetCatalog,
+        query_history=None,
+        top_k: int = 12,
+        top_tables: int = 3,
+        embeddings: str = "auto",
+        refresh_interval: float = 30.0,
+        past_queries: int = 200,
+        past_query_days: float = 30.0,
+    ):
+        self.datasets = datasets
+        self.query_history = query_history
+        self.top_k = top_k
+        self.top_tables = top_tables
+        self.embeddings = embeddings
+        self.refresh_interval = refresh_interval
+        self.past_queries = past_queries
+        self.past_query_days = past_query_days
+        self._embedder = None
+        # Source -> (fingerprint, documents)
+        self._sources: Dict[str, Tuple[str, List[MetadataDocument]]] = {}
+        # Text hash -> embedding, for documents that did not change
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._index: Optional[_Index] = None
+        self._last_check = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=1000)
+        self._stats = {"refreshes": 0, "sources_reindexed": 0, "documents_embedded": 0, "retrievals": 0}
+        self._last_refresh_ms: Optional[float] = None
+
+    def _scan_datasets(self) -> Dict[str, str]:
+        fingerprints = {}
+        for schema in self.datasets.registered():
+            dataset_id = schema["id"]
+            fingerprints[f"dataset:{dataset_id}"] = _file_fingerprint(
+                self.datasets.path(dataset_id), self._description_path(dataset_id)
+            )
+        return fingerprints
+
+    def _description_path(self, dataset_id: str) -> str:
+        return os.path.join(self.datasets.datasets_dir, f"{dataset_id}.meta.json")
+
+    def _load_descriptions(self, dataset_id: str) -> Dict[str, Any]:
+        path = self._description_path(dataset_id)
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                descriptions = json.load(f)
+            return descriptions if isinstance(descriptions, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable description file {path}: {str(e)}")
+            return {}
+
+    def _dataset_documents(self, dataset_id: str) -> List[MetadataDocument]:
+        schema = self.datasets.info(dataset_id)
+        descriptions = self._load_descriptions(dataset_id)
+        column_descriptions = descriptions.get("columns") or {}
+        description = str(descriptions.get("description") or "")
+        columns = schema["columns"]
+        documents = [MetadataDocument(
+            id=f"table:{dataset_id}",
+            kind="table",
+            table=dataset_id,
+            text=" ".join([
+                dataset_id, description, *(column["name"] for column in columns),
+                *(str(text) for text in column_descriptions.values())
+            ]),
+            meta={"rows": schema["rows"], "description": description, "columns": columns},
+        )]
+        for column in columns:
+            column_description = str(column_descriptions.get(column["name"]) or "")
+            documents.append(MetadataDocument(
+                id=f"column:{dataset_id}.{column['name']}",
+                kind="column",
+                table=dataset_id,
+                # Without the table name, so a table's columns do not all match its name
+                text=f"{column['name']} {column['type']} {column_description}",
+                meta={"name": column["name"], "type": column["type"], "description": column_description},
+            ))
+        return documents
+
+    def _past_query_documents(self) -> Dict[str, Tuple[str, List[MetadataDocument]]]:
+        if self.query_history is None or self.past_queries <= 0:
+            return {}
+        since = time.time() - self.past_query_days * 86400
+        sources = {}
+        for entry in self.query_history.top_queries(self.past_queries, since=since):
+            fingerprint = query_fingerprint(entry["query"], entry["context"])
+            # A question's text never changes, so its fingerprint is its identity
+            sources[f"query:{fingerprint}"] = (fingerprint, [MetadataDocument(
+                id=f"query:{fingerprint}", kind="query", text=entry["query"], meta={"runs": entry["runs"]}
+            )])
+        return sources
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-index the sources that changed since the last refresh.
+
+        Runs at most every `refresh_interval` seconds unless forced. Blocking
+        (it may read datasets and run the embedding model).
+
+        Returns:
+            Whether the index changed
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not force and self._index is not None and now - self._last_check < self.refresh_interval:
+                return False
+            self._last_check = now
+            start = time.perf_counter()
+
+            current = {source: (fingerprint, None) for source, fingerprint in self._scan_datasets().items()}
+            current.update(self._past_query_documents())
+            changed = [source for source, (fingerprint, _) in current.items()
+                       if self._sources.get(source, (None,))[0] != fingerprint]
+            removed = [source for source in self._sources if source not in current]
+            if not changed and not removed and self._index is not None:
+                return False
+
+            for source in removed:
+                del self._sources[source]
+            for source in changed:
+                fingerprint, documents = current[source]
+                if documents is None:
+                    try:
+                        documents = self._dataset_documents(source.split(":", 1)[1])
+                    except Exception as e:
+                        logger.warning(f"Could not index {source}: {str(e)}")
+                        self._sources.pop(source, None)
+                        continue
+                self._sources[source] = (fingerprint, documents)
+            self._rebuild()
+
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            with self._stats_lock:
+                self._stats["refreshes"] += 1
+                self._stats["sources_reindexed"] += len(changed)
+                self._last_refresh_ms = elapsed_ms
+            logger.info(
+                "Metadata catalog refreshed: %d sources changed, %d removed, %d documents (%.1f ms)",
+                len(changed), len(removed), len(self._index.documents), elapsed_ms
+            )
+            return True
+
+    def _rebuild(self) -> None:
+        documents = [document for _, source_documents in self._sources.values() for document in source_documents]
+        if self._embedder is None:
+            self._embedder = create_embedder(self.embeddings)
+        keys = [hashlib.sha1(document.text.encode("utf-8")).hexdigest() for document in documents]
+        missing = sorted({key for key in keys if key not in self._vectors})
+        if missing:
+            texts = {key: document.text for key, document in zip(keys, documents)}
+            for key, vector in zip(missing, self._embedder.embed([texts[key] for key in missing])):
+                self._vectors[key] = vector
+            with self._stats_lock:
+                self._stats["documents_embedded"] += len(missing)
+        # Forget embeddings of documents that no longer exist
+        self._vectors = {key: self._vectors[key] for key in keys}
+        vectors = np.vstack([self._vectors[key] for key in keys]) if keys else np.zeros((0, 1), dtype=np.float32)
+        self._index = _Index(
+            documents=documents,
+            bm25=BM25Index([tokenize(document.text) for document in documents]),
+            vectors=vectors,
+            tables={document.table: document for document in documents if document.kind == "table"},
+        )
+
+    def _fused_scores(self, index: _Index, query: str) -> np.ndarray:
+        fused = np.zeros(len(index.documents), dtype=np.float32)
+        lexical = index.bm25.scores(tokenize(query))
+        hits = np.flatnonzero(lexical > 0)
+        for rank, number in enumerate(hits[np.argsort(-lexical[hits], kind="stable")]):
+            fused[number] += 1.0 / (RRF_K + rank + 1)
+        semantic = index.vectors @ self._embedder.embed([query])[0]
+        candidates = np.argsort(-semantic, kind="stable")[:SEMANTIC_CANDIDATES]
+        similar = [number for number in candidates if semantic[number] >= self._embedder.min_similarity]
+        for rank, number in enumerate(similar):
+            fused[number] += 1.0 / (RRF_K + rank + 1)
+        return fused
+
+    def retrieve(self, query: str, top_k: Optional[int] = None, top_tables: Optional[int] = None) -> List[MetadataDocument]:
+        """
+        The documents relevant to a query.
+
+        Returns:
+            The best `top_tables` table documents, then the best `top_k` column
+            documents of those tables, then up to MAX_PAST_QUESTIONS past
+            questions, each group best first
+        """
+        self.refresh()
+        index = self._index
+        if index is None or not index.documents:
+            return []
+        start = time.perf_counter()
+
+        fused = self._fused_scores(index, query)
+        table_scores: Dict[str, float] = defaultdict(float)
+        column_scores: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        questions = []
+        for number in np.flatnonzero(fused > 0):
+            document = index.documents[number]
+            if document.kind == "table":
+                table_scores[document.table] += float(fused[number])
+            elif document.kind == "column":
+                column_scores[document.table].append((float(fused[number]), int(number)))
+            else:
+                questions.append((float(fused[number]), int(number)))
+        # A table ranks by its own match plus its best matching columns
+        for table, scores in column_scores.items():
+            scores.sort(reverse=True)
+            table_scores[table] += sum(score for score, _ in scores[:TABLE_COLUMN_VOTES])
+        tables = sorted(table_scores, key=lambda table: -table_scores[table])[:top_tables or self.top_tables]
+        tables = [table for table in tables if table_scores[table] >= TABLE_SCORE_RATIO * table_scores[tables[0]]]
+        columns = sorted((entry for table in tables for entry in column_scores.get(table, [])), reverse=True)
+        questions.sort(reverse=True)
+
+        documents = [index.tables[table] for table in tables]
+        documents.extend(index.documents[number] for _, number in columns[:top_k or self.top_k])
+        documents.extend(index.documents[number] for _, number in questions[:MAX_PAST_QUESTIONS])
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._stats["retrievals"] += 1
+            self._latencies_ms.append(elapsed_ms)
+        return documents
+
+    def prompt_section(self, query: str) -> str:
+        """
+        Prompt text with the datasets, columns and past questions relevant to a query.
+
+        Retrieved columns are listed under their table; a table retrieved
+        without any of its columns shows its first columns. Returns "" when no
+        dataset is relevant.
+        """
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        metas: Dict[str, Dict[str, Any]] = {}
+        questions = []
+        for document in self.retrieve(query):
+            if document.kind == "table":
+                tables[document.table] = []
+                metas[document.table] = document.meta
+            elif document.kind == "column":
+                tables[document.table].append(document.meta)
+            else:
+                questions.append(document.text)
+        if not tables:
+            return ""
+
+        lines = []
+        for table, columns in tables.items():
+            meta = metas[table]
+            if not columns:
+                columns = meta["columns"][:DEFAULT_TABLE_COLUMNS]
+            header = f"- {table} ({meta['rows']} rows, {len(meta['columns'])} columns)"
+            lines.append(f"{header}: {meta['description']}" if meta["description"] else header)
+            for column in columns:
+                line = f"    {column['name']} ({column['type']})"
+                lines.append(f"{line}: {column['description']}" if column.get("description") else line)
+            if len(columns) < len(meta["columns"]):
+                lines.append(f"    ... {len(meta['columns']) - len(columns)} more columns (a compute_data limit step lists them all)")
+        if questions:
+            lines.append("Similar questions answered before:")
+            lines.extend(f"- {question}" for question in questions)
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size, embedding backend, refresh counters and retrieval latency."""
+        index = self._index
+        documents = Counter(document.kind for document in index.documents) if index else Counter()
+        with self._stats_lock:
+            latencies = sorted(self._latencies_ms)
+            stats = {
+                "embedding_backend": self._embedder.name if self._embedder else None,
+                "documents": {kind: documents.get(kind, 0) for kind in ("table", "column", "query")},
+                "last_refresh_ms": self._last_refresh_ms,
+                **self._stats,
+            }
+        stats["retrieval_ms"] = {
+            "samples": len(latencies),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2) if latencies else None,
+            "max": round(latencies[-1], 2) if latencies else None,
+        }
+        return stats
@@ -0,0 +1,45 @@
+"""
+Progress events emitted while a crew run is in flight.
+
+Streaming transports register a listener for the run; agent steps, tool calls
+and created artifacts are reported to it from the crew's worker thread. The
+listener must be thread-safe (e.g. hand events to an event loop with
+call_soon_threadsafe).
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from app.services.cancellation import raise_if_cancelled
+
+ProgressListener = Callable[[Dict[str, Any]], None]
+
+# Thoughts are truncated so progress frames stay small
+_MAX_THOUGHT_CHARS = 300
+
+# Listener of the crew run executing in the current context
+current_progress_listener: ContextVar[Optional[ProgressListener]] = ContextVar(
+    "current_progress_listener", default=None
+)
+
+
+def emit_progress(event: Dict[str, Any]) -> None:
+    """Send an event to the current run's listener, if there is one."""
+    listener = current_progress_listener.get()
+    if listener is not None:
+        listener(event)
+
+
+def agent_step_callback(step: Any) -> None:
+    """CrewAI step callback: stop cancelled runs and report the step.
+
+    Args:
+        step: The AgentAction or AgentFinish CrewAI produced for the step
+    """
+    raise_if_cancelled()
+    thought = (getattr(step, "thought", "") or "")[:_MAX_THOUGHT_CHARS]
+    tool = getattr(step, "tool", None)
+    if tool:
+        emit_progress({"type": "tool", "tool": tool, "thought": thought})
+    else:
+        emit_progress({"type": "step", "thought": thought})
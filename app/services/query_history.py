@@ -0,0 +1,238 @@
+"""
+Persistent history of crew runs.
+
+Every run's query, context, route, stage timings, token usage, chart IDs and
+LLM cache outcome is appended to a local SQLite database. Records are queued
+in memory and written by a background thread, so recording never blocks a
+request on disk I/O; when the queue is full, records are dropped and counted
+rather than slowing requests down.
+
+The history feeds analytics (which queries are common, what they cost) and
+cache warming: the most frequent recent queries can be replayed after a deploy
+so their LLM completions and render workers are warm before users ask again.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Sentinel asking the writer thread to exit
+_STOP = object()
+
+
+@dataclass
+class QueryRecord:
+    """One crew run."""
+    run_id: str
+    query: str
+    route: str
+    status: str
+    context: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
+    priority: Optional[str] = None
+    error: Optional[str] = None
+    total_ms: float = 0.0
+    stages_ms: Dict[str, float] = field(default_factory=dict)
+    token_usage: Dict[str, Any] = field(default_factory=dict)
+    chart_ids: List[str] = field(default_factory=list)
+    counters: Dict[str, int] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+
+def query_fingerprint(query: str, context: Optional[Dict[str, Any]] = None) -> str:
+    """Hash identifying repeats of a query, ignoring case and whitespace."""
+    normalized = " ".join(query.lower().split())
+    payload = json.dumps({"query": normalized, "context": context or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryHistoryStore:
+    """Append-only SQLite log of crew runs with an asynchronous writer.
+
+    Args:
+        path: Location of the SQLite database file
+        max_pending: Records buffered for the writer before new ones are dropped
+    """
+
+    def __init__(self, path: str, max_pending: int = 1000):
+        self.path = path
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "written": 0, "dropped": 0, "write_errors": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS query_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                fingerprint TEXT NOT NULL,
+                query TEXT NOT NULL,
+                context TEXT,
+                session_id TEXT,
+                route TEXT NOT NULL,
+                priority TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                total_ms REAL NOT NULL,
+                stages_ms TEXT NOT NULL,
+                token_usage TEXT NOT NULL,
+                total_tokens INTEGER,
+                chart_ids TEXT NOT NULL,
+                counters TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_query_runs_fingerprint ON query_runs (fingerprint, created_at)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_runs_created_at ON query_runs (created_at)")
+        self._conn.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, name="query-history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, record: QueryRecord) -> None:
+        """Queue a run for writing; never blocks."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["recorded"] += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Write whatever else is already waiting in the same transaction
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(entry is _STOP for entry in batch)
+            records = [entry for entry in batch if entry is not _STOP]
+            if records:
+                self._write(records)
+            if stop:
+                return
+
+    def _write(self, records: List[QueryRecord]) -> None:
+        rows = []
+        for record in records:
+            rows.append((
+                record.run_id,
+                record.created_at,
+                query_fingerprint(record.query, record.context),
+                record.query,
+                json.dumps(record.context, default=str) if record.context is not None else None,
+                record.session_id,
+                record.route,
+                record.priority,
+                record.status,
+                record.error,
+                record.total_ms,
+                json.dumps(record.stages_ms),
+                json.dumps(record.token_usage, default=str),
+                record.token_usage.get("total_tokens"),
+                json.dumps(record.chart_ids),
+                json.dumps(record.counters),
+            ))
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT INTO query_runs (run_id, created_at, fingerprint, query, context, session_id, "
+                    "route, priority, status, error, total_ms, stages_ms, token_usage, total_tokens, "
+                    "chart_ids, counters) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+                self._stats["written"] += len(rows)
+        except sqlite3.Error as e:
+            print(f"Failed to write query history: {str(e)}")
+            with self._lock:
+                self._stats["write_errors"] += len(rows)
+
+    def top_queries(self, limit: int = 10, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Most frequently run successful queries, excluding replays.
+
+        Args:
+            limit: Number of queries to return
+            since: Only count runs started after this Unix time
+
+        Returns:
+            One entry per distinct query with its latest context, run count,
+            mean latency and mean token usage, most frequent first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, context, COUNT(*), AVG(total_ms), AVG(total_tokens), MAX(created_at) "
+                "FROM query_runs WHERE status = 'ok' AND route != 'replay' AND created_at >= ? "
+                "GROUP BY fingerprint ORDER BY COUNT(*) DESC, MAX(created_at) DESC LIMIT ?",
+                (since or 0, limit),
+            ).fetchall()
+        return [
+            {
+                "query": query,
+                "context": json.loads(context) if context else None,
+                "runs": runs,
+                "mean_total_ms": round(mean_ms, 1),
+                "mean_total_tokens": round(mean_tokens) if mean_tokens is not None else None,
+                "last_run_at": last_run_at,
+            }
+            for query, context, runs, mean_ms, mean_tokens, last_run_at in rows
+        ]
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """The latest runs, newest first."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT run_id, created_at, query, context, session_id, route, priority, status, error, "
+                "total_ms, stages_ms, token_usage, chart_ids, counters "
+                "FROM query_runs ORDER BY id DESC LIMIT ?",
+                (limit,),
+            )
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        runs = []
+        for row in rows:
+            run = dict(zip(columns, row))
+            for key in ("context", "stages_ms", "token_usage", "chart_ids", "counters"):
+                run[key] = json.loads(run[key]) if run[key] else None
+            runs.append(run)
+        return runs
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters and stored run totals."""
+        with self._lock:
+            runs, tokens, mean_ms = self._conn.execute(
+                "SELECT COUNT(*), SUM(total_tokens), AVG(total_ms) FROM query_runs"
+            ).fetchone()
+            return {
+                "runs": runs,
+                "total_tokens": tokens or 0,
+                "mean_total_ms": round(mean_ms, 1) if mean_ms is not None else None,
+                "pending": self._queue.qsize(),
+                **self._stats,
+            }
+
+    def close(self) -> None:
+        """Write every queued record, then close the database."""
+        self._queue.put(_STOP)
+        self._writer.join(timeout=10)
+        with self._lock:
+            self._conn.close()
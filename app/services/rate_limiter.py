@@ -0,0 +1,328 @@
+"""
+Client-side rate limiting for LLM calls.
+
+One LLMRateLimiter is shared by every agent of a CrewService. It combines
+request and token buckets, priority lanes (interactive calls are admitted
+before batch calls), jittered exponential backoff, AIMD rate adaptation on
+429 responses and a circuit breaker that fails fast while the provider is
+unavailable.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Union
+
+from app.services.cancellation import CrewCancelledError, raise_if_cancelled
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# Priority lane of the crew run executing in the current context
+current_llm_priority: ContextVar[str] = ContextVar("current_llm_priority", default=INTERACTIVE)
+
+# Longest single wait inside the limiter, so cancellation is noticed promptly
+_WAIT_SLICE = 0.25
+
+
+class LLMUnavailableError(Exception):
+    """Raised when an LLM call is rejected by the limiter instead of being sent.
+
+    Attributes:
+        retry_after: Suggested number of seconds before trying again
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception raised by the provider is a 429 rate-limit response."""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether an exception is worth retrying (rate limits, timeouts, 5xx)."""
+    if is_rate_limit_error(error):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and status_code >= 500:
+        return True
+    return type(error).__name__ in (
+        "Timeout",
+        "APITimeoutError",
+        "APIConnectionError",
+        "ServiceUnavailableError",
+        "InternalServerError",
+    )
+
+
+def estimate_tokens(messages: Union[str, List[Dict[str, Any]]], max_tokens: int = None) -> int:
+    """Roughly estimate the tokens a call will consume (about 4 characters per token)."""
+    if isinstance(messages, str):
+        characters = len(messages)
+    else:
+        characters = sum(len(str(message.get("content") or "")) for message in messages)
+    return characters // 4 + (max_tokens or 512)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        # Requests larger than the bucket are admitted once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def set_rate(self, rate_per_minute: float) -> None:
+        self._refill()
+        self.rate = rate_per_minute / 60.0
+
+
+class LLMRateLimiter:
+    """Thread-safe limiter that admits, retries and accounts for LLM calls."""
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        queue_timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        # Adaptive request rate, halved on 429 and recovered additively on success
+        self._current_rpm = float(requests_per_minute)
+
+        self._condition = threading.Condition()
+        self._lanes = {priority: deque() for priority in PRIORITIES}
+
+        self._consecutive_failures = 0
+        self._circuit_opened_at = None
+        self._half_open_probe = False
+
+        self._stats = {
+            "admitted": 0,
+            "throttle_events": 0,
+            "rate_limit_errors": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected_queue_timeout": 0,
+            "rejected_circuit_open": 0,
+            "circuit_opens": 0,
+        }
+
+    # Admission
+
+    def _is_next(self, ticket: object, priority: str) -> bool:
+        """A waiter is admitted only at the head of the highest non-empty lane."""
+        for lane_priority in PRIORITIES:
+            lane = self._lanes[lane_priority]
+            if lane:
+                return lane_priority == priority and lane[0] is ticket
+        return False
+
+    def acquire(self, tokens: int, priority: str = INTERACTIVE) -> None:
+        """Block until the call may be sent.
+
+        Raises:
+            LLMUnavailableError: If the queue timeout elapses first
+            CrewCancelledError: If the calling crew run is cancelled while waiting
+        """
+        if priority not in self._lanes:
+            priority = INTERACTIVE
+        ticket = object()
+        deadline = time.monotonic() + self.queue_timeout
+        throttled = False
+        with self._condition:
+            self._lanes[priority].append(ticket)
+            try:
+                while True:
+                    wait = 0.0
+                    if self._is_next(ticket, priority):
+                        wait = max(
+                            self._request_bucket.wait_time(1),
+                            self._token_bucket.wait_time(tokens),
+                        )
+                        if wait == 0.0:
+                            self._request_bucket.take(1)
+                            self._token_bucket.take(tokens)
+                            self._stats["admitted"] += 1
+                            return
+                    else:
+                        wait = _WAIT_SLICE
+                    if not throttled:
+                        throttled = True
+                        self._stats["throttle_events"] += 1
+                    remaining = deadline - time.monotonic()
+                    # Fail fast when the buckets cannot refill before the deadline
+                    if remaining <= 0 or wait > remaining:
+                        self._stats["rejected_queue_timeout"] += 1
+                        raise LLMUnavailableError(
+                            "LLM rate limit queue timeout exceeded", retry_after=wait
+                        )
+                    self._condition.wait(min(wait, remaining, _WAIT_SLICE))
+                    raise_if_cancelled()
+            finally:
+                self._lanes[priority].remove(ticket)
+                self._condition.notify_all()
+
+    # Circuit breaker
+
+    def _check_circuit(self) -> bool:
+        """Raise while the circuit is open; True if the caller holds the half-open probe."""
+        with self._condition:
+            if self._circuit_opened_at is None:
+                return False
+            remaining = self._circuit_opened_at + self.cooldown - time.monotonic()
+            if remaining > 0 or self._half_open_probe:
+                self._stats["rejected_circuit_open"] += 1
+                raise LLMUnavailableError(
+                    "LLM circuit breaker is open", retry_after=max(remaining, 1.0)
+                )
+            # Cooldown elapsed: let a single probe call through
+            self._half_open_probe = True
+            return True
+
+    def _abandon_probe(self) -> None:
+        """Let another call probe the provider after a probe that never reached it."""
+        with self._condition:
+            self._half_open_probe = False
+
+    def _record_success(self) -> None:
+        with self._condition:
+            self._consecutive_failures = 0
+            self._circuit_opened_at = None
+            self._half_open_probe = False
+            if self._current_rpm < self.requests_per_minute:
+                self._current_rpm = min(self.requests_per_minute, self._current_rpm + 1)
+                self._request_bucket.set_rate(self._current_rpm)
+
+    def _record_failure(self) -> None:
+        with self._condition:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            if self._half_open_probe or self._consecutive_failures >= self.failure_threshold:
+                if self._circuit_opened_at is None or self._half_open_probe:
+                    self._stats["circuit_opens"] += 1
+                self._circuit_opened_at = time.monotonic()
+                self._half_open_probe = False
+
+    def _record_rate_limited(self) -> None:
+        with self._condition:
+            self._stats["rate_limit_errors"] += 1
+            self._current_rpm = max(1.0, self._current_rpm / 2)
+            self._request_bucket.set_rate(self._current_rpm)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # Public API
+
+    def call(self, fn: Callable[[], Any], tokens: int, priority: str = None) -> Any:
+        """Send `fn` through the limiter, retrying rate-limit and transient errors.
+
+        Args:
+            fn: Zero-argument callable that performs the LLM call
+            tokens: Estimated tokens the call will consume
+            priority: Lane to queue in; defaults to the current run's priority
+
+        Returns:
+            Whatever `fn` returns
+        """
+        if priority is None:
+            priority = current_llm_priority.get()
+        attempt = 0
+        while True:
+            probe = self._check_circuit()
+            try:
+                self.acquire(tokens, priority)
+            except BaseException:
+                # Timed out or cancelled in the queue: the provider was not asked
+                if probe:
+                    self._abandon_probe()
+                raise
+            try:
+                result = fn()
+            except CrewCancelledError:
+                # Cancelling the run says nothing about the provider
+                if probe:
+                    self._abandon_probe()
+                raise
+            except Exception as e:
+                if not is_transient_error(e):
+                    # The provider answered, so it counts as available
+                    self._record_success()
+                    raise
+                if is_rate_limit_error(e):
+                    self._record_rate_limited()
+                if attempt >= self.max_retries or probe:
+                    # A failed probe reopens the circuit; retrying would only be rejected
+                    self._record_failure()
+                    raise
+                attempt += 1
+                with self._condition:
+                    self._stats["retries"] += 1
+                delay = self._backoff(attempt)
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline:
+                    raise_if_cancelled()
+                    time.sleep(min(_WAIT_SLICE, max(0.0, deadline - time.monotonic())))
+                continue
+            self._record_success()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current queue depth, throttle counters and circuit state."""
+        with self._condition:
+            if self._circuit_opened_at is None:
+                circuit_state = "closed"
+            elif self._half_open_probe:
+                circuit_state = "half_open"
+            else:
+                circuit_state = "open"
+            return {
+                "queue_depth": {priority: len(lane) for priority, lane in self._lanes.items()},
+                "current_requests_per_minute": round(self._current_rpm, 2),
+                "request_tokens_available": round(self._request_bucket.tokens, 2),
+                "llm_tokens_available": round(self._token_bucket.tokens, 2),
+                "circuit_state": circuit_state,
+                "consecutive_failures": self._consecutive_failures,
+                **self._stats,
+            }
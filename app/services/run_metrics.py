@@ -0,0 +1,94 @@
+"""
+Per-run timing and counter collection.
+
+A RunMetrics object is bound to the crew run executing in the current context
+(like the cancellation token, see cancellation.py) so code deep inside the
+run - the LLM wrapper, the chart tools - can attribute time and events to it
+without the run object being passed down.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+
+class RunMetrics:
+    """Thread-safe stage timings and counters of one crew run.
+
+    Stage times accumulate, so a stage entered several times (every LLM call,
+    every chart render) reports its total duration.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, float] = {}
+        self._counters: Dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def observe_max(self, counter: str, value: int) -> None:
+        """Keep the highest value seen for a high-water mark such as peak memory."""
+        with self._lock:
+            self._counters[counter] = max(self._counters.get(counter, value), value)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as (part of) stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def stages_ms(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self._stages.items()}
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+# Metrics of the crew run executing in the current context
+current_run_metrics: ContextVar[Optional[RunMetrics]] = ContextVar("current_run_metrics", default=None)
+
+
+def record_counter(counter: str, amount: int = 1) -> None:
+    """Increment a counter of the current run, if there is one."""
+    metrics = current_run_metrics.get()
+    if metrics is not None:
+        metrics.incr(counter, amount)
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name` of the current run, if there is one."""
+    metrics = current_run_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+
+def token_usage_dict(usage: Any) -> Dict[str, Any]:
+    """Token usage reported by a crew result as a plain dict."""
+    if usage is None:
+        return {}
+    if isinstance(usage, dict):
+        return dict(usage)
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return {
+        name: getattr(usage, name)
+        for name in ("total_tokens", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "successful_requests")
+        if hasattr(usage, name)
+    }
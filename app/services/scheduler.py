@@ -0,0 +1,303 @@
+"""
+Fair scheduling of crew runs across tenants.
+
+Every chat entry point asks the QueryScheduler for a slot before running a
+crew, so one heavy caller or batch job cannot starve everyone else:
+
+- at most `max_concurrency` crew runs execute at once, and each tenant at most
+  its policy's max_concurrency
+- waiting requests sit in per-tenant queues, one per priority; interactive
+  requests are always dispatched before batch requests
+- within a priority, tenants share the capacity by weighted fair queuing
+  (start-time fair queuing): each request is tagged with a virtual start time
+  and a finish time advanced by its expected cost, the tenant's average tokens
+  per run divided by its weight, and the eligible request with the earliest
+  start tag runs next. Idle tenants do not bank credit, and tags are kept per
+  priority so a tenant's queued batch work does not delay its interactive
+  requests.
+- a tenant with a tokens_per_minute quota is charged the tokens each run
+  actually used and gets no new run while its token bucket is empty
+
+All bookkeeping runs on the event loop; the scheduler is not thread-safe.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.core.tenants import TenantPolicy
+from app.services.cancellation import CancellationToken, CrewCancelledError
+from app.services.rate_limiter import INTERACTIVE, PRIORITIES, TokenBucket
+
+ANONYMOUS_TENANT = "anonymous"
+# Cache-warming replays of historical queries (see CrewService.replay_top_queries);
+# name a tenant "replay" in SCHEDULER_TENANTS_FILE to give them their own policy
+REPLAY_TENANT = "replay"
+
+# Longest single wait in the queue, so cancellation is noticed promptly
+_WAIT_SLICE = 0.25
+
+# Weight of the latest run in a tenant's average tokens per run
+_COST_SMOOTHING = 0.2
+
+
+class QueueRejectedError(Exception):
+    """Raised when a request is not admitted: its tenant's queue is full or it waited too long.
+
+    Attributes:
+        retry_after: Suggested number of seconds before trying again
+        wait_ms: Time the request spent queued
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0, wait_ms: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.wait_ms = wait_ms
+
+
+@dataclass
+class Ticket:
+    """A request's place in the scheduler; holds a crew slot once admitted."""
+    tenant: str
+    priority: str
+    start_tag: float
+    enqueued_at: float = field(default_factory=time.monotonic)
+    wait_ms: float = 0.0
+    # LLM tokens the run used, charged to the tenant on release
+    tokens: int = 0
+    admitted: Optional[asyncio.Future] = None
+    released: bool = False
+
+    def charge(self, result: Dict[str, Any]) -> None:
+        """Record the tokens used by a process_query_with_crew result."""
+        self.tokens = int((result.get("token_usage") or {}).get("total_tokens") or 0)
+
+
+class _TenantState:
+    def __init__(self, name: str, policy: TenantPolicy, default_run_tokens: float):
+        self.name = name
+        self.policy = policy
+        self.queues: Dict[str, Deque[Ticket]] = {priority: deque() for priority in PRIORITIES}
+        self.running = 0
+        self.last_finish = {priority: 0.0 for priority in PRIORITIES}
+        self.run_tokens = float(default_run_tokens)
+        self.bucket = TokenBucket(policy.tokens_per_minute) if policy.tokens_per_minute > 0 else None
+        self.waits_ms: Deque[float] = deque(maxlen=1000)
+        self.stats = {"admitted": 0, "completed": 0, "rejected": 0, "timed_out": 0, "cancelled": 0, "tokens": 0}
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def has_capacity(self) -> bool:
+        return self.policy.max_concurrency <= 0 or self.running < self.policy.max_concurrency
+
+    def quota_wait(self) -> float:
+        """Seconds until the tenant's token bucket allows a new run (0 if it does now)."""
+        return self.bucket.wait_time(1) if self.bucket is not None else 0.0
+
+
+class QueryScheduler:
+    """Admits crew runs by priority, weighted fair share and per-tenant quotas."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        default_policy: TenantPolicy,
+        tenants: Optional[Dict[str, TenantPolicy]] = None,
+        queue_timeout: float = 120.0,
+        default_run_tokens: int = 20000,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_policy = default_policy
+        self.policies = dict(tenants or {})
+        self.queue_timeout = queue_timeout
+        self.default_run_tokens = default_run_tokens
+        self._keys = {key: name for name, policy in self.policies.items() for key in policy.api_keys}
+        self._tenants: Dict[str, _TenantState] = {}
+        self._running = 0
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._quota_timer: Optional[asyncio.TimerHandle] = None
+
+    def resolve_tenant(self, api_key: Optional[str] = None, tenant_header: Optional[str] = None) -> str:
+        """
+        Tenant of a request.
+
+        A configured key maps to its tenant. Without one, the X-Tenant-ID
+        header selects a configured tenant that has no keys. Everything else
+        shares the anonymous tenant, so clients cannot mint fresh tenants
+        (each with its own fair share and token budget) by rotating keys or
+        headers, and the set of tenants stays bounded by the configuration.
+        """
+        if api_key and api_key in self._keys:
+            return self._keys[api_key]
+        policy = self.policies.get(tenant_header) if tenant_header else None
+        if policy is not None and not policy.api_keys:
+            return tenant_header
+        return ANONYMOUS_TENANT
+
+    def _tenant(self, name: str) -> _TenantState:
+        state = self._tenants.get(name)
+        if state is None:
+            policy = self.policies.get(name, self.default_policy)
+            state = self._tenants[name] = _TenantState(name, policy, self.default_run_tokens)
+        return state
+
+    @asynccontextmanager
+    async def slot(
+        self, tenant: str, priority: str = INTERACTIVE, cancel_token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[Ticket]:
+        """
+        Hold a crew slot for the enclosed block; see acquire().
+
+        Call `ticket.charge(result)` inside the block to charge the run's tokens.
+        """
+        ticket = await self.acquire(tenant, priority, cancel_token)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(
+        self, tenant: str, priority: str = INTERACTIVE, cancel_token: Optional[CancellationToken] = None
+    ) -> Ticket:
+        """
+        Queue a request and wait until it may start a crew run.
+
+        Returns:
+            The admitted ticket; pass it to release() when the run ends
+
+        Raises:
+            QueueRejectedError: If the tenant's queue is full or the request
+                waited longer than queue_timeout
+            CrewCancelledError: If cancel_token is cancelled while waiting
+        """
+        state = self._tenant(tenant)
+        if state.queued() >= state.policy.max_queued:
+            state.stats["rejected"] += 1
+            raise QueueRejectedError(
+                f"Too many queued requests for tenant {tenant} (max {state.policy.max_queued})",
+                retry_after=max(5.0, state.quota_wait())
+            )
+        # Start-time fair queuing: a backlogged tenant's requests follow each
+        # other in virtual time, an idle tenant starts at the current virtual time
+        start_tag = max(self._virtual_time[priority], state.last_finish[priority])
+        state.last_finish[priority] = start_tag + state.run_tokens / state.policy.weight
+        ticket = Ticket(tenant=tenant, priority=priority, start_tag=start_tag)
+        ticket.admitted = asyncio.get_running_loop().create_future()
+        state.queues[priority].append(ticket)
+        self._dispatch()
+
+        deadline = ticket.enqueued_at + self.queue_timeout
+        try:
+            while not ticket.admitted.done():
+                if cancel_token is not None and cancel_token.cancelled:
+                    state.stats["cancelled"] += 1
+                    raise CrewCancelledError(cancel_token.reason or "cancelled")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    state.stats["timed_out"] += 1
+                    raise QueueRejectedError(
+                        f"Request waited more than {self.queue_timeout:g}s in the queue of tenant {tenant}",
+                        retry_after=max(1.0, state.quota_wait()),
+                        wait_ms=round(self.queue_timeout * 1000, 1)
+                    )
+                await asyncio.wait({ticket.admitted}, timeout=min(_WAIT_SLICE, remaining))
+        except BaseException:
+            # Includes task cancellation; a slot granted in the meantime is given back
+            self._withdraw(ticket)
+            raise
+        return ticket
+
+    def _withdraw(self, ticket: Ticket) -> None:
+        if ticket.admitted.done():
+            self.release(ticket)
+            return
+        queue = self._tenant(ticket.tenant).queues[ticket.priority]
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        ticket.admitted.cancel()
+        ticket.released = True
+
+    def release(self, ticket: Ticket) -> None:
+        """End an admitted run, charging its tokens to the tenant (idempotent)."""
+        if ticket.released:
+            return
+        ticket.released = True
+        state = self._tenant(ticket.tenant)
+        state.running -= 1
+        self._running -= 1
+        state.stats["completed"] += 1
+        if ticket.tokens:
+            state.stats["tokens"] += ticket.tokens
+            state.run_tokens += _COST_SMOOTHING * (ticket.tokens - state.run_tokens)
+            if state.bucket is not None:
+                state.bucket.take(ticket.tokens)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit queued requests while there is capacity."""
+        quota_wait = None
+        while self._running < self.max_concurrency:
+            best = None
+            for priority in PRIORITIES:
+                for state in self._tenants.values():
+                    queue = state.queues[priority]
+                    if not queue or not state.has_capacity():
+                        continue
+                    wait = state.quota_wait()
+                    if wait > 0:
+                        quota_wait = wait if quota_wait is None else min(quota_wait, wait)
+                        continue
+                    if best is None or queue[0].start_tag < best[1].start_tag:
+                        best = (state, queue[0])
+                # Interactive requests go first; batch only when none is eligible
+                if best is not None:
+                    break
+            if best is None:
+                break
+            state, ticket = best
+            state.queues[ticket.priority].popleft()
+            state.running += 1
+            self._running += 1
+            self._virtual_time[ticket.priority] = max(self._virtual_time[ticket.priority], ticket.start_tag)
+            ticket.wait_ms = round((time.monotonic() - ticket.enqueued_at) * 1000, 1)
+            state.waits_ms.append(ticket.wait_ms)
+            state.stats["admitted"] += 1
+            ticket.admitted.set_result(True)
+        # Tenants held back only by their token quota are retried once it refills
+        if quota_wait is not None and self._quota_timer is None:
+            def retry() -> None:
+                self._quota_timer = None
+                self._dispatch()
+            self._quota_timer = asyncio.get_running_loop().call_later(quota_wait, retry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Global occupancy and, per tenant, queue depth, wait times, counters and policy."""
+        tenants = {}
+        for name, state in self._tenants.items():
+            waits = sorted(state.waits_ms)
+            tenants[name] = {
+                "queued": {priority: len(queue) for priority, queue in state.queues.items()},
+                "running": state.running,
+                "wait_ms": {
+                    "samples": len(waits),
+                    "mean": round(sum(waits) / len(waits), 1) if waits else None,
+                    "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+                    "max": waits[-1] if waits else None,
+                },
+                "mean_run_tokens": round(state.run_tokens),
+                "token_budget": round(state.bucket.tokens) if state.bucket is not None else None,
+                **state.stats,
+                "policy": state.policy.public(),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": sum(state.queued() for state in self._tenants.values()),
+            "tenants": tenants,
+        }
@@ -0,0 +1,148 @@
+"""
+Server-side conversation sessions.
+
+A session keeps the recent turns of a conversation (query, answer excerpt,
+charts and derived data) so that follow-up questions can build on earlier
+analysis instead of starting from scratch. The store is bounded in memory:
+least recently used sessions are evicted past `max_sessions`, idle sessions
+expire after `ttl_seconds`, and each session keeps at most `max_turns` turns.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Answers are stored as excerpts; the full text is never fed back to the crew
+RESPONSE_EXCERPT_CHARS = 500
+
+
+@dataclass
+class ConversationTurn:
+    """One completed query/answer exchange."""
+    query: str
+    response: str
+    # Chart specs: title, chart_type, x, y (list of series) and value (heatmaps)
+    charts: List[Dict[str, Any]] = field(default_factory=list)
+    datasets: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+
+
+def describe_chart(chart: Dict[str, Any]) -> str:
+    """One-line description of a chart spec, e.g. "bar chart 'Revenue' of revenue by month"."""
+    description = f"{chart.get('chart_type') or 'chart'} chart '{chart.get('title') or 'untitled'}'"
+    x, y = chart.get("x"), list(chart.get("y") or [])
+    if chart.get("value"):
+        # Heatmaps: value per x column and y row
+        return f"{description} of {chart['value']} by {' and '.join([x] + y)}"
+    if y:
+        description += f" of {', '.join(y)}"
+    if x:
+        description += f" by {x}"
+    return description
+
+
+class Session:
+    """Recent turns of one conversation."""
+
+    def __init__(self, session_id: str, max_turns: int):
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self.turns = deque(maxlen=max_turns)
+
+
+class SessionStore:
+    """Thread-safe, LRU- and TTL-bounded in-memory session store."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 3600,
+        max_turns: int = 10,
+        max_summary_chars: int = 2000,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.max_summary_chars = max_summary_chars
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        return str(uuid.uuid4())
+
+    def _evict_expired(self, now: float) -> None:
+        # Sessions are kept in last-active order, so expired ones are at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._expirations += 1
+
+    def get_or_create(self, session_id: str) -> Session:
+        """Return the live session with this ID, creating it if missing or expired."""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self.max_turns)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._evictions += 1
+            session.last_active = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def record_turn(self, session_id: str, turn: ConversationTurn) -> None:
+        """Append a completed turn to a session."""
+        if len(turn.response) > RESPONSE_EXCERPT_CHARS:
+            turn.response = turn.response[:RESPONSE_EXCERPT_CHARS] + "..."
+        session = self.get_or_create(session_id)
+        with self._lock:
+            session.turns.append(turn)
+
+    def summarize(self, session_id: str) -> str:
+        """Compact, size-bounded summary of a session's prior turns.
+
+        The most recent turns are kept when the summary would exceed
+        `max_summary_chars`. Returns an empty string for new sessions.
+        """
+        session = self.get_or_create(session_id)
+        with self._lock:
+            turns = list(session.turns)
+
+        entries = []
+        used = 0
+        for number, turn in reversed(list(enumerate(turns, start=1))):
+            lines = [f"{number}. User asked: {turn.query}", f"   Answer: {turn.response}"]
+            for chart in turn.charts:
+                lines.append(f"   Chart: {describe_chart(chart)}")
+            for dataset in turn.datasets:
+                lines.append(f"   Dataset: {dataset.get('description', '')} (Dataset ID: {dataset['id']})")
+            entry = "\n".join(lines)
+            if used + len(entry) > self.max_summary_chars:
+                break
+            entries.append(entry)
+            used += len(entry)
+
+        if not entries:
+            return ""
+        return "\n".join(reversed(entries))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
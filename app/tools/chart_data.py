@@ -0,0 +1,150 @@
+"""
+Vectorized NumPy preprocessing of chart data.
+
+Shared by the Matplotlib renderer (chart_rendering.py) and the Vega-Lite
+exporter (vega_lite.py): type coercion, grouping and aggregation of repeated
+x values, sorting, histogram binning and heatmap pivoting.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Chart types whose repeated x values are summed unless told otherwise
+AGGREGATED_BY_DEFAULT = {"line", "multi_line", "bar", "stacked_bar", "area", "pie"}
+
+
+def column(data: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array([row.get(key) for row in data], dtype=object)
+
+
+def numeric(values: np.ndarray, name: str) -> np.ndarray:
+    """Coerce a column to float, mapping missing values to NaN."""
+    try:
+        return np.array([np.nan if v is None or v == "" else v for v in values], dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError(f"column '{name}' must be numeric")
+
+
+def sort_keys(values: np.ndarray) -> Optional[np.ndarray]:
+    """Sortable representation of x (numbers or ISO dates), or None for categories."""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return np.array(values, dtype="datetime64[ns]")
+    except (TypeError, ValueError):
+        return None
+
+
+def _group(
+    x: np.ndarray, series: Dict[str, np.ndarray], how: str
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Aggregate rows sharing an x value, keeping x in first-appearance order."""
+    _, first_index, inverse = np.unique(x.astype(str), return_index=True, return_inverse=True)
+    order = np.argsort(first_index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    groups = rank[inverse]
+    n = len(order)
+
+    grouped = {}
+    for name, y in series.items():
+        valid = ~np.isnan(y)
+        g, v = groups[valid], y[valid]
+        counts = np.bincount(g, minlength=n).astype(float)
+        if how == "count":
+            out = counts
+        elif how in ("sum", "mean"):
+            out = np.bincount(g, weights=v, minlength=n)
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out = out / counts
+        else:
+            out = np.full(n, np.inf if how == "min" else -np.inf)
+            (np.minimum if how == "min" else np.maximum).at(out, g, v)
+        if how != "count":
+            # Groups without any value stay missing rather than becoming 0
+            out[counts == 0] = np.nan
+        grouped[name] = out
+    return x[first_index[order]], grouped
+
+
+def prepare_series(spec: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Turn spec rows into an x array and one float array per y series.
+
+    Repeated x values are aggregated (spec["aggregate"], or summed for chart
+    types where that is the natural reading), and numeric or date x values are
+    sorted. Categorical x values keep the order in which they first appear.
+    """
+    chart_type = spec["chart_type"]
+    x = column(spec["data"], spec["x"])
+    series = {name: numeric(column(spec["data"], name), name) for name in spec["y"]}
+
+    how = spec.get("aggregate")
+    if how is None and chart_type in AGGREGATED_BY_DEFAULT and len(np.unique(x.astype(str))) < len(x):
+        how = "sum"
+    if how:
+        x, series = _group(x, series, how)
+
+    if chart_type not in ("pie", "scatter"):
+        keys = sort_keys(x)
+        if keys is not None:
+            order = np.argsort(keys, kind="stable")
+            x = x[order]
+            series = {name: y[order] for name, y in series.items()}
+
+    keys = sort_keys(x)
+    if keys is not None:
+        x = keys
+    return x, series
+
+
+def labels(values: np.ndarray) -> List[str]:
+    """Tick labels for x values, printing whole numbers without a decimal point."""
+    text = []
+    for value in values:
+        if isinstance(value, (float, np.floating)) and float(value).is_integer():
+            value = int(value)
+        elif isinstance(value, np.datetime64):
+            value = np.datetime_as_string(value, unit="D")
+        text.append(str(value))
+    return text
+
+
+def histogram_bins(spec: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Counts and bin edges of the numeric column spec["x"]."""
+    values = numeric(column(spec["data"], spec["x"]), spec["x"])
+    values = values[~np.isnan(values)]
+    return np.histogram(values, bins=spec.get("bins", 10))
+
+
+def pivot_heatmap(spec: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pivot rows into a (row label, column label) matrix of spec["value"].
+
+    Cells are summed, or averaged when spec["aggregate"] is "mean"; empty
+    cells are NaN.
+
+    Returns:
+        Row labels, column labels and the matrix
+    """
+    data = spec["data"]
+    columns = column(data, spec["x"]).astype(str)
+    rows = column(data, spec["y"][0]).astype(str)
+    values = numeric(column(data, spec["value"]), spec["value"])
+
+    column_labels, column_index = np.unique(columns, return_inverse=True)
+    row_labels, row_index = np.unique(rows, return_inverse=True)
+    # Pivot with a vectorized scatter-add
+    valid = ~np.isnan(values)
+    totals = np.zeros((len(row_labels), len(column_labels)))
+    counts = np.zeros_like(totals)
+    np.add.at(totals, (row_index[valid], column_index[valid]), values[valid])
+    np.add.at(counts, (row_index[valid], column_index[valid]), 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if spec.get("aggregate") == "mean":
+            matrix = totals / counts
+        else:
+            matrix = np.where(counts > 0, totals, np.nan)
+    return row_labels, column_labels, matrix
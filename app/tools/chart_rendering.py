@@ -0,0 +1,192 @@
+"""
+Chart rendering engine.
+
+Every chart type is rendered from a validated ChartSpec (see chart_spec.py)
+passed as a plain dict, so the engine can run either in-process or in a
+render worker process (see render_pool.py). Data is preprocessed with the
+vectorized NumPy helpers in chart_data.py before anything is plotted, and
+all chart types share one figure, labeling and encoding path.
+
+The engine uses Matplotlib's object-oriented API with an Agg canvas rather
+than pyplot, which keeps no global figure state and is safe to call from
+several threads.
+"""
+
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from app.tools.chart_data import histogram_bins, labels, pivot_heatmap, prepare_series
+
+# Resolution of saved charts
+CHART_DPI = 100
+
+# Rows shown when a data table is requested
+MAX_TABLE_ROWS = 25
+
+# Plotting, one function per chart type
+
+def _colors(spec: Dict[str, Any], count: int) -> List[Optional[str]]:
+    colors = spec.get("colors") or []
+    return [colors[i] if i < len(colors) else None for i in range(count)]
+
+
+def _plot_lines(ax, spec, x, series):
+    for (name, y), color in zip(series.items(), _colors(spec, len(series))):
+        ax.plot(x, y, label=name, linewidth=2, marker='o' if len(x) <= 50 else None, color=color)
+
+
+def _plot_area(ax, spec, x, series):
+    if len(series) == 1:
+        (name, y), = series.items()
+        ax.fill_between(x, np.nan_to_num(y), alpha=0.4, color=_colors(spec, 1)[0], label=name)
+        ax.plot(x, y, linewidth=2, color=_colors(spec, 1)[0])
+    else:
+        ax.stackplot(x, *[np.nan_to_num(y) for y in series.values()],
+                     labels=list(series), colors=[c for c in _colors(spec, len(series)) if c] or None, alpha=0.8)
+
+
+def _plot_bars(ax, spec, x, series, stacked=False):
+    positions = np.arange(len(x))
+    colors = _colors(spec, len(series))
+    if stacked:
+        bottom = np.zeros(len(x))
+        for (name, y), color in zip(series.items(), colors):
+            values = np.nan_to_num(y)
+            ax.bar(positions, values, 0.8, bottom=bottom, label=name, color=color)
+            bottom += values
+    else:
+        width = 0.8 / len(series)
+        offsets = (np.arange(len(series)) - (len(series) - 1) / 2) * width
+        for (name, y), color, offset in zip(series.items(), colors, offsets):
+            ax.bar(positions + offset, np.nan_to_num(y), width, label=name, color=color)
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels(x), rotation=45 if len(x) > 8 else 0, ha="right" if len(x) > 8 else "center")
+
+
+def _plot_scatter(ax, spec, x, series):
+    (name, y), = series.items()
+    ax.scatter(x, y, label=name, color=_colors(spec, 1)[0], alpha=0.7)
+
+
+def _plot_histogram(ax, spec):
+    counts, edges = histogram_bins(spec)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge",
+           color=_colors(spec, 1)[0], edgecolor="white")
+
+
+def _plot_pie(ax, spec, x, series):
+    (_, y), = series.items()
+    values = np.nan_to_num(y)
+    keep = values > 0
+    ax.pie(values[keep], labels=labels(x[keep]), autopct="%1.1f%%",
+           colors=[c for c in _colors(spec, int(keep.sum())) if c] or None, startangle=90)
+    ax.axis("equal")
+
+
+def _plot_heatmap(fig, ax, spec):
+    row_labels, column_labels, matrix = pivot_heatmap(spec)
+    image = ax.imshow(matrix, aspect="auto", cmap="viridis")
+    fig.colorbar(image, ax=ax, label=spec["value"])
+    ax.set_xticks(np.arange(len(column_labels)))
+    ax.set_xticklabels(column_labels, rotation=45 if len(column_labels) > 8 else 0)
+    ax.set_yticks(np.arange(len(row_labels)))
+    ax.set_yticklabels(row_labels)
+
+
+# Shared figure handling
+
+def _add_table(ax, spec, x, series):
+    ax.axis('tight')
+    ax.axis('off')
+    rows = [labels(x[:MAX_TABLE_ROWS])]
+    rows += [[f"{v:g}" for v in y[:MAX_TABLE_ROWS]] for y in series.values()]
+    table = ax.table(
+        cellText=list(map(list, zip(*rows))),
+        colLabels=[spec["x"], *series],
+        loc='center',
+        cellLoc='center'
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.scale(1, 1.5)
+    ax.set_title("Data Table")
+
+
+def render_chart(spec: Dict[str, Any]) -> bytes:
+    """Render a validated chart spec (as a dict) to PNG bytes."""
+    chart_type = spec["chart_type"]
+    with_table = spec.get("include_data_table", False) and chart_type not in ("histogram", "heatmap")
+
+    if with_table:
+        fig = Figure(figsize=(10, 12))
+        ax, ax_table = fig.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]})
+    else:
+        fig = Figure(figsize=(8, 8) if chart_type == "pie" else (10, 6))
+        ax, ax_table = fig.subplots(), None
+
+    x, series = (None, {}) if chart_type in ("histogram", "heatmap") else prepare_series(spec)
+
+    if chart_type in ("line", "multi_line"):
+        _plot_lines(ax, spec, x, series)
+    elif chart_type == "area":
+        _plot_area(ax, spec, x, series)
+    elif chart_type in ("bar", "stacked_bar"):
+        _plot_bars(ax, spec, x, series, stacked=chart_type == "stacked_bar")
+    elif chart_type == "scatter":
+        _plot_scatter(ax, spec, x, series)
+    elif chart_type == "histogram":
+        _plot_histogram(ax, spec)
+    elif chart_type == "pie":
+        _plot_pie(ax, spec, x, series)
+    elif chart_type == "heatmap":
+        _plot_heatmap(fig, ax, spec)
+    else:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+
+    ax.set_title(spec.get("title", "Chart"))
+    if chart_type != "pie":
+        ax.set_xlabel(spec.get("x_label") or spec["x"])
+        y_label = spec.get("y_label")
+        if y_label is None:
+            y_label = {"histogram": "Count", "heatmap": spec["y"][0] if spec["y"] else ""}.get(
+                chart_type, spec["y"][0] if len(spec["y"]) == 1 else "")
+        ax.set_ylabel(y_label)
+        if chart_type != "heatmap":
+            ax.grid(True, linestyle='--', alpha=0.7)
+    if len(series) > 1 or chart_type == "area":
+        ax.legend()
+    if ax_table is not None:
+        _add_table(ax_table, spec, x, series)
+
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=CHART_DPI)
+    return buffer.getvalue()
+
+
+def make_thumbnail(png: bytes, max_pixels: int) -> bytes:
+    """Downscale a rendered chart so its longer side is at most `max_pixels`."""
+    from PIL import Image  # installed with Matplotlib
+
+    with Image.open(BytesIO(png)) as image:
+        image.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def warm_up_renderer() -> None:
+    """
+    Render a throwaway chart so that Matplotlib's font cache and backend are
+    initialized before the first real chart is requested.
+    """
+    render_chart({
+        "chart_type": "line",
+        "data": [{"x": 0, "y": 0}, {"x": 1, "y": 1}],
+        "x": "x",
+        "y": ["y"],
+        "title": "warm-up"
+    })
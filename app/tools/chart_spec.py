@@ -0,0 +1,98 @@
+"""
+Declarative chart specification shared by every chart type.
+
+A ChartSpec is validated once, when a tool is called, and then handed as a
+plain dict to the rendering engine in chart_rendering.py (possibly in a render
+worker process).
+"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+ChartType = Literal[
+    "line", "multi_line", "bar", "stacked_bar", "scatter",
+    "histogram", "area", "pie", "heatmap"
+]
+
+CHART_TYPES = list(ChartType.__args__)
+
+# Upper bound on data rows accepted by a single chart
+MAX_CHART_ROWS = 10000
+
+# Required number of y series per chart type: (minimum, maximum)
+_SERIES_LIMITS = {
+    "line": (1, 1),
+    "multi_line": (1, None),
+    "bar": (1, None),
+    "stacked_bar": (1, None),
+    "scatter": (1, 1),
+    "histogram": (0, 0),
+    "area": (1, None),
+    "pie": (1, 1),
+    "heatmap": (1, 1),
+}
+
+
+class ChartInput(BaseModel):
+    """Arguments shared by all chart tools."""
+    data: List[Dict[str, Any]] = Field(
+        default=[],
+        description="Rows of data, e.g. [{\"month\": \"Jan\", \"revenue\": 10}]"
+    )
+    # Resolved to `data` by the chart tools before validation (see ChartTool)
+    dataset_id: Optional[str] = Field(
+        default=None,
+        exclude=True,
+        description="Instead of data: dataset_id of a compute_data result (or a registered dataset) to chart"
+    )
+    x: str = Field(
+        ...,
+        description="Column for the x-axis / categories (histogram: the numeric column to bin)"
+    )
+    y: List[str] = Field(
+        default=[],
+        description="Value column(s), one per series (heatmap: [row column]; histogram: [])"
+    )
+    value: Optional[str] = Field(
+        default=None,
+        description="Heatmap only: column holding the cell values"
+    )
+    title: str = Field(default="Chart", description="Chart title")
+    x_label: Optional[str] = Field(default=None, description="X-axis label (defaults to x)")
+    y_label: Optional[str] = Field(default=None, description="Y-axis label")
+    aggregate: Optional[Literal["sum", "mean", "count", "min", "max"]] = Field(
+        default=None,
+        description="How to combine rows sharing the same x"
+    )
+    bins: int = Field(default=10, ge=1, le=200, description="Histogram only: number of bins")
+    colors: Optional[List[str]] = Field(default=None, description="Colors, one per series")
+    include_data_table: bool = Field(default=False, description="Add a data table below the chart")
+
+
+class ChartSpec(ChartInput):
+    """A fully validated chart request."""
+    chart_type: ChartType = Field(..., description="Kind of chart to render")
+
+    @model_validator(mode="after")
+    def check_columns(self) -> "ChartSpec":
+        if not self.data:
+            raise ValueError("data must contain at least one row (or pass a non-empty dataset_id)")
+        if len(self.data) > MAX_CHART_ROWS:
+            raise ValueError(f"data has {len(self.data)} rows; at most {MAX_CHART_ROWS} are supported")
+
+        minimum, maximum = _SERIES_LIMITS[self.chart_type]
+        if len(self.y) < minimum or (maximum is not None and len(self.y) > maximum):
+            expected = str(minimum) if minimum == maximum else f"at least {minimum}"
+            raise ValueError(f"{self.chart_type} chart needs {expected} y column(s), got {len(self.y)}")
+        if self.chart_type == "heatmap" and not self.value:
+            raise ValueError("heatmap chart needs a value column")
+
+        columns = set()
+        for row in self.data:
+            columns.update(row.keys())
+        required = [self.x, *self.y] + ([self.value] if self.value else [])
+        missing = [column for column in required if column not in columns]
+        if missing:
+            raise ValueError(f"columns not found in data: {missing}; available: {sorted(columns)}")
+        return self
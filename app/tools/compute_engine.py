@@ -0,0 +1,335 @@
+"""
+Execution of compute pipelines with pandas.
+
+run_pipeline() runs inside a compute worker process (see compute_pool.py): it
+loads the source dataset, applies the validated steps of a ComputeInput, writes
+the result as Parquet and returns only a compact summary, so intermediate data
+never travels back through the API process or into the LLM context.
+"""
+
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Resample frequencies as period starts, so labels read "2024-01-01" for January
+_FREQUENCIES = {"D": "D", "W": "W-MON", "M": "MS", "Q": "QS", "Y": "YS"}
+
+# Object columns whose first values look like ISO dates are parsed as datetimes
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}(:\d{2})?)?")
+
+# Numeric columns summarized in the result (the preview shows the rest)
+MAX_STAT_COLUMNS = 20
+
+# CSV rows read to infer column types when only the schema is needed
+SCHEMA_SAMPLE_ROWS = 1000
+
+
+class ComputeError(Exception):
+    """A pipeline could not be applied to its dataset (missing column, bad type...)."""
+
+
+def load_frame(path: str, limit: Optional[int] = None) -> pd.DataFrame:
+    """Read a Parquet or CSV dataset (its first `limit` rows), parsing ISO date columns of CSV files."""
+    if path.endswith(".parquet"):
+        if limit is None:
+            return pd.read_parquet(path)
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        batch = next(parquet_file.iter_batches(batch_size=max(1, limit)), None)
+        if batch is None:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas().head(limit)
+    return _parse_dates(pd.read_csv(path, nrows=limit))
+
+
+def _parse_dates(frame: pd.DataFrame) -> pd.DataFrame:
+    for column in frame.columns:
+        if frame[column].dtype != object:
+            continue
+        sample = frame[column].dropna().head(20).astype(str)
+        if len(sample) and sample.str.match(_ISO_DATE).all():
+            try:
+                frame[column] = pd.to_datetime(frame[column], format="ISO8601")
+            except (ValueError, TypeError):
+                pass
+    return frame
+
+
+def _count_csv_rows(path: str) -> int:
+    # Line count without parsing; quoted fields spanning lines count extra
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(0, lines - 1)
+
+
+def read_schema(path: str) -> Dict[str, Any]:
+    """
+    Row count and column types of a dataset without loading its data.
+
+    Parquet schemas come from the file metadata. CSV types are inferred from
+    the first SCHEMA_SAMPLE_ROWS rows (as load_frame would, including ISO
+    dates) and rows are counted by lines.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        rows = parquet_file.metadata.num_rows
+        dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+    else:
+        rows = _count_csv_rows(path)
+        dtypes = _parse_dates(pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS)).dtypes
+    return {
+        "rows": rows,
+        "columns": [{"name": str(column), "type": dtype_name(dtype)} for column, dtype in dtypes.items()],
+    }
+
+
+def dtype_name(dtype: Any) -> str:
+    """Short, LLM-friendly name of a pandas dtype."""
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "string"
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def frame_records(frame: pd.DataFrame, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Rows as JSON-safe dicts: dates as ISO strings, NaN and infinities as None."""
+    if limit is not None:
+        frame = frame.head(limit)
+    columns = [str(column) for column in frame.columns]
+    return [
+        {column: _json_value(value) for column, value in zip(columns, row)}
+        for row in frame.itertuples(index=False, name=None)
+    ]
+
+
+def _require(frame: pd.DataFrame, *columns: str) -> None:
+    missing = [column for column in columns if column not in frame.columns]
+    if missing:
+        raise ComputeError(f"columns not found: {missing}; available: {[str(c) for c in frame.columns]}")
+
+
+def _comparable(series: pd.Series, value: Any) -> Any:
+    """Convert a filter value to the column's type (dates given as strings)."""
+    if pd.api.types.is_datetime64_any_dtype(series) and value is not None:
+        if isinstance(value, list):
+            return [pd.Timestamp(item) for item in value]
+        return pd.Timestamp(value)
+    return value
+
+
+def _filter(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    column, operator = step["column"], step["operator"]
+    _require(frame, column)
+    series = frame[column]
+    value = _comparable(series, step.get("value"))
+    if operator == "==":
+        mask = series == value
+    elif operator == "!=":
+        mask = series != value
+    elif operator == ">":
+        mask = series > value
+    elif operator == ">=":
+        mask = series >= value
+    elif operator == "<":
+        mask = series < value
+    elif operator == "<=":
+        mask = series <= value
+    elif operator == "in":
+        mask = series.isin(value)
+    elif operator == "not_in":
+        mask = ~series.isin(value)
+    elif operator == "between":
+        mask = series.between(value[0], value[1])
+    elif operator == "contains":
+        mask = series.astype(str).str.contains(str(value), case=False, regex=False)
+    elif operator == "is_null":
+        mask = series.isna()
+    else:
+        mask = series.notna()
+    return frame[mask]
+
+
+def _derive(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    left, operator, right = step["left"], step["operator"], step.get("right")
+    _require(frame, left)
+    series = frame[left]
+    if operator in ("+", "-", "*", "/"):
+        if isinstance(right, str):
+            _require(frame, right)
+            right = frame[right]
+        if operator == "+":
+            result = series + right
+        elif operator == "-":
+            result = series - right
+        elif operator == "*":
+            result = series * right
+        else:
+            result = (series / right).replace([np.inf, -np.inf], np.nan)
+    elif operator == "pct_change":
+        result = series.pct_change().replace([np.inf, -np.inf], np.nan)
+    elif operator == "diff":
+        result = series.diff()
+    elif operator == "cumsum":
+        result = series.cumsum()
+    else:
+        total = series.sum()
+        result = series / total if total else np.nan
+    return frame.assign(**{step["name"]: result})
+
+
+def _named_aggregations(frame: pd.DataFrame, metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    _require(frame, *(metric["column"] for metric in metrics))
+    return {
+        metric.get("name") or f"{metric['column']}_{metric['func']}": (metric["column"], metric["func"])
+        for metric in metrics
+    }
+
+
+def _groupby(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    _require(frame, *step["by"])
+    aggregations = _named_aggregations(frame, step["metrics"])
+    return frame.groupby(step["by"], dropna=False, sort=True).agg(**aggregations).reset_index()
+
+
+def _resample(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    on = step["on"]
+    _require(frame, on, *step["by"])
+    if not pd.api.types.is_datetime64_any_dtype(frame[on]):
+        try:
+            frame = frame.assign(**{on: pd.to_datetime(frame[on])})
+        except (ValueError, TypeError):
+            raise ComputeError(f"column {on!r} is not a date column")
+    aggregations = _named_aggregations(frame, step["metrics"])
+    grouper = pd.Grouper(key=on, freq=_FREQUENCIES[step["freq"]])
+    return frame.groupby([*step["by"], grouper], sort=True).agg(**aggregations).reset_index()
+
+
+def _rolling(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    column, window, func = step["column"], step["window"], step["func"]
+    _require(frame, column, *step["by"], *([step["order_by"]] if step.get("order_by") else []))
+    if step.get("order_by"):
+        frame = frame.sort_values(step["order_by"], kind="stable")
+    name = step.get("name") or f"{column}_rolling_{func}_{window}"
+    if step["by"]:
+        rolled = frame.groupby(step["by"], sort=False)[column].transform(
+            lambda series: series.rolling(window, min_periods=1).agg(func)
+        )
+    else:
+        rolled = frame[column].rolling(window, min_periods=1).agg(func)
+    return frame.assign(**{name: rolled})
+
+
+def _pivot(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    _require(frame, step["index"], step["columns"], step["values"])
+    if frame[step["columns"]].nunique() > 500:
+        raise ComputeError(f"pivot column {step['columns']!r} has more than 500 distinct values")
+    table = pd.pivot_table(
+        frame, index=step["index"], columns=step["columns"], values=step["values"], aggfunc=step["func"]
+    )
+    table.columns = [str(column) for column in table.columns]
+    return table.reset_index()
+
+
+def _sort(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    _require(frame, *step["by"])
+    return frame.sort_values(step["by"], ascending=not step["descending"], kind="stable")
+
+
+def _select(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    _require(frame, *step["columns"])
+    return frame[step["columns"]]
+
+
+def _limit(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    return frame.head(step["n"])
+
+
+_STEPS: Dict[str, Callable[[pd.DataFrame, Dict[str, Any]], pd.DataFrame]] = {
+    "filter": _filter,
+    "derive": _derive,
+    "groupby": _groupby,
+    "resample": _resample,
+    "rolling": _rolling,
+    "pivot": _pivot,
+    "sort": _sort,
+    "select": _select,
+    "limit": _limit,
+}
+
+
+def summarize(frame: pd.DataFrame, preview_rows: int) -> Dict[str, Any]:
+    """Row count, column types, numeric ranges and the first rows of a frame."""
+    stats = {}
+    numeric = [column for column in frame.columns if dtype_name(frame[column].dtype) in ("int", "float")]
+    for column in numeric[:MAX_STAT_COLUMNS]:
+        series = frame[column]
+        stats[str(column)] = {
+            "min": _json_value(series.min()),
+            "max": _json_value(series.max()),
+            "mean": _json_value(round(float(series.mean()), 4)) if series.notna().any() else None,
+        }
+    return {
+        "rows": len(frame),
+        "columns": [{"name": str(column), "type": dtype_name(frame[column].dtype)} for column in frame.columns],
+        "stats": stats,
+        "preview": frame_records(frame, preview_rows),
+    }
+
+
+def run_pipeline(source_path: str, steps: List[Dict[str, Any]], result_path: str, preview_rows: int = 10) -> Dict[str, Any]:
+    """
+    Apply pipeline steps to a dataset and save the result as Parquet.
+
+    Args:
+        source_path: Parquet or CSV file of the input dataset
+        steps: Validated pipeline steps (ComputeInput.steps as dicts)
+        result_path: Where to write the result
+        preview_rows: Rows included in the summary
+
+    Returns:
+        The summary of the result (see summarize)
+
+    Raises:
+        ComputeError: If a step does not fit the data
+    """
+    frame = load_frame(source_path)
+    for number, step in enumerate(steps, start=1):
+        try:
+            frame = _STEPS[step["op"]](frame, step)
+        except ComputeError as e:
+            raise ComputeError(f"step {number} ({step['op']}): {e}")
+        except (KeyError, ValueError, TypeError) as e:
+            raise ComputeError(f"step {number} ({step['op']}): {type(e).__name__}: {e}")
+    frame = frame.reset_index(drop=True)
+    frame.columns = [str(column) for column in frame.columns]
+    frame.to_parquet(result_path, index=False)
+    return summarize(frame, preview_rows)
@@ -0,0 +1,207 @@
+"""
+Sandboxed pool of compute worker processes.
+
+Compute pipelines run with pandas in spawned worker processes, never in the
+API process. Each worker caps its address space (RLIMIT_AS) once pandas is
+loaded, so a pipeline that blows up memory fails with MemoryError instead of
+taking the server down, and each task gets a CPU-time budget through the soft
+RLIMIT_CPU: exceeding it raises ComputeLimitError inside the task. A task that
+stays unresponsive past its wall-clock timeout (stuck in native code) has its
+workers killed and the pool restarted. Workers are recycled after
+COMPUTE_MAX_TASKS_PER_WORKER tasks to return fragmented memory.
+
+With COMPUTE_WORKERS=0 pipelines run in the calling thread without any limits
+(development only). The limits rely on the POSIX resource module; where it is
+missing, pipelines still run in the worker processes, without limits.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+    import signal
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_settings: Dict[str, float] = {}
+
+
+class ComputeLimitError(Exception):
+    """A computation exceeded its CPU time, memory or wall-clock limit."""
+
+
+def _on_cpu_limit(signum, frame):
+    raise ComputeLimitError("CPU time limit exceeded")
+
+
+def _virtual_memory_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _init_worker(memory_mb: int) -> None:
+    # One thread per worker: parallelism comes from the pool, and BLAS thread
+    # pools would reserve address space against the memory limit
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = "1"
+    import pandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    from app.tools import compute_engine  # noqa: F401
+
+    if resource is None:
+        return
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if memory_mb > 0:
+        try:
+            # The budget comes on top of what the loaded libraries already map
+            limit = _virtual_memory_bytes() + memory_mb * 1024 * 1024
+        except (OSError, ValueError):
+            limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _ping() -> bool:
+    return True
+
+
+def _run_limited(cpu_seconds: float, source_path: str, steps: List[Dict[str, Any]], result_path: str, preview_rows: int) -> Dict[str, Any]:
+    """Run one pipeline in a worker with a CPU-time budget."""
+    from app.tools.compute_engine import run_pipeline
+
+    if resource is None or cpu_seconds <= 0:
+        return run_pipeline(source_path, steps, result_path, preview_rows)
+    # RLIMIT_CPU counts the worker's whole lifetime, so the soft limit is moved
+    # to this task's budget on top of the CPU time used so far; the hard limit
+    # is left alone because an unprivileged process cannot raise it again
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used + cpu_seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        return run_pipeline(source_path, steps, result_path, preview_rows)
+    except MemoryError:
+        raise ComputeLimitError("memory limit exceeded")
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _create_pool(workers: int, memory_mb: int, max_tasks: int) -> ProcessPoolExecutor:
+    # Spawned (not forked) workers: the API process runs threads and an event loop
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(memory_mb,),
+        max_tasks_per_child=max_tasks if max_tasks > 0 else None
+    )
+    for future in [pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def start_compute_pool(workers: int, cpu_seconds: float, memory_mb: int, timeout: float, max_tasks: int = 100) -> None:
+    """Start `workers` sandboxed compute processes (no-op when workers <= 0 or already running)."""
+    global _pool, _pool_workers
+    if workers <= 0:
+        return
+    with _pool_lock:
+        if _pool is not None:
+            return
+        _settings.update(cpu_seconds=cpu_seconds, memory_mb=memory_mb, timeout=timeout, max_tasks=max_tasks)
+        _pool = _create_pool(workers, memory_mb, max_tasks)
+        _pool_workers = workers
+        logger.info(f"Started compute pool with {workers} workers")
+
+
+def shutdown_compute_pool() -> None:
+    """Stop the compute workers, if running."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _restart_pool(broken: ProcessPoolExecutor, kill: bool = False) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        if kill:
+            # The executor cannot cancel a running task; its worker processes
+            # (a private attribute) are killed so the stuck one stops
+            for process in list((getattr(broken, "_processes", None) or {}).values()):
+                process.kill()
+        broken.shutdown(wait=False, cancel_futures=True)
+        try:
+            _pool = _create_pool(_pool_workers, int(_settings["memory_mb"]), int(_settings["max_tasks"]))
+        except Exception as e:
+            logger.error(f"Could not restart compute pool: {str(e)}")
+            _pool = None
+
+
+def run_compute(source_path: str, steps: List[Dict[str, Any]], result_path: str, preview_rows: int = 10) -> Dict[str, Any]:
+    """
+    Run a pipeline in the compute pool, starting the pool from config if needed.
+
+    Returns:
+        The result summary (see compute_engine.summarize)
+
+    Raises:
+        ComputeError: If a step does not fit the data
+        ComputeLimitError: If the computation exceeded a limit or its worker died
+    """
+    from app.core import config
+
+    if _pool is None:
+        if config.COMPUTE_WORKERS <= 0:
+            from app.tools.compute_engine import run_pipeline
+            return run_pipeline(source_path, steps, result_path, preview_rows)
+        start_compute_pool(
+            config.COMPUTE_WORKERS, config.COMPUTE_CPU_SECONDS, config.COMPUTE_MEMORY_MB,
+            config.COMPUTE_TIMEOUT, config.COMPUTE_MAX_TASKS_PER_WORKER
+        )
+    pool = _pool
+    if pool is None:
+        raise ComputeLimitError("compute workers are unavailable")
+    try:
+        future = pool.submit(_run_limited, _settings["cpu_seconds"], source_path, steps, result_path, preview_rows)
+        return future.result(timeout=_settings["timeout"])
+    except BrokenProcessPool:
+        logger.warning("Compute worker died (likely a resource limit); restarting the pool")
+        _restart_pool(pool)
+        raise ComputeLimitError("the computation was killed for exceeding its resource limits")
+    except TimeoutError:
+        logger.warning("Computation exceeded its %.0fs timeout; restarting the compute pool", _settings["timeout"])
+        _restart_pool(pool, kill=True)
+        raise ComputeLimitError(f"computation did not finish within {_settings['timeout']:.0f}s")
+    except RuntimeError as e:
+        # Pool shut down between the check and the submit
+        raise ComputeLimitError(f"compute workers are unavailable ({str(e)})")
+
+
+def compute_pool_stats() -> Dict[str, Any]:
+    """Whether the pool is running, its size and limits."""
+    return {
+        "enabled": _pool is not None,
+        "workers": _pool_workers if _pool is not None else 0,
+        "limits": dict(_settings),
+        "resource_limits": resource is not None,
+    }
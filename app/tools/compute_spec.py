@@ -0,0 +1,143 @@
+"""
+Declarative compute pipelines over registered datasets.
+
+A pipeline is a list of structured steps (filter, derive, group-by, resample,
+rolling, pivot, sort, select, limit). There is no expression language and no
+eval: every step names columns and picks from fixed operators and functions,
+so a pipeline can only read the dataset it was given. It is validated here,
+in the API process, and executed by compute_engine.py in a sandboxed worker
+process.
+"""
+
+from typing import Annotated, Any, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field, model_validator
+
+# Upper bound on steps in one pipeline
+MAX_STEPS = 20
+
+AggregateFunc = Literal["sum", "mean", "median", "min", "max", "count", "nunique", "std", "first", "last"]
+
+FilterOperator = Literal["==", "!=", ">", ">=", "<", "<=", "in", "not_in", "between", "contains", "is_null", "not_null"]
+
+
+class Metric(BaseModel):
+    """One aggregated output column."""
+    column: str = Field(..., description="Column to aggregate")
+    func: AggregateFunc = Field(default="sum", description="Aggregation function")
+    name: Optional[str] = Field(default=None, description="Output column name (defaults to column_func)")
+
+    def output_name(self) -> str:
+        return self.name or f"{self.column}_{self.func}"
+
+
+class FilterStep(BaseModel):
+    """Keep rows where `column operator value` holds."""
+    op: Literal["filter"]
+    column: str
+    operator: FilterOperator = "=="
+    value: Any = Field(default=None, description="A scalar, a list for in/not_in, or [low, high] for between")
+
+    @model_validator(mode="after")
+    def check_value(self) -> "FilterStep":
+        if self.operator in ("in", "not_in") and not isinstance(self.value, list):
+            raise ValueError(f"filter operator {self.operator} needs a list value")
+        if self.operator == "between" and not (isinstance(self.value, list) and len(self.value) == 2):
+            raise ValueError("filter operator between needs a [low, high] value")
+        return self
+
+
+class DeriveStep(BaseModel):
+    """Add column `name` = left <operator> right (a column or a number)."""
+    op: Literal["derive"]
+    name: str
+    left: str = Field(..., description="Column")
+    operator: Literal["+", "-", "*", "/", "pct_change", "diff", "cumsum", "share"]
+    right: Optional[Union[str, float]] = Field(
+        default=None,
+        description="Column or number for + - * /; unused by pct_change, diff, cumsum and share (of the column total)"
+    )
+
+    @model_validator(mode="after")
+    def check_right(self) -> "DeriveStep":
+        if self.operator in ("+", "-", "*", "/") and self.right is None:
+            raise ValueError(f"derive operator {self.operator} needs a right operand")
+        return self
+
+
+class GroupByStep(BaseModel):
+    """Aggregate `metrics` per combination of the `by` columns."""
+    op: Literal["groupby"]
+    by: List[str] = Field(..., min_length=1)
+    metrics: List[Metric] = Field(..., min_length=1)
+
+
+class ResampleStep(BaseModel):
+    """Aggregate `metrics` per period of the datetime column `on`."""
+    op: Literal["resample"]
+    on: str = Field(..., description="Datetime column")
+    freq: Literal["D", "W", "M", "Q", "Y"] = Field(..., description="Day, week, month, quarter or year")
+    metrics: List[Metric] = Field(..., min_length=1)
+    by: List[str] = Field(default=[], description="Optional columns to resample separately")
+
+
+class RollingStep(BaseModel):
+    """Add column `name` with a rolling window function of `column`."""
+    op: Literal["rolling"]
+    column: str
+    window: int = Field(..., ge=1, le=10000)
+    func: Literal["sum", "mean", "median", "min", "max", "std"] = "mean"
+    name: Optional[str] = None
+    order_by: Optional[str] = Field(default=None, description="Sort by this column first")
+    by: List[str] = Field(default=[], description="Optional columns to roll within separately")
+
+    def output_name(self) -> str:
+        return self.name or f"{self.column}_rolling_{self.func}_{self.window}"
+
+
+class PivotStep(BaseModel):
+    """Spread `values` into one column per distinct value of `columns`."""
+    op: Literal["pivot"]
+    index: str
+    columns: str
+    values: str
+    func: AggregateFunc = "sum"
+
+
+class SortStep(BaseModel):
+    op: Literal["sort"]
+    by: List[str] = Field(..., min_length=1)
+    descending: bool = False
+
+
+class SelectStep(BaseModel):
+    op: Literal["select"]
+    columns: List[str] = Field(..., min_length=1)
+
+
+class LimitStep(BaseModel):
+    op: Literal["limit"]
+    n: int = Field(..., ge=1, le=100000)
+
+
+Step = Annotated[
+    Union[FilterStep, DeriveStep, GroupByStep, ResampleStep, RollingStep, PivotStep, SortStep, SelectStep, LimitStep],
+    Field(discriminator="op")
+]
+
+
+class ComputeInput(BaseModel):
+    """Arguments of the compute tool."""
+    dataset_id: str = Field(..., description="Registered dataset name or a dataset_id returned by an earlier computation")
+    steps: List[Step] = Field(
+        default=[],
+        max_length=MAX_STEPS,
+        description=(
+            "Pipeline steps applied in order, each an object with an \"op\": "
+            "filter {column, operator, value}; derive {name, left, operator, right}; "
+            "groupby {by, metrics: [{column, func, name}]}; resample {on, freq, metrics, by}; "
+            "rolling {column, window, func, name, order_by, by}; pivot {index, columns, values, func}; "
+            "sort {by, descending}; select {columns}; limit {n}"
+        )
+    )
+    title: str = Field(default="", description="Short description of the result")
@@ -0,0 +1,100 @@
+"""
+Compute tool: declarative pandas pipelines over registered datasets.
+
+The analyst describes a computation as structured steps (see compute_spec.py);
+the pipeline runs in a sandboxed worker process (see compute_pool.py) and the
+tool returns a compact summary of the result plus its dataset_id. Chart tools
+accept that dataset_id in place of inline rows, so full results never pass
+through the LLM.
+"""
+
+import json
+from typing import Any, Dict, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, ValidationError
+
+from app.core import config
+from app.services.artifacts import register_artifact
+from app.services.cancellation import raise_if_cancelled
+from app.services.datasets import DatasetNotFoundError, dataset_catalog
+from app.services.run_metrics import record_counter, timed_stage
+from app.tools.compute_engine import ComputeError
+from app.tools.compute_pool import ComputeLimitError, run_compute
+from app.tools.compute_spec import ComputeInput
+
+
+def format_summary(dataset_id: str, summary: Dict[str, Any]) -> str:
+    """Compact text description of a compute result for the agent."""
+    columns = ", ".join(f"{column['name']} ({column['type']})" for column in summary["columns"])
+    lines = [
+        f"Result dataset_id: {dataset_id}",
+        f"Rows: {summary['rows']}",
+        f"Columns: {columns}",
+    ]
+    for column, stats in summary["stats"].items():
+        lines.append(f"{column}: min {stats['min']}, max {stats['max']}, mean {stats['mean']}")
+    if summary["preview"]:
+        lines.append(f"First {len(summary['preview'])} rows:")
+        lines.extend(json.dumps(row, ensure_ascii=False, default=str) for row in summary["preview"])
+    return "\n".join(lines)
+
+
+class ComputeTool(BaseTool):
+    """Tool running a validated compute pipeline on a dataset."""
+    name: str = "compute_data"
+    description: str = (
+        "Filter, derive, group, resample, roll, pivot, sort, select or limit a registered dataset "
+        "(or an earlier result) and get a summary of the result with its dataset_id. "
+        "Pass that dataset_id to create_chart instead of data, or to compute_data for further steps."
+    )
+    args_schema: Type[BaseModel] = ComputeInput
+
+    def _run(self, **kwargs: Any) -> str:
+        """
+        Validate the pipeline, run it in a compute worker and register the result.
+
+        Args:
+            **kwargs: ComputeInput fields
+
+        Returns:
+            A summary of the result with its dataset_id, or a description of the error
+        """
+        # Do not start a computation for a run whose client has gone away
+        raise_if_cancelled()
+
+        try:
+            request = ComputeInput(**kwargs)
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+            return f"Invalid computation: {problems}"
+
+        try:
+            source_path = dataset_catalog.path(request.dataset_id)
+        except DatasetNotFoundError as e:
+            available = ", ".join(schema["id"] for schema in dataset_catalog.registered()) or "none"
+            return f"{str(e)}. Registered datasets: {available}"
+
+        dataset_id, result_path = dataset_catalog.new_result()
+        steps = [step.model_dump() for step in request.steps]
+        record_counter("computations")
+        try:
+            with timed_stage("compute"):
+                summary = run_compute(source_path, steps, result_path, config.COMPUTE_PREVIEW_ROWS)
+        except ComputeError as e:
+            return f"Computation failed at {str(e)}"
+        except ComputeLimitError as e:
+            record_counter("computations_limited")
+            return f"Computation stopped: {str(e)}. Filter or aggregate earlier to work on less data."
+        except Exception as e:
+            return f"Error running computation: {str(e)}"
+
+        register_artifact(
+            "dataset", dataset_id, request.title or f"Computed from {request.dataset_id}",
+            {"source": request.dataset_id, "rows": summary["rows"], "columns": [column["name"] for column in summary["columns"]]}
+        )
+        return format_summary(dataset_id, summary)
+
+
+# Create an instance of the tool
+compute_data = ComputeTool()
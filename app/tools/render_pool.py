@@ -0,0 +1,128 @@
+"""
+Optional pool of pre-warmed chart rendering processes.
+
+Matplotlib rendering is CPU-bound and holds the GIL, so concurrent crews in
+one API process serialize on it. With CHART_RENDER_WORKERS > 0 chart specs are
+rendered in worker processes that paid the font-cache and backend setup cost
+at startup; otherwise, or if the pool is unavailable, charts are rendered
+in-process. A chart that does not render within CHART_RENDER_TIMEOUT fails
+and has its workers recycled, rather than being rendered a second time.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_timeout = 30.0
+_pool_lock = threading.Lock()
+
+
+def _ping() -> bool:
+    return True
+
+
+def _create_pool(workers: int) -> ProcessPoolExecutor:
+    from app.tools.chart_rendering import warm_up_renderer
+    
+    # Spawned (not forked) workers: the API process runs threads and an event loop
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_up_renderer
+    )
+    # Start every worker now so none pays the warm-up cost on a real request
+    for future in [pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def start_render_pool(workers: int, timeout: float = 30.0) -> None:
+    """Start `workers` pre-warmed render processes (no-op when workers <= 0)."""
+    global _pool, _pool_workers, _pool_timeout
+    if workers <= 0:
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = _create_pool(workers)
+            _pool_workers = workers
+            _pool_timeout = timeout
+            logger.info(f"Started chart render pool with {workers} workers")
+
+
+def shutdown_render_pool() -> None:
+    """Stop the render workers, if running."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _restart_pool(broken: ProcessPoolExecutor, kill: bool = False) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        if kill:
+            # The executor cannot cancel a running task; its worker processes
+            # (a private attribute) are killed so the stuck render stops
+            for process in list((getattr(broken, "_processes", None) or {}).values()):
+                process.kill()
+        broken.shutdown(wait=False, cancel_futures=True)
+        try:
+            _pool = _create_pool(_pool_workers)
+        except Exception as e:
+            logger.error(f"Could not restart chart render pool, rendering in-process: {str(e)}")
+            _pool = None
+
+
+def render_png(spec: Dict[str, Any]) -> bytes:
+    """
+    Render a chart spec to PNG bytes, in the render pool when it is running.
+    
+    Falls back to in-process rendering only if the pool is unavailable: not
+    started, shut down, or broken (a worker died). Errors raised by the
+    renderer itself, such as invalid data, are propagated.
+    
+    Raises:
+        TimeoutError: If the pool does not render the chart within the
+            configured timeout; the busy workers are killed and the pool restarted
+    """
+    # Imported here so that importing this module stays cheap
+    from app.tools.chart_rendering import render_chart
+    
+    pool = _pool
+    if pool is None:
+        return render_chart(spec)
+    try:
+        future = pool.submit(render_chart, spec)
+    except (BrokenProcessPool, RuntimeError) as e:
+        # Pool broke or shut down between the check and the submit
+        logger.warning(f"Chart render pool unavailable ({str(e)}); rendering in-process")
+        if isinstance(e, BrokenProcessPool):
+            _restart_pool(pool)
+        return render_chart(spec)
+    try:
+        return future.result(timeout=_pool_timeout)
+    except BrokenProcessPool:
+        logger.warning("Chart render pool is broken; restarting it and rendering in-process")
+        _restart_pool(pool)
+        return render_chart(spec)
+    except TimeoutError:
+        # Not rendered again in-process: a slow chart would cost twice the CPU
+        if not future.cancel():
+            logger.warning("Chart render exceeded its %gs timeout; restarting the render pool", _pool_timeout)
+            _restart_pool(pool, kill=True)
+        raise TimeoutError(f"chart rendering did not finish within {_pool_timeout:g}s")
+
+
+def render_pool_stats() -> Dict[str, Any]:
+    """Whether the pool is running and how many workers it has."""
+    return {"enabled": _pool is not None, "workers": _pool_workers if _pool is not None else 0}
@@ -0,0 +1,196 @@
+"""
+Vega-Lite export of chart specs.
+
+Turns a validated ChartSpec (as a dict) into a Vega-Lite specification that
+clients render themselves, as an alternative or a complement to the PNG
+rendered by chart_rendering.py. The data goes through the same preprocessing
+(chart_data.py), so both outputs show the same aggregated, sorted series; the
+exported data holds only those series, which for small series is much smaller
+than a PNG and lets the client offer hover tooltips and zooming.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.tools.chart_data import histogram_bins, labels, pivot_heatmap, prepare_series
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+# Chart types whose x axis is a set of categories rather than a scale
+_CATEGORICAL_X = {"bar", "stacked_bar", "pie"}
+
+# Line charts with more points than this are drawn without point markers
+_MAX_POINT_MARKERS = 50
+
+
+def _value(value: Any) -> Any:
+    """JSON-friendly value: plain Python numbers, with NaN as null."""
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        if not math.isfinite(value):
+            return None
+        return int(value) if value.is_integer() else value
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _field(name: str) -> str:
+    """Escape a column name for use as a Vega-Lite field reference."""
+    for char in ("\\", ".", "[", "]"):
+        name = name.replace(char, "\\" + char)
+    return name
+
+
+def _x_values(chart_type: str, x: np.ndarray) -> Tuple[List[Any], str]:
+    """x values as JSON, and the Vega-Lite type of the x encoding."""
+    if chart_type in _CATEGORICAL_X:
+        return labels(x), "nominal"
+    if np.issubdtype(x.dtype, np.datetime64):
+        return [str(v) for v in np.datetime_as_string(x, unit="s")], "temporal"
+    if np.issubdtype(x.dtype, np.number):
+        return [_value(v) for v in x], "quantitative"
+    return labels(x), "nominal"
+
+
+def _color_scale(spec: Dict[str, Any], count: int) -> Optional[Dict[str, Any]]:
+    colors = spec.get("colors") or []
+    return {"range": colors[:count]} if len(colors) >= count else None
+
+
+def _series_chart(spec: Dict[str, Any]) -> Dict[str, Any]:
+    chart_type = spec["chart_type"]
+    x, series = prepare_series(spec)
+    x_values, x_type = _x_values(chart_type, x)
+    names = list(series)
+
+    if chart_type == "pie":
+        (name, y), = series.items()
+        values = [
+            {spec["x"]: label, name: _value(v)}
+            for label, v in zip(x_values, y) if not np.isnan(v) and v > 0
+        ]
+        color = {"field": _field(spec["x"]), "type": "nominal", "sort": None}
+        scale = _color_scale(spec, len(values))
+        if scale:
+            color["scale"] = scale
+        return {
+            "data": {"values": values},
+            "mark": {"type": "arc", "tooltip": True},
+            "encoding": {
+                "theta": {"field": _field(name), "type": "quantitative", "stack": True},
+                "color": color,
+            },
+        }
+
+    # One row per x value with a column per series (compact for several
+    # series); a fold transform turns it into the long form for color encoding
+    values = [
+        {spec["x"]: x_value, **{name: _value(series[name][i]) for name in names}}
+        for i, x_value in enumerate(x_values)
+    ]
+    encoding: Dict[str, Any] = {
+        "x": {"field": _field(spec["x"]), "type": x_type, "title": spec.get("x_label") or spec["x"]},
+    }
+    if x_type == "nominal":
+        encoding["x"]["sort"] = None
+    y_title = spec.get("y_label")
+    if y_title is None:
+        y_title = names[0] if len(names) == 1 else ""
+
+    chart: Dict[str, Any] = {"data": {"values": values}}
+    if len(names) == 1:
+        encoding["y"] = {"field": _field(names[0]), "type": "quantitative", "title": y_title}
+        colors = spec.get("colors") or []
+        color = {"color": colors[0]} if colors else {}
+    else:
+        chart["transform"] = [{"fold": [_field(name) for name in names], "as": ["series", "value"]}]
+        encoding["y"] = {"field": "value", "type": "quantitative", "title": y_title}
+        encoding["color"] = {"field": "series", "type": "nominal", "sort": names}
+        scale = _color_scale(spec, len(names))
+        if scale:
+            encoding["color"]["scale"] = scale
+        color = {}
+
+    if chart_type in ("line", "multi_line"):
+        mark = {"type": "line", "point": len(values) <= _MAX_POINT_MARKERS}
+    elif chart_type == "area":
+        mark = {"type": "area", "line": True, "opacity": 0.6}
+        if len(names) == 1:
+            encoding["y"]["stack"] = None
+    elif chart_type in ("bar", "stacked_bar"):
+        mark = {"type": "bar"}
+        if chart_type == "bar" and len(names) > 1:
+            # Grouped rather than stacked bars
+            encoding["xOffset"] = {"field": "series", "sort": names}
+            encoding["y"]["stack"] = None
+    elif chart_type == "scatter":
+        mark = {"type": "point", "filled": True, "opacity": 0.7}
+    else:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+
+    chart["mark"] = {**mark, **color, "tooltip": True}
+    chart["encoding"] = encoding
+    if x_type in ("quantitative", "temporal"):
+        # Zoom and pan by dragging and scrolling over the plot
+        chart["params"] = [{"name": "zoom", "select": "interval", "bind": "scales"}]
+    return chart
+
+
+def _histogram_chart(spec: Dict[str, Any]) -> Dict[str, Any]:
+    counts, edges = histogram_bins(spec)
+    values = [
+        {"start": _value(start), "end": _value(end), "count": int(count)}
+        for start, end, count in zip(edges[:-1], edges[1:], counts)
+    ]
+    colors = spec.get("colors") or []
+    return {
+        "data": {"values": values},
+        "mark": {"type": "bar", "tooltip": True, **({"color": colors[0]} if colors else {})},
+        "encoding": {
+            "x": {"field": "start", "type": "quantitative", "bin": {"binned": True},
+                  "title": spec.get("x_label") or spec["x"]},
+            "x2": {"field": "end"},
+            "y": {"field": "count", "type": "quantitative", "title": spec.get("y_label") or "Count"},
+        },
+    }
+
+
+def _heatmap_chart(spec: Dict[str, Any]) -> Dict[str, Any]:
+    row_labels, column_labels, matrix = pivot_heatmap(spec)
+    y_name = spec["y"][0]
+    values = [
+        {spec["x"]: str(column_label), y_name: str(row_label), spec["value"]: _value(matrix[i, j])}
+        for i, row_label in enumerate(row_labels)
+        for j, column_label in enumerate(column_labels)
+        if not np.isnan(matrix[i, j])
+    ]
+    return {
+        "data": {"values": values},
+        "mark": {"type": "rect", "tooltip": True},
+        "encoding": {
+            "x": {"field": _field(spec["x"]), "type": "nominal", "title": spec.get("x_label") or spec["x"]},
+            "y": {"field": _field(y_name), "type": "nominal", "title": spec.get("y_label") or y_name},
+            "color": {"field": _field(spec["value"]), "type": "quantitative", "scale": {"scheme": "viridis"}},
+        },
+    }
+
+
+def to_vega_lite(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the Vega-Lite specification of a validated chart spec (as a dict)."""
+    chart_type = spec["chart_type"]
+    if chart_type == "histogram":
+        chart = _histogram_chart(spec)
+    elif chart_type == "heatmap":
+        chart = _heatmap_chart(spec)
+    else:
+        chart = _series_chart(spec)
+    return {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": spec.get("title", "Chart"),
+        "width": "container",
+        "height": 400 if chart_type == "pie" else 300,
+        **chart,
+    }
@@ -2,290 +2,157 @@
 Visualization tools for data analysis.
 """
 
-import json
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
 import base64
+import json
 import os
 import uuid
-from io import BytesIO
 from crewai.tools import BaseTool
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional, Union, Type
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, Optional, Type
+from app.core import config
+from app.services.artifacts import register_artifact, requested_chart_format, thumbnails_requested
+from app.services.cancellation import CrewCancelledError, raise_if_cancelled
+from app.services.datasets import DatasetNotFoundError, dataset_catalog
+from app.services.run_metrics import record_counter, timed_stage
+from app.tools.chart_spec import CHART_TYPES, MAX_CHART_ROWS, ChartInput, ChartSpec
+from app.tools.render_pool import render_png
+from app.tools.vega_lite import to_vega_lite
 
 # Define a constant for the image storage directory
 IMAGE_STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "images")
 # Ensure the directory exists
 os.makedirs(IMAGE_STORAGE_DIR, exist_ok=True)
 
-class LineChartInput(BaseModel):
-    """Input schema for LineChartTool."""
-    x_data: Union[List[str], List[int], List[float]] = Field(
-        ..., 
-        description="List of values for the x-axis (can be strings, integers, or floats)"
-    )
-    y_data: Union[List[int], List[float]] = Field(
-        ..., 
-        description="List of values for the y-axis (must be integers or floats)"
-    )
-    title: str = Field(
-        default="Line Chart", 
-        description="Title of the chart"
-    )
-    x_label: str = Field(
-        default="X Axis", 
-        description="Label for the x-axis"
-    )
-    y_label: str = Field(
-        default="Y Axis", 
-        description="Label for the y-axis"
-    )
-    color: str = Field(
-        default="blue", 
-        description="Color of the line (e.g., 'blue', 'red', 'green', etc.)"
-    )
-    line_width: int = Field(
-        default=2, 
-        description="Width of the line"
-    )
-    markers: bool = Field(
-        default=True, 
-        description="Whether to include markers on the line"
-    )
-    include_data_table: bool = Field(
-        default=False, 
-        description="Whether to include a data table below the chart"
-    )
+# One-line descriptions of each chart type, shown to the agents
+CHART_TYPE_DESCRIPTIONS = {
+    "line": "one y series over x, for trends",
+    "multi_line": "several y series over x",
+    "bar": "categories compared side by side (several y series are grouped)",
+    "stacked_bar": "several y series stacked per category",
+    "scatter": "y against numeric x, for correlation",
+    "histogram": "distribution of the numeric column x",
+    "area": "y series over x as filled areas (stacked when several)",
+    "pie": "shares of a total, one y value per x category",
+    "heatmap": "value over x and y[0] categories",
+}
 
-class LineChartTool(BaseTool):
-    """Tool for creating line chart visualizations."""
-    name: str = "create_line_chart"
-    description: str = "Create a line chart visualization using Matplotlib. Useful for visualizing trends over time or comparing values across categories."
-    args_schema: Type[BaseModel] = LineChartInput
+def save_chart(spec: ChartSpec) -> str:
+    """
+    Render a validated chart spec and save it to the image storage directory.
 
-    def _run(
-        self, 
-        x_data: Union[List[str], List[int], List[float]],
-        y_data: Union[List[int], List[float]],
-        title: str = "Line Chart",
-        x_label: str = "X Axis",
-        y_label: str = "Y Axis",
-        color: str = "blue",
-        line_width: int = 2,
-        markers: bool = True,
-        include_data_table: bool = False
-    ) -> str:
-        """
-        Create a line chart visualization using Matplotlib.
-        
-        Args:
-            x_data: List of values for the x-axis (can be strings, integers, or floats)
-            y_data: List of values for the y-axis (must be integers or floats)
-            title: Title of the chart
-            x_label: Label for the x-axis
-            y_label: Label for the y-axis
-            color: Color of the line (e.g., 'blue', 'red', 'green', etc.)
-            line_width: Width of the line
-            markers: Whether to include markers on the line
-            include_data_table: Whether to include a data table below the chart
-            
-        Returns:
-            A string with the image ID and a reference to access it
-        """
-        try:
-            # Create a DataFrame from the data
-            df = pd.DataFrame({x_label: x_data, y_label: y_data})
-            
-            # Create the figure
-            if include_data_table:
-                # Create a figure with two subplots (chart and table)
-                fig, (ax_chart, ax_table) = plt.subplots(2, 1, figsize=(10, 12), 
-                                                         gridspec_kw={'height_ratios': [3, 1]})
-                
-                # Plot the line chart on the first subplot
-                if markers:
-                    ax_chart.plot(df[x_label], df[y_label], color=color, linewidth=line_width, marker='o')
-                else:
-                    ax_chart.plot(df[x_label], df[y_label], color=color, linewidth=line_width)
-                
-                ax_chart.set_title(title)
-                ax_chart.set_xlabel(x_label)
-                ax_chart.set_ylabel(y_label)
-                ax_chart.grid(True, linestyle='--', alpha=0.7)
-                
-                # Create a table on the second subplot
-                table_data = [df[x_label].tolist(), df[y_label].tolist()]
-                table_cols = [x_label, y_label]
-                
-                # Hide the axes for the table subplot
-                ax_table.axis('tight')
-                ax_table.axis('off')
-                
-                # Create the table
-                table = ax_table.table(cellText=list(map(list, zip(*table_data))),
-                                      colLabels=table_cols,
-                                      loc='center',
-                                      cellLoc='center')
-                
-                # Style the table
-                table.auto_set_font_size(False)
-                table.set_fontsize(10)
-                table.scale(1, 1.5)
-                
-                ax_table.set_title("Data Table")
-                
-            else:
-                # Create a simple figure with just the chart
-                fig, ax = plt.subplots(figsize=(10, 6))
-                
-                # Plot the line chart
-                if markers:
-                    ax.plot(df[x_label], df[y_label], color=color, linewidth=line_width, marker='o')
-                else:
-                    ax.plot(df[x_label], df[y_label], color=color, linewidth=line_width)
-                
-                ax.set_title(title)
-                ax.set_xlabel(x_label)
-                ax.set_ylabel(y_label)
-                ax.grid(True, linestyle='--', alpha=0.7)
-            
-            # Adjust layout
-            plt.tight_layout()
-            
-            # Generate a unique ID for the image
-            image_id = str(uuid.uuid4())
-            image_filename = f"{image_id}.png"
-            image_path = os.path.join(IMAGE_STORAGE_DIR, image_filename)
-            
-            # Save the figure to the file system
-            plt.savefig(image_path, format='png', dpi=100)
-            
-            # Close the figure to free memory
-            plt.close(fig)
-            
-            # Return a reference to the image that can be used by the frontend
-            return f"I have created a {title} visualization. Image ID: {image_id}\n\nDo not modify this Image ID as it is needed to display the chart correctly."
-        
-        except Exception as e:
-            return f"Error creating line chart: {str(e)}"
+    Depending on the run's chart format the chart is saved as a PNG, as a
+    Vega-Lite spec for the client to render ({id}.vl.json), or both.
 
-class MultiLineChartInput(BaseModel):
-    """Input schema for MultiLineChartTool."""
-    data: List[Dict[str, Any]] = Field(
-        ..., 
-        description="List of dictionaries containing the data"
-    )
-    x_key: str = Field(
-        ..., 
-        description="Key in the dictionaries for x-axis values"
-    )
-    y_keys: List[str] = Field(
-        ..., 
-        description="List of keys in the dictionaries for y-axis values (multiple lines)"
-    )
-    title: str = Field(
-        default="Multi-Line Chart", 
-        description="Title of the chart"
-    )
-    x_label: str = Field(
-        default="X Axis", 
-        description="Label for the x-axis"
-    )
-    y_label: str = Field(
-        default="Y Axis", 
-        description="Label for the y-axis"
-    )
-    colors: Optional[List[str]] = Field(
-        default=None, 
-        description="List of colors for each line (if None, default colors will be used)"
-    )
-    line_width: int = Field(
-        default=2, 
-        description="Width of the lines"
-    )
-    markers: bool = Field(
-        default=True, 
-        description="Whether to include markers on the lines"
-    )
+    Args:
+        spec: The chart to render
+
+    Returns:
+        The ID of the saved image
+    """
+    chart_format = requested_chart_format()
+    data = spec.model_dump()
+
+    # Generate a unique ID for the image
+    image_id = str(uuid.uuid4())
+    artifact_spec: Dict[str, Any] = {
+        "chart_type": spec.chart_type,
+        "x": spec.x,
+        "y": list(spec.y),
+        "value": spec.value,
+        "png": chart_format != "vega_lite",
+    }
+
+    record_counter("charts")
+    if artifact_spec["png"]:
+        with timed_stage("chart_render"):
+            png = render_png(data)
+        with open(os.path.join(IMAGE_STORAGE_DIR, f"{image_id}.png"), "wb") as f:
+            f.write(png)
+        # Thumbnails are only made for runs whose response inlines them
+        if thumbnails_requested() and config.INLINE_THUMBNAIL_MAX_BYTES > 0:
+            from app.tools.chart_rendering import make_thumbnail
+
+            with timed_stage("chart_thumbnail"):
+                thumbnail = make_thumbnail(png, config.THUMBNAIL_MAX_PIXELS)
+            if len(thumbnail) <= config.INLINE_THUMBNAIL_MAX_BYTES:
+                artifact_spec["thumbnail"] = base64.b64encode(thumbnail).decode("ascii")
 
-class MultiLineChartTool(BaseTool):
-    """Tool for creating multi-line chart visualizations."""
-    name: str = "create_multi_line_chart"
-    description: str = "Create a multi-line chart visualization using Matplotlib. Useful for comparing multiple data series over time or across categories."
-    args_schema: Type[BaseModel] = MultiLineChartInput
+    if chart_format != "png":
+        with timed_stage("chart_vega_lite"):
+            vega_lite = to_vega_lite(data)
+        with open(os.path.join(IMAGE_STORAGE_DIR, f"{image_id}.vl.json"), "w") as f:
+            json.dump(vega_lite, f, separators=(",", ":"))
+        artifact_spec["vega_lite"] = vega_lite
 
-    def _run(
-        self,
-        data: List[Dict[str, Any]],
-        x_key: str,
-        y_keys: List[str],
-        title: str = "Multi-Line Chart",
-        x_label: str = "X Axis",
-        y_label: str = "Y Axis",
-        colors: Optional[List[str]] = None,
-        line_width: int = 2,
-        markers: bool = True
-    ) -> str:
+    # Register the image so the service returns it with the response
+    register_artifact("image", image_id, spec.title, artifact_spec)
+    return image_id
+
+class ChartTool(BaseTool):
+    """
+    Tool for creating chart visualizations from a declarative ChartSpec.
+
+    With `chart_type` set the tool always renders that type and takes the
+    shared ChartInput arguments; without it the agent picks the type through
+    the `chart_type` argument.
+    """
+    name: str = "create_chart"
+    description: str = (
+        "Create a chart and return its Image ID. chart_type is one of: "
+        + "; ".join(f"{chart_type} ({text})" for chart_type, text in CHART_TYPE_DESCRIPTIONS.items())
+        + "."
+    )
+    args_schema: Type[BaseModel] = ChartSpec
+    chart_type: Optional[str] = None
+
+    def _run(self, **kwargs: Any) -> str:
         """
-        Create a multi-line chart visualization using Matplotlib.
-        
+        Validate the chart request, render it and save the image.
+
         Args:
-            data: List of dictionaries containing the data
-            x_key: Key in the dictionaries for x-axis values
-            y_keys: List of keys in the dictionaries for y-axis values (multiple lines)
-            title: Title of the chart
-            x_label: Label for the x-axis
-            y_label: Label for the y-axis
-            colors: List of colors for each line (if None, default colors will be used)
-            line_width: Width of the lines
-            markers: Whether to include markers on the lines
-            
+            **kwargs: ChartInput fields, plus chart_type for the generic tool
+
         Returns:
-            A string with the image ID and a reference to access it
+            A short confirmation with the image ID, or a description of the error
         """
+        # Do not start rendering for a run whose client has gone away
+        raise_if_cancelled()
+
+        if self.chart_type:
+            kwargs["chart_type"] = self.chart_type
+        # Rows of a computed or registered dataset, read here rather than passed through the LLM
+        dataset_id = kwargs.get("dataset_id")
+        if dataset_id and not kwargs.get("data"):
+            try:
+                kwargs["data"] = dataset_catalog.load_rows(dataset_id, MAX_CHART_ROWS + 1)
+            except DatasetNotFoundError as e:
+                return f"Invalid chart request: {str(e)}"
+        try:
+            spec = ChartSpec(**kwargs)
+        except ValidationError as e:
+            problems = "; ".join(error["msg"] for error in e.errors())
+            return f"Invalid chart request: {problems}"
+
         try:
-            # Create a DataFrame from the data
-            df = pd.DataFrame(data)
-            
-            # Create the figure
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            # Plot each line
-            for i, y_key in enumerate(y_keys):
-                color = colors[i] if colors and i < len(colors) else None
-                if markers:
-                    ax.plot(df[x_key], df[y_key], label=y_key, linewidth=line_width, marker='o', color=color)
-                else:
-                    ax.plot(df[x_key], df[y_key], label=y_key, linewidth=line_width, color=color)
-            
-            # Add legend, title, and labels
-            ax.legend()
-            ax.set_title(title)
-            ax.set_xlabel(x_label)
-            ax.set_ylabel(y_label)
-            ax.grid(True, linestyle='--', alpha=0.7)
-            
-            # Adjust layout
-            plt.tight_layout()
-            
-            # Generate a unique ID for the image
-            image_id = str(uuid.uuid4())
-            image_filename = f"{image_id}.png"
-            image_path = os.path.join(IMAGE_STORAGE_DIR, image_filename)
-            
-            # Save the figure to the file system
-            plt.savefig(image_path, format='png', dpi=100)
-            
-            # Close the figure to free memory
-            plt.close(fig)
-            
-            # Return a reference to the image that can be used by the frontend
-            return f"I have created a {title} visualization with multiple lines. Image ID: {image_id}\n\nDo not modify this Image ID as it is needed to display the chart correctly."
-        
+            image_id = save_chart(spec)
+            return f"Created {spec.chart_type} chart '{spec.title}' (Image ID: {image_id})."
+        except CrewCancelledError:
+            # Unwinds the crew; not an error for the agent to work around
+            raise
         except Exception as e:
-            return f"Error creating multi-line chart: {str(e)}"
+            return f"Error creating {spec.chart_type} chart: {str(e)}"
+
+def _chart_type_tool(chart_type: str) -> ChartTool:
+    return ChartTool(
+        name=f"create_{chart_type}_chart",
+        description=f"Create a {chart_type.replace('_', '-')} chart ({CHART_TYPE_DESCRIPTIONS[chart_type]}) and return its Image ID.",
+        args_schema=ChartInput,
+        chart_type=chart_type
+    )
 
-# Create instances of the tools
-create_line_chart = LineChartTool()
-create_multi_line_chart = MultiLineChartTool() 
\ No newline at end of file
+# Create instances of the tools: one generic tool, and one per chart type for
+# agents that should only produce specific kinds of charts
+create_chart = ChartTool()
+CHART_TOOLS: Dict[str, ChartTool] = {chart_type: _chart_type_tool(chart_type) for chart_type in CHART_TYPES}
+create_line_chart = CHART_TOOLS["line"]
+create_multi_line_chart = CHART_TOOLS["multi_line"]
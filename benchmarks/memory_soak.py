@@ -0,0 +1,160 @@
+"""
+Memory soak test.
+
+Runs thousands of crew queries through CrewService with every agent on the
+offline LLM stub (see offline_llm.py), so the real CrewAI, chart rendering,
+cache and history code paths run without network access. After a warm-up
+phase it samples RSS (and, with --tracemalloc, traced Python allocations and
+the source lines that grew most) together with the live CrewAI agent, task
+and crew and Matplotlib figure counts.
+
+It exits with status 1 when memory is not flat: RSS grew by more than
+--max-growth-mb over the post-warm-up baseline, or more agents or figures are
+alive at the end than at the baseline.
+
+Usage:
+    python benchmarks/memory_soak.py [--requests 2000] [--concurrency 4] [--warmup 100]
+        [--sample-every 200] [--max-growth-mb 25] [--tracemalloc] [--latency 0]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="chatalyst-soak-")
+
+# Quiet, self-contained runs: no CrewAI console output or telemetry, every
+# LLM call goes through the stub, and history/cache files live in WORK_DIR
+os.environ.setdefault("CREW_VERBOSE", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+# The stub answers instantly, so provider rate limits would only throttle the run
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+os.environ.setdefault("CHART_OUTPUT", "png")
+os.environ.setdefault("HISTORY_PATH", os.path.join(WORK_DIR, "query_history.sqlite3"))
+
+from offline_llm import OfflineCrewService  # noqa: E402
+
+from app.services.memory_profiler import current_rss_bytes, live_object_counts, memory_profiler  # noqa: E402
+from app.tools import visualization_tools  # noqa: E402
+
+MB = 1024 * 1024
+
+
+async def run_requests(service, first: int, count: int, concurrency: int) -> int:
+    """Run `count` queries with at most `concurrency` in flight; return failures."""
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def run(index: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            try:
+                await service.process_query_with_crew(f"Compare sales by region (run {index})", route="benchmark")
+            except Exception as e:
+                failures += 1
+                print(f"request {index} failed: {e}", file=sys.__stderr__)
+
+    await asyncio.gather(*(run(index) for index in range(first, first + count)))
+    return failures
+
+
+def sample(done: int) -> dict:
+    gc.collect()
+    report = memory_profiler.report(top=0, include_objects=False)
+    return {
+        "requests": done,
+        "rss_mb": (current_rss_bytes() or 0) / MB,
+        "traced_mb": (report["tracemalloc"]["current_bytes"] or 0) / MB,
+        **live_object_counts(),
+    }
+
+
+async def soak(args) -> dict:
+    """
+    Run the soak and print its samples and verdict.
+
+    Returns:
+        The baseline and final samples, every sample, the failed request
+        count and the problems found (empty when memory stayed flat)
+    """
+    # Charts go to the scratch directory rather than app/static/images
+    visualization_tools.IMAGE_STORAGE_DIR = os.path.join(WORK_DIR, "images")
+    os.makedirs(visualization_tools.IMAGE_STORAGE_DIR, exist_ok=True)
+
+    service = OfflineCrewService(latency=args.latency, answer_chars=args.answer_chars)
+    failures = 0
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        failures += await run_requests(service, 0, args.warmup, args.concurrency)
+        if args.tracemalloc:
+            memory_profiler.take_baseline()
+        baseline = sample(args.warmup)
+        samples = [baseline]
+        done = args.warmup
+        while done < args.warmup + args.requests:
+            count = min(args.sample_every, args.warmup + args.requests - done)
+            failures += await run_requests(service, done, count, args.concurrency)
+            done += count
+            samples.append(sample(done))
+            print(
+                f"{done:>7} requests  rss {samples[-1]['rss_mb']:8.1f} MB  "
+                f"traced {samples[-1]['traced_mb']:7.1f} MB  "
+                f"agents {samples[-1].get('crewai_agents', 0):>4}  "
+                f"figures {samples[-1].get('matplotlib_figures', 0):>4}",
+                file=sys.__stdout__,
+                flush=True,
+            )
+        growth = memory_profiler.top_growth(10) if args.tracemalloc else []
+    elapsed = time.perf_counter() - start
+    service.close()
+
+    final = samples[-1]
+    rss_growth = final["rss_mb"] - baseline["rss_mb"]
+    print(f"\n{args.warmup + args.requests} requests in {elapsed:.1f}s "
+          f"({(args.warmup + args.requests) / elapsed:.1f} req/s), {failures} failed")
+    print(f"RSS {baseline['rss_mb']:.1f} MB -> {final['rss_mb']:.1f} MB ({rss_growth:+.1f} MB)")
+    if args.tracemalloc:
+        print(f"traced {baseline['traced_mb']:.1f} MB -> {final['traced_mb']:.1f} MB")
+        for entry in growth:
+            print(f"  {entry['size_diff_kb']:+10.1f} KiB  {entry['count_diff']:+8d}  {entry['location']}")
+
+    problems = []
+    if rss_growth > args.max_growth_mb:
+        problems.append(f"RSS grew {rss_growth:.1f} MB (limit {args.max_growth_mb} MB)")
+    for label in ("crewai_agents", "crewai_crews", "matplotlib_figures"):
+        if final.get(label, 0) > baseline.get(label, 0):
+            problems.append(f"{label} grew from {baseline.get(label, 0)} to {final.get(label, 0)}")
+    if failures:
+        problems.append(f"{failures} requests failed")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("PASS: memory stayed flat")
+    return {"baseline": baseline, "final": final, "samples": samples, "failures": failures, "problems": problems}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests after warm-up")
+    parser.add_argument("--warmup", type=int, default=100, help="Requests run before the baseline")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--sample-every", type=int, default=200, help="Requests between memory samples")
+    parser.add_argument("--max-growth-mb", type=float, default=25, help="Allowed RSS growth over the baseline")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per stub LLM completion")
+    parser.add_argument("--answer-chars", type=int, default=2000, help="Length of the stub's final answers")
+    args = parser.parse_args()
+    report = asyncio.run(soak(args))
+    sys.exit(1 if report["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
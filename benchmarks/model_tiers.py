@@ -0,0 +1,128 @@
+"""
+Model tiering benchmark.
+
+Compares end-to-end query latency for different assignments of models to the
+crew roles (planner, manager, analyst) on the offline LLM stub (see
+offline_llm.py). The stub does not call any backend: each model name maps to
+a fixed number of seconds per completion, standing in for its response time,
+while the crews, delegation, decomposition and chart tools run for real.
+
+The default latencies are rough assumptions for a hosted large model, a
+hosted small model and a small model on a local OpenAI-compatible server;
+pass --model-latency MODEL=SECONDS to use measured values instead.
+
+Usage:
+    python benchmarks/model_tiers.py [--runs 3]
+        [--model-latency gpt-4o=1.5 --model-latency gpt-4o-mini=0.7 ...]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="chatalyst-tiers-")
+
+# Quiet, self-contained runs (see memory_soak.py)
+os.environ.setdefault("CREW_VERBOSE", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+os.environ.setdefault("CHART_OUTPUT", "png")
+os.environ.setdefault("HISTORY_ENABLED", "false")
+
+from offline_llm import OfflineCrewService  # noqa: E402
+
+from app.core import config  # noqa: E402
+from app.core.llm_roles import RoleLLMConfig  # noqa: E402
+from app.tools import visualization_tools  # noqa: E402
+
+LOCAL_MODEL = "openai/qwen2.5-7b-instruct"
+
+DEFAULT_MODEL_LATENCY = {
+    "gpt-4o": 1.5,
+    "gpt-4o-mini": 0.7,
+    LOCAL_MODEL: 0.25,
+}
+
+# Tier name -> model of each role
+TIERS = {
+    "all gpt-4o": {"planner": "gpt-4o", "manager": "gpt-4o", "analyst": "gpt-4o"},
+    "all gpt-4o-mini": {"planner": "gpt-4o-mini", "manager": "gpt-4o-mini", "analyst": "gpt-4o-mini"},
+    "local planner/manager, gpt-4o analyst": {"planner": LOCAL_MODEL, "manager": LOCAL_MODEL, "analyst": "gpt-4o"},
+    "local planner/manager, mini analyst": {"planner": LOCAL_MODEL, "manager": LOCAL_MODEL, "analyst": "gpt-4o-mini"},
+}
+
+QUERIES = {
+    "single": "Show monthly revenue for 2024",
+    "multi-part": "Compare revenue, churn and CAC by quarter",
+}
+
+
+def role_configs(models: dict) -> dict:
+    configs = {}
+    for role, model in models.items():
+        local = model == LOCAL_MODEL
+        configs[role] = RoleLLMConfig(
+            model=model,
+            base_url="http://localhost:8001/v1" if local else None,
+            rate_limited=not local,
+        )
+    return configs
+
+
+async def measure(models: dict, model_latency: dict, query: str, runs: int) -> float:
+    """Mean wall time of `runs` queries with the given role models."""
+    config.LLM_ROLES = role_configs(models)
+    service = OfflineCrewService(model_latency=model_latency, answer_chars=800)
+    times = []
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            await service.process_query_with_crew(query, route="benchmark")
+            times.append(time.perf_counter() - start)
+    finally:
+        service.close()
+    return statistics.mean(times)
+
+
+async def benchmark(args) -> None:
+    visualization_tools.IMAGE_STORAGE_DIR = os.path.join(WORK_DIR, "images")
+    os.makedirs(visualization_tools.IMAGE_STORAGE_DIR, exist_ok=True)
+    model_latency = dict(DEFAULT_MODEL_LATENCY)
+    for entry in args.model_latency:
+        model, _, seconds = entry.rpartition("=")
+        model_latency[model] = float(seconds)
+
+    print("Seconds per completion: " + ", ".join(f"{model} {seconds}" for model, seconds in model_latency.items()))
+    print(f"{args.runs} runs per tier and query\n")
+    header = f"{'tier':<40}" + "".join(f"{name:>12}" for name in QUERIES)
+    print(header)
+    print("-" * len(header))
+    for tier, models in TIERS.items():
+        results = []
+        for query in QUERIES.values():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results.append(await measure(models, model_latency, query, args.runs))
+        print(f"{tier:<40}" + "".join(f"{seconds:>11.2f}s" for seconds in results), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Queries per tier and query")
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+        help="Seconds per completion of a model (repeatable)",
+    )
+    args = parser.parse_args()
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Offline LLM stub for benchmarks and soak runs.
+
+OfflineLLM is a ManagedLLM whose provider call is replaced by canned ReAct
+responses. Everything else in the crew path stays real: CrewAI agents, tasks
+and crews, delegation, the chart tool and renderer, the rate limiter, the
+completion cache and the query history. Runs need no network or API key,
+and an optional fixed latency stands in for the provider's response time.
+
+The stub answers:
+- planning prompts with a JSON plan for each task
+- decomposition prompts by splitting the question at commas and "and"
+- managers (who have the delegation tool) by delegating each part of the
+  question to the analyst, one after another
+- analysts (who have create_chart) by creating one bar chart
+- everything else, and any prompt that already holds a tool observation,
+  with a final answer
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.services.crew_service import CrewService  # noqa: E402
+from app.services.llm import ManagedLLM  # noqa: E402
+
+SAMPLE_DATA = [
+    {"region": "North", "sales": 120},
+    {"region": "South", "sales": 95},
+    {"region": "East", "sales": 143},
+    {"region": "West", "sales": 88},
+]
+
+# Where the user's question appears in the manager's and decomposer's prompts
+QUESTION_PATTERN = re.compile(r"(?:for this query|User question): (.+)")
+# The part an analyst was given, by the manager or as a parallel sub-analysis
+SUBJECT_PATTERN = re.compile(r"Analyze one part of the user's question: (.+)|Analyze (.+?) and chart the result")
+
+
+def split_question(question: str) -> list:
+    """Naive split of a multi-part question at commas and "and"."""
+    parts = [part.strip(" .?") for part in re.split(r",\s*(?:and\s+)?|\s+and\s+", question)]
+    return [part for part in parts if part]
+
+
+def _as_messages(messages):
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return messages
+
+
+class OfflineLLM(ManagedLLM):
+    """ManagedLLM answering from canned responses instead of a provider.
+
+    Args:
+        latency: Seconds each completion takes
+        answer_chars: Length of final answers, to mimic large agent output
+        **kwargs: Passed through to ManagedLLM
+    """
+
+    def __init__(self, *args, latency: float = 0.0, answer_chars: int = 2000, **kwargs):
+        kwargs.setdefault("model", "offline/stub")
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+        self.answer_chars = answer_chars
+        self.calls = 0
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def _complete(self, messages, tools=None, callbacks=None, available_functions=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.respond(_as_messages(messages))
+
+    def respond(self, messages) -> str:
+        """Canned response for a conversation (see the module docstring)."""
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        # The format instructions mention "Observation:" too, so only the
+        # agent's own turns show whether a tool has already been used
+        tool_uses = sum(
+            "Observation:" in str(message.get("content", ""))
+            for message in messages if message.get("role") == "assistant"
+        )
+        match = QUESTION_PATTERN.search(prompt)
+        parts = split_question(match.group(1)) if match else []
+        if '"sub_analyses"' in prompt:
+            return json.dumps({"sub_analyses": [{"title": part, "question": part} for part in parts]})
+        if "Task Number" in prompt and "plan" in prompt:
+            plans = [
+                {"task": f"Task Number {number}", "plan": " Step 1: analyze the data. Step 2: chart it."}
+                for number in range(1, max(1, prompt.count("Task Number ")) + 1)
+            ]
+            return self.final_answer(json.dumps({"list_of_plans_per_task": plans}))
+        if "Delegate work to coworker" in prompt and tool_uses < max(1, len(parts)):
+            part = parts[tool_uses] if parts else "sales by region"
+            return self.action("Delegate work to coworker", {
+                "task": f"Analyze {part} and chart the result",
+                "context": "The user wants to compare these figures.",
+                "coworker": "Data Analyst",
+            })
+        if not tool_uses:
+            if "create_chart" in prompt:
+                # Distinct titles per part, or CrewAI's tool cache would answer
+                # repeated identical chart calls without running the tool
+                subject = SUBJECT_PATTERN.search(prompt)
+                title = next((group for group in subject.groups() if group), "Sales") if subject else "Sales"
+                return self.action("create_chart", {
+                    "chart_type": "bar",
+                    "data": SAMPLE_DATA,
+                    "x": "region",
+                    "y": ["sales"],
+                    "title": f"{title.strip(' .?')} by region",
+                })
+        return self.final_answer(self.answer_text())
+
+    def answer_text(self) -> str:
+        sentence = "East leads regional sales, while West trails the other regions. "
+        return (sentence * (self.answer_chars // len(sentence) + 1))[:self.answer_chars]
+
+    @staticmethod
+    def action(tool: str, tool_input: dict) -> str:
+        return (
+            f"Thought: I should use the {tool} tool.\n"
+            f"Action: {tool}\n"
+            f"Action Input: {json.dumps(tool_input)}"
+        )
+
+    @staticmethod
+    def final_answer(text: str) -> str:
+        return f"Thought: I now know the final answer\nFinal Answer: {text}"
+
+
+class OfflineCrewService(CrewService):
+    """CrewService whose agents all use OfflineLLM.
+
+    Roles keep their configured settings (config.LLM_ROLES) apart from the
+    backend, so the model name only selects the stub's latency.
+
+    Args:
+        latency: Seconds per completion for models missing from model_latency
+        answer_chars: Length of the stub's final answers
+        model_latency: Seconds per completion by configured model name
+    """
+
+    def __init__(self, latency: float = 0.0, answer_chars: int = 2000, model_latency: dict = None):
+        self.offline_latency = latency
+        self.offline_answer_chars = answer_chars
+        self.offline_model_latency = model_latency or {}
+        super().__init__()
+
+    def create_llm(self, role):
+        from app.core import config
+
+        settings = config.LLM_ROLES[role]
+        cache = None if role in config.LLM_CACHE_DISABLED_ROLES else self.llm_cache
+        return OfflineLLM(
+            model=settings.model,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            role=role,
+            rate_limiter=self.rate_limiter if settings.rate_limited else None,
+            cache=cache,
+            max_concurrency=settings.max_concurrency,
+            latency=self.offline_model_latency.get(settings.model, self.offline_latency),
+            answer_chars=self.offline_answer_chars,
+        )
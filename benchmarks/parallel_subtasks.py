@@ -0,0 +1,88 @@
+"""
+Parallel sub-analysis benchmark.
+
+Runs a multi-part question ("compare revenue, churn and CAC by quarter")
+through CrewService on the offline LLM stub (see offline_llm.py) twice: with
+decomposition disabled, where the consultant delegates the parts to a single
+analyst one after another, and with it enabled, where one analyst crew per
+part runs concurrently and the consultant merges their findings. Every stub
+completion takes --latency seconds, standing in for the provider's response
+time, so the wall-clock difference reflects how many LLM round trips sit on
+the critical path of each mode.
+
+Usage:
+    python benchmarks/parallel_subtasks.py [--runs 3] [--latency 0.5]
+        [--query "Compare revenue, churn and CAC by quarter"]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="chatalyst-parallel-")
+
+# Quiet, self-contained runs (see memory_soak.py)
+os.environ.setdefault("CREW_VERBOSE", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+os.environ.setdefault("CHART_OUTPUT", "png")
+os.environ.setdefault("HISTORY_ENABLED", "false")
+
+from offline_llm import OfflineCrewService  # noqa: E402
+
+from app.core import config  # noqa: E402
+from app.tools import visualization_tools  # noqa: E402
+
+
+async def measure(service, query: str, runs: int, max_subtasks: int) -> dict:
+    """Mean wall time and charts of `runs` queries with the given CREW_MAX_SUBTASKS."""
+    config.CREW_MAX_SUBTASKS = max_subtasks
+    times = []
+    charts = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(runs):
+            start = time.perf_counter()
+            response = await service.process_query_with_crew(query, route="benchmark")
+            times.append(time.perf_counter() - start)
+            charts = len(response["images"])
+    return {"mean": statistics.mean(times), "min": min(times), "charts": charts}
+
+
+async def benchmark(args) -> None:
+    visualization_tools.IMAGE_STORAGE_DIR = os.path.join(WORK_DIR, "images")
+    os.makedirs(visualization_tools.IMAGE_STORAGE_DIR, exist_ok=True)
+    service = OfflineCrewService(latency=args.latency, answer_chars=args.answer_chars)
+
+    print(f"Query: {args.query}")
+    print(f"{args.runs} runs per mode, {args.latency:.2f}s per LLM completion\n")
+    serial = await measure(service, args.query, args.runs, max_subtasks=1)
+    print(f"single analyst (serial delegation): {serial['mean']:6.2f}s mean, "
+          f"{serial['min']:6.2f}s best, {serial['charts']} charts")
+    parallel = await measure(service, args.query, args.runs, max_subtasks=args.max_subtasks)
+    print(f"parallel analyst crews:             {parallel['mean']:6.2f}s mean, "
+          f"{parallel['min']:6.2f}s best, {parallel['charts']} charts")
+    print(f"\nspeedup: {serial['mean'] / parallel['mean']:.2f}x")
+    service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--query", default="Compare revenue, churn and CAC by quarter")
+    parser.add_argument("--runs", type=int, default=3, help="Queries per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per stub LLM completion")
+    parser.add_argument("--max-subtasks", type=int, default=4, help="CREW_MAX_SUBTASKS for the parallel mode")
+    parser.add_argument("--answer-chars", type=int, default=800, help="Length of the stub's final answers")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
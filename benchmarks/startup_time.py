@@ -0,0 +1,79 @@
+"""
+Startup-time benchmark.
+
+Imports a module (default: app.main) in a fresh interpreter under
+`python -X importtime`, then reports total wall time and the slowest imports
+by cumulative time, both per module and rolled up per top-level package.
+
+Usage:
+    python benchmarks/startup_time.py [--module app.main] [--top 20] [--runs 3]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(module: str):
+    """Import `module` in a subprocess; return (wall seconds, importtime rows)."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return wall, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to show")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold imports to time")
+    args = parser.parse_args()
+
+    walls = []
+    rows = []
+    for _ in range(args.runs):
+        wall, rows = run_import(args.module)
+        walls.append(wall)
+
+    print(f"import {args.module}: median wall time {statistics.median(walls) * 1000:.0f} ms "
+          f"over {args.runs} runs (min {min(walls) * 1000:.0f} ms)")
+
+    # Names are indented by two spaces per nesting level after a single space
+    packages = defaultdict(int)
+    for name, _, cumulative_us in rows:
+        if len(name) - len(name.lstrip()) <= 1:
+            packages[name.strip().split(".")[0]] += cumulative_us
+
+    print("\nSlowest top-level packages (cumulative ms, last run):")
+    for package, cumulative_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f}  {package}")
+
+    print("\nSlowest modules (self ms / cumulative ms, last run):")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 from dotenv import load_dotenv
@@ -15,6 +16,13 @@ load_dotenv()
 # API configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000/api/v1")
 BASE_URL = API_URL.replace("/api/v1", "")
+# Seconds a health check result is reused across reruns
+HEALTH_CHECK_TTL = int(os.getenv("HEALTH_CHECK_TTL", "30"))
+# Seconds to wait for the next progress line from a streaming query
+STREAM_READ_TIMEOUT = int(os.getenv("STREAM_READ_TIMEOUT", "120"))
+# Chart output requested from the API: vega_lite charts are rendered in the
+# browser (interactive, no PNG download), png charts are rendered by the server
+CHART_FORMAT = os.getenv("CHART_FORMAT", "vega_lite")
 
 # Configure page settings
 st.set_page_config(
@@ -27,10 +35,55 @@ st.set_page_config(
 st.title("ChatalystBI - Intelligent Business Analytics Platform")
 st.markdown("Chat with your data using natural language to get insights and visualizations")
 
+@st.cache_resource
+def get_http_session():
+    """Pooled keep-alive HTTP session shared across reruns"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=HEALTH_CHECK_TTL, show_spinner=False)
+def check_api_health():
+    """Probe the API health endpoint; the result is cached for HEALTH_CHECK_TTL seconds"""
+    try:
+        return get_http_session().get(f"{BASE_URL}/health", timeout=5).status_code == 200
+    except requests.RequestException:
+        return None
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def fetch_chart_bytes(image_id, _url):
+    """
+    Download a chart once and keep its bytes locally, keyed by Image ID
+    
+    Args:
+        image_id: The chart's Image ID (the cache key)
+        _url: Where to download the chart from (not part of the cache key)
+    """
+    response = get_http_session().get(_url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+def show_image(img):
+    """Render a chart client-side from its Vega-Lite spec, or as a PNG (cached or by URL)"""
+    if img.get("vega_lite"):
+        st.vega_lite_chart(img["vega_lite"], use_container_width=True)
+        return
+    if not img.get("url"):
+        return
+    try:
+        st.image(fetch_chart_bytes(img["id"], img["url"]))
+    except requests.RequestException as e:
+        logger.warning(f"Could not fetch chart {img['id']}: {str(e)}")
+        st.image(img["url"])
+
 def initialize_session_state():
     """Initialize the application session state"""
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = None
 
 def display_chat_history():
     """Display the chat history with text and images"""
@@ -41,7 +94,7 @@ def display_chat_history():
             # Display images if available
             if "images" in message and message["images"]:
                 for img in message["images"]:
-                    st.image(img["url"])
+                    show_image(img)
 
 def handle_user_input(user_input):
     """
@@ -63,30 +116,67 @@ def handle_user_input(user_input):
         message_placeholder.markdown("Thinking...")
         
         try:
-            # Send request to API
-            response = requests.post(
-                f"{API_URL}/chat/query",
-                json={"query": user_input},
-                timeout=60  # Set a reasonable timeout
+            # Stream the query so progress and charts render as they arrive
+            response = get_http_session().post(
+                f"{API_URL}/chat/query/stream",
+                json={
+                    "query": user_input,
+                    "session_id": st.session_state.session_id,
+                    "chart_format": CHART_FORMAT
+                },
+                stream=True,
+                timeout=(5, STREAM_READ_TIMEOUT)
             )
             
             if response.status_code == 200:
-                result = response.json()
-                
-                # Update message and add to history
-                message_placeholder.markdown(result["response"])
+                images = []
+                result = None
+                error_msg = None
+                steps = 0
                 
-                # Process images
-                if "images" in result and result["images"]:
-                    for img in result["images"]:
-                        st.image(img["url"])
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    event_type = event.get("type")
+                    
+                    if event_type == "status":
+                        # Keep the server-side session so follow-ups build on this answer
+                        st.session_state.session_id = event.get("session_id") or st.session_state.session_id
+                        message_placeholder.markdown(f"{event['message']}...")
+                    elif event_type in ("step", "tool"):
+                        steps += 1
+                        detail = f" (using {event['tool']})" if event_type == "tool" else ""
+                        message_placeholder.markdown(f"Thinking... step {steps}{detail}")
+                    elif event_type == "image":
+                        images.append(event["image"])
+                        show_image(event["image"])
+                    elif event_type == "result":
+                        result = event["response"]
+                    elif event_type == "error":
+                        error_msg = f"Error: {event['detail']}"
                 
-                # Add response to history
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": result["response"],
-                    "images": result.get("images", [])
-                })
+                if result is not None:
+                    st.session_state.session_id = result.get("session_id") or st.session_state.session_id
+                    message_placeholder.markdown(result["response"])
+                    
+                    # Charts streamed earlier are already shown; render any the stream missed
+                    streamed_ids = {img["id"] for img in images}
+                    for img in result.get("images", []):
+                        if img["id"] not in streamed_ids:
+                            show_image(img)
+                    
+                    # Add response to history
+                    st.session_state.messages.append({
+                        "role": "assistant", 
+                        "content": result["response"],
+                        "images": result.get("images", [])
+                    })
+                else:
+                    error_msg = error_msg or "Error: the API closed the stream without a result"
+                    message_placeholder.markdown(error_msg)
+                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                    logger.error(error_msg)
             else:
                 error_msg = f"Error: API returned status code {response.status_code}"
                 message_placeholder.markdown(error_msg)
@@ -122,15 +212,14 @@ def create_sidebar():
         4. Continue asking questions to explore your data further
         """)
         
-        # Add health check
-        try:
-            health_response = requests.get(f"{BASE_URL}/health", timeout=5)
-            if health_response.status_code == 200:
-                st.success("API connection: OK")
-            else:
-                st.error("API connection: Failed")
-        except:
+        # Add health check (cached, so reruns do not block on the API)
+        healthy = check_api_health()
+        if healthy:
+            st.success("API connection: OK")
+        elif healthy is None:
             st.error("Cannot connect to API")
+        else:
+            st.error("API connection: Failed")
 
 def main():
     """Main application function"""
@@ -0,0 +1,51 @@
+"""
+Shared setup for the test suite.
+
+Crew runs use the offline LLM stub from benchmarks/offline_llm.py, so tests
+need no network or API key. The environment is set before any app module is
+imported, since app.core.config reads it at import time. Tests marked slow
+only run with --runslow.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Quiet, self-contained runs: no CrewAI console output or telemetry, no
+# history or cache files, and provider rate limits high enough not to throttle
+os.environ.setdefault("CREW_VERBOSE", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("HISTORY_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+# Per-role concurrency slots, so tests can check they are given back
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "2")
+os.environ.setdefault("CHART_OUTPUT", "png")
+os.environ.setdefault("DATASETS_DIR", tempfile.mkdtemp(prefix="chatalyst-test-data-"))
+os.environ.setdefault("DATASET_RESULTS_DIR", tempfile.mkdtemp(prefix="chatalyst-test-results-"))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", default=False, help="Also run tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running test, skipped unless --runslow is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="slow test; run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
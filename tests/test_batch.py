@@ -0,0 +1,106 @@
+"""The /batch endpoint: one NDJSON line per item, then a summary line."""
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from offline_llm import OfflineCrewService
+
+from app.api.endpoints import chat
+from app.core import config
+from app.core.tenants import TenantPolicy
+from app.services.scheduler import QueryScheduler
+
+QUERIES = ["Sales by region", "Revenue by quarter", "Top products by margin"]
+
+
+@pytest.fixture(scope="module")
+def crew_service():
+    service = OfflineCrewService()
+    yield service
+    service.close()
+
+
+def make_client(crew_service, scheduler=None):
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.state.scheduler = scheduler or QueryScheduler(4, TenantPolicy())
+    app.state.crew_service = crew_service
+    return TestClient(app)
+
+
+def post_batch(client, body):
+    response = client.post("/batch", json=body)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def test_batch_streams_one_line_per_item_then_a_summary(crew_service):
+    items, summary = post_batch(
+        make_client(crew_service), {"requests": [{"query": query} for query in QUERIES], "max_parallelism": 2}
+    )
+
+    assert sorted(item["index"] for item in items) == [0, 1, 2]
+    for item in items:
+        assert (item["type"], item["status"]) == ("item", "ok")
+        assert item["response"]["response"]
+        assert item["elapsed_ms"] >= 0 and item["queue_wait_ms"] >= 0
+    assert summary["type"] == "summary"
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (3, 3, 0)
+    assert summary["max_parallelism"] == 2
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"] <= summary["wall_time_ms"]
+
+
+def test_failed_item_does_not_stop_the_batch(crew_service, monkeypatch):
+    process = crew_service.process_query_with_crew
+
+    async def fail_on_revenue(query, *args, **kwargs):
+        if query.startswith("Revenue"):
+            raise RuntimeError("dataset unavailable")
+        return await process(query, *args, **kwargs)
+
+    monkeypatch.setattr(crew_service, "process_query_with_crew", fail_on_revenue)
+
+    items, summary = post_batch(make_client(crew_service), {"requests": [{"query": query} for query in QUERIES]})
+
+    statuses = {item["index"]: item["status"] for item in items}
+    assert statuses == {0: "ok", 1: "error", 2: "ok"}
+    assert next(item for item in items if item["index"] == 1)["error"] == "dataset unavailable"
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+
+
+def test_items_rejected_by_the_scheduler_are_reported(crew_service):
+    client = make_client(crew_service, QueryScheduler(1, TenantPolicy(max_queued=0)))
+
+    items, summary = post_batch(client, {"requests": [{"query": query} for query in QUERIES[:2]]})
+
+    assert [item["status"] for item in items] == ["rejected", "rejected"]
+    assert all(item["error"] and "queue_wait_ms" in item for item in items)
+    assert (summary["succeeded"], summary["failed"]) == (0, 2)
+
+
+def test_parallelism_is_capped_by_the_server(crew_service):
+    _, summary = post_batch(make_client(crew_service), {"requests": [{"query": QUERIES[0]}], "max_parallelism": 10000})
+
+    assert summary["max_parallelism"] == config.BATCH_MAX_PARALLELISM
+
+
+@pytest.mark.parametrize("body", [
+    {"requests": []},
+    {"requests": [{"query": QUERIES[0]}], "max_parallelism": 0},
+    {},
+])
+def test_invalid_batch_is_rejected(crew_service, body):
+    assert make_client(crew_service).post("/batch", json=body).status_code == 422
+
+
+def test_oversized_batch_is_rejected(crew_service, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_MAX_ITEMS", 2)
+
+    response = make_client(crew_service).post("/batch", json={"requests": [{"query": query} for query in QUERIES]})
+
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Batch too large: 3 items (max 2)"
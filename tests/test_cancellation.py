@@ -0,0 +1,68 @@
+"""Cancelling a crew run mid-flight stops it and frees everything it held."""
+
+import asyncio
+
+import pytest
+
+from offline_llm import OfflineCrewService
+
+from app.core.tenants import TenantPolicy
+from app.services.artifacts import current_artifact_registry
+from app.services.cancellation import CancellationToken, CrewCancelledError, current_cancellation_token
+from app.services.progress import current_progress_listener
+from app.services.rate_limiter import INTERACTIVE, current_llm_priority
+from app.services.run_metrics import current_run_metrics
+from app.services.scheduler import QueryScheduler
+
+
+@pytest.fixture(scope="module")
+def crew_service():
+    # Slow enough completions that the run is still in flight when cancelled
+    service = OfflineCrewService(latency=0.2)
+    yield service
+    service.close()
+
+
+async def cancel_after_first_llm_call(service: OfflineCrewService, token: CancellationToken) -> None:
+    while not any(llm.calls for llm in service._llms.values()):
+        await asyncio.sleep(0.01)
+    token.cancel("client disconnected")
+
+
+def test_cancelled_run_releases_its_resources(crew_service):
+    scheduler = QueryScheduler(1, TenantPolicy())
+    token = CancellationToken()
+
+    async def run() -> None:
+        canceller = asyncio.create_task(cancel_after_first_llm_call(crew_service, token))
+        try:
+            async with scheduler.slot("tests", cancel_token=token):
+                await crew_service.process_query_with_crew(
+                    "Compare sales by region and revenue by quarter", cancel_token=token, route="query"
+                )
+        finally:
+            canceller.cancel()
+
+    with pytest.raises(CrewCancelledError):
+        asyncio.run(run())
+
+    # Per-run state does not leak into the caller's context
+    assert current_cancellation_token.get() is None
+    assert current_llm_priority.get() == INTERACTIVE
+    assert current_artifact_registry.get() is None
+    assert current_progress_listener.get() is None
+    assert current_run_metrics.get() is None
+
+    # The crew slot and every role's LLM concurrency slots are free again
+    stats = scheduler.stats()
+    assert stats["running"] == 0 and stats["queued"] == 0
+    assert crew_service._llms
+    for llm in crew_service._llms.values():
+        assert llm._slots._value == llm.max_concurrency
+
+
+def test_cancelled_token_stops_run_before_it_starts(crew_service):
+    token = CancellationToken()
+    token.cancel("client disconnected")
+    with pytest.raises(CrewCancelledError):
+        asyncio.run(crew_service.process_query_with_crew("Sales by region", cancel_token=token, route="query"))
@@ -0,0 +1,125 @@
+"""Chart specs: validation, rendering and Vega-Lite export of every chart type."""
+
+import re
+
+import pytest
+from pydantic import ValidationError
+
+from app.tools.chart_rendering import render_chart
+from app.tools.chart_spec import CHART_TYPES, MAX_CHART_ROWS, ChartSpec
+from app.tools.vega_lite import VEGA_LITE_SCHEMA, to_vega_lite
+from app.tools.visualization_tools import CHART_TOOLS, create_chart
+
+ROWS = [
+    {"day": day, "month": month, "region": region, "sales": 10 + day * 3 % 7, "cost": 4 + day % 5}
+    for day, (month, region) in enumerate(
+        [(month, region) for month in ("Jan", "Feb", "Mar") for region in ("East", "West", "North")], start=1
+    )
+]
+
+# Arguments of one valid chart per type
+CHARTS = {
+    "line": {"x": "day", "y": ["sales"]},
+    "multi_line": {"x": "day", "y": ["sales", "cost"]},
+    "bar": {"x": "region", "y": ["sales"], "aggregate": "sum"},
+    "stacked_bar": {"x": "region", "y": ["sales", "cost"], "aggregate": "sum"},
+    "scatter": {"x": "cost", "y": ["sales"]},
+    "histogram": {"x": "sales", "bins": 5},
+    "area": {"x": "day", "y": ["sales", "cost"]},
+    "pie": {"x": "region", "y": ["sales"], "aggregate": "sum"},
+    "heatmap": {"x": "month", "y": ["region"], "value": "sales"},
+}
+
+
+# Expected Vega-Lite mark type and encoding channels (channel: field) per chart type
+VEGA_LITE = {
+    "line": ("line", {"x": "day", "y": "sales"}),
+    "multi_line": ("line", {"x": "day", "y": "value", "color": "series"}),
+    "bar": ("bar", {"x": "region", "y": "sales"}),
+    "stacked_bar": ("bar", {"x": "region", "y": "value", "color": "series"}),
+    "scatter": ("point", {"x": "cost", "y": "sales"}),
+    "histogram": ("bar", {"x": "start", "x2": "end", "y": "count"}),
+    "area": ("area", {"x": "day", "y": "value", "color": "series"}),
+    "pie": ("arc", {"theta": "sales", "color": "region"}),
+    "heatmap": ("rect", {"x": "month", "y": "region", "color": "sales"}),
+}
+
+
+def make_spec(chart_type, **overrides):
+    arguments = {"data": ROWS, "title": f"Test {chart_type}", **CHARTS[chart_type], **overrides}
+    return ChartSpec(chart_type=chart_type, **arguments)
+
+
+def test_every_chart_type_has_a_case():
+    assert sorted(CHARTS) == sorted(CHART_TYPES) == sorted(VEGA_LITE)
+
+
+@pytest.mark.parametrize("chart_type", CHART_TYPES)
+def test_every_chart_type_renders(chart_type):
+    png = render_chart(make_spec(chart_type).model_dump())
+
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    assert len(png) > 1000
+
+
+@pytest.mark.parametrize("chart_type", CHART_TYPES)
+def test_every_chart_type_exports_vega_lite(chart_type):
+    chart = to_vega_lite(make_spec(chart_type).model_dump())
+
+    mark, channels = VEGA_LITE[chart_type]
+    assert chart["$schema"] == VEGA_LITE_SCHEMA
+    assert chart["title"] == f"Test {chart_type}"
+    assert chart["mark"]["type"] == mark
+    assert {channel: chart["encoding"][channel]["field"] for channel in channels} == channels
+    assert chart["data"]["values"]
+    # Every field the encoding refers to exists in the data, directly or through the fold
+    folded = {name for transform in chart.get("transform", []) for name in transform.get("as", [])}
+    row_fields = set(chart["data"]["values"][0]) | folded
+    assert set(channels.values()) <= row_fields
+
+
+def test_vega_lite_data_matches_the_aggregated_series():
+    chart = to_vega_lite(make_spec("bar").model_dump())
+
+    totals = {}
+    for row in ROWS:
+        totals[row["region"]] = totals.get(row["region"], 0) + row["sales"]
+    assert {row["region"]: row["sales"] for row in chart["data"]["values"]} == totals
+
+
+def test_grouped_bars_are_offset_and_stacked_bars_are_not():
+    grouped = to_vega_lite(make_spec("bar", y=["sales", "cost"]).model_dump())
+    stacked = to_vega_lite(make_spec("stacked_bar").model_dump())
+
+    assert grouped["encoding"]["xOffset"]["field"] == "series"
+    assert grouped["encoding"]["y"]["stack"] is None
+    assert "xOffset" not in stacked["encoding"]
+
+
+@pytest.mark.parametrize("chart_type, overrides, message", [
+    ("line", {"y": ["sales", "cost"]}, "line chart needs 1 y column(s), got 2"),
+    ("bar", {"y": []}, "bar chart needs at least 1 y column(s), got 0"),
+    ("histogram", {"y": ["sales"]}, "histogram chart needs 0 y column(s), got 1"),
+    ("heatmap", {"value": None}, "heatmap chart needs a value column"),
+    ("bar", {"y": ["profit"]}, "columns not found in data: ['profit']"),
+    ("pie", {"data": []}, "data must contain at least one row"),
+    ("line", {"data": [{"day": 1, "sales": 1}] * (MAX_CHART_ROWS + 1)}, f"at most {MAX_CHART_ROWS} are supported"),
+])
+def test_invalid_specs_are_rejected(chart_type, overrides, message):
+    with pytest.raises(ValidationError, match=re.escape(message)):
+        make_spec(chart_type, **overrides)
+
+
+def test_unknown_chart_type_is_rejected():
+    with pytest.raises(ValidationError):
+        ChartSpec(chart_type="radar", data=ROWS, x="day", y=["sales"])
+
+
+def test_tools_report_invalid_requests_to_the_agent():
+    result = create_chart._run(chart_type="line", data=ROWS, x="day", y=["profit"], title="Profit")
+    assert result.startswith("Invalid chart request: ")
+    assert "profit" in result
+
+    # Per-type tools fix the chart type and ignore the agent's choice
+    result = CHART_TOOLS["pie"]._run(data=ROWS, x="region", y=["sales", "cost"], title="Shares")
+    assert "pie chart needs 1 y column(s), got 2" in result
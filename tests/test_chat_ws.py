@@ -0,0 +1,70 @@
+"""Closing a chat WebSocket stops its queries before their crew slots are released."""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from offline_llm import OfflineCrewService
+
+from app.api.endpoints import chat_ws
+from app.core.tenants import TenantPolicy
+from app.services.scheduler import QueryScheduler
+
+
+class RecordingScheduler(QueryScheduler):
+    """Notes, for every released run, whether its crew still had an LLM call running."""
+
+    def __init__(self, crew_service: OfflineCrewService):
+        super().__init__(1, TenantPolicy())
+        self.crew_service = crew_service
+        self.busy_on_release = []
+
+    def release(self, ticket):
+        if not ticket.released:
+            self.busy_on_release.append(any(
+                llm._slots._value != llm.max_concurrency for llm in self.crew_service._llms.values()
+            ))
+        super().release(ticket)
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.include_router(chat_ws.router)
+    # Slow enough completions that the query is still running when the client leaves
+    app.state.crew_service = OfflineCrewService(latency=0.2)
+    app.state.scheduler = RecordingScheduler(app.state.crew_service)
+    yield app
+    app.state.crew_service.close()
+
+
+def test_binary_frames_get_an_error_frame(app):
+    with TestClient(app).websocket_connect("/ws") as websocket:
+        websocket.send_bytes(b"\x00")
+        frame = websocket.receive_json()
+    assert frame["type"] == "error"
+    assert "binary" in frame["detail"]
+
+
+def test_closing_the_connection_stops_queries_before_releasing_slots(app):
+    crew_service, scheduler = app.state.crew_service, app.state.scheduler
+    with TestClient(app).websocket_connect("/ws") as websocket:
+        websocket.send_json({"type": "query", "id": "q1", "query": "Compare sales by region and revenue by quarter"})
+        assert websocket.receive_json()["type"] == "accepted"
+        # A progress frame means the crew is running and holds its slot
+        assert websocket.receive_json()["type"] in ("step", "tool", "image")
+        # The test client cancels the app as soon as it leaves this block, so
+        # disconnect here and give the server time to wind the run down
+        websocket.send({"type": "websocket.disconnect", "code": 1000})
+        deadline = time.monotonic() + 30
+        while scheduler.stats()["running"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    # The slot was held until the crew stopped, and everything was given back
+    assert scheduler.busy_on_release == [False]
+    stats = scheduler.stats()
+    assert stats["running"] == 0 and stats["queued"] == 0
+    for llm in crew_service._llms.values():
+        assert llm._slots._value == llm.max_concurrency
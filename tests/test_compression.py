@@ -0,0 +1,131 @@
+"""Response compression by Accept-Encoding, and chart thumbnails only when requested."""
+
+import base64
+import os
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from offline_llm import OfflineCrewService
+
+from app.api.endpoints import chat
+from app.core import config
+from app.core.compression import CompressionMiddleware, brotli
+from app.core.tenants import TenantPolicy
+from app.services.artifacts import ArtifactRegistry, current_artifact_registry
+from app.services.scheduler import QueryScheduler
+from app.tools.chart_spec import ChartSpec
+from app.tools.visualization_tools import IMAGE_STORAGE_DIR, save_chart
+
+ANSWER = "East leads regional sales, while West trails the other regions. " * 100
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/answer")
+    def answer():
+        return {"response": ANSWER}
+
+    @app.get("/short")
+    def short():
+        return {"response": "ok"}
+
+    return TestClient(app)
+
+
+def test_gzip_is_negotiated_by_accept_encoding(client):
+    response = client.get("/answer", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(ANSWER) // 4
+    assert response.json()["response"] == ANSWER
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_is_preferred_when_accepted(client):
+    response = client.get("/answer", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.json()["response"] == ANSWER
+
+
+def test_brotli_is_skipped_without_the_package(client):
+    response = client.get("/answer", headers={"Accept-Encoding": "br;q=1, gzip;q=0.5"})
+
+    assert response.headers["content-encoding"] == ("br" if brotli is not None else "gzip")
+
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip;q=0"])
+def test_responses_are_not_compressed_unless_accepted(client, accept_encoding):
+    response = client.get("/answer", headers={"Accept-Encoding": accept_encoding})
+
+    assert "content-encoding" not in response.headers
+    assert response.json()["response"] == ANSWER
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/short", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+
+
+def chart_artifact(inline_thumbnails):
+    registry = ArtifactRegistry(chart_format="png", inline_thumbnails=inline_thumbnails)
+    reset = current_artifact_registry.set(registry)
+    try:
+        image_id = save_chart(ChartSpec(
+            chart_type="bar",
+            data=[{"region": region, "sales": sales} for region, sales in [("East", 10), ("West", 4), ("North", 7)]],
+            x="region",
+            y=["sales"],
+            title="Sales",
+        ))
+    finally:
+        current_artifact_registry.reset(reset)
+    (artifact,) = registry.list(kind="image")
+    assert artifact.id == image_id
+    return artifact
+
+
+def test_thumbnails_are_only_made_when_requested():
+    assert "thumbnail" not in chart_artifact(inline_thumbnails=False).spec
+
+
+def test_thumbnail_is_a_downscaled_chart():
+    artifact = chart_artifact(inline_thumbnails=True)
+    thumbnail = base64.b64decode(artifact.spec["thumbnail"])
+    with open(os.path.join(IMAGE_STORAGE_DIR, f"{artifact.id}.png"), "rb") as f:
+        full = f.read()
+
+    assert max(Image.open(BytesIO(thumbnail)).size) <= config.THUMBNAIL_MAX_PIXELS
+    assert max(Image.open(BytesIO(full)).size) > config.THUMBNAIL_MAX_PIXELS
+    assert len(thumbnail) < len(full)
+
+
+@pytest.mark.parametrize("inline_thumbnails", [False, True])
+def test_query_responses_inline_thumbnails_only_on_request(inline_thumbnails):
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.state.crew_service = OfflineCrewService()
+    app.state.scheduler = QueryScheduler(1, TenantPolicy())
+    try:
+        response = TestClient(app).post(
+            "/query",
+            json={"query": "Sales by region", "chart_format": "png", "inline_thumbnails": inline_thumbnails},
+        )
+    finally:
+        app.state.crew_service.close()
+
+    images = response.json()["images"]
+    assert images
+    for image in images:
+        assert image["url"]
+        assert bool(image["thumbnail"]) == inline_thumbnails
@@ -0,0 +1,81 @@
+"""Compute sandbox: over-limit pipelines fail cleanly and unknown ops are rejected."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import config
+from app.tools import compute_pool
+from app.tools.compute_engine import ComputeError
+from app.tools.compute_tools import compute_data
+
+DATASET = "compute_sandbox"
+ROWS = 200_000
+
+# A 200,000 x 500 pivot needs about 800 MB, well past the workers' budget
+OVER_MEMORY = [{"op": "pivot", "index": "id", "columns": "k", "values": "v", "func": "sum"}]
+# Twenty wide rolling medians take several CPU seconds
+OVER_CPU = [
+    {"op": "rolling", "column": "v", "window": 5000, "func": "median", "name": f"median_{number}"}
+    for number in range(20)
+]
+SMALL = [{"op": "groupby", "by": ["k"], "metrics": [{"column": "v", "func": "sum"}]}, {"op": "limit", "n": 3}]
+
+pytestmark = pytest.mark.skipif(compute_pool.resource is None, reason="resource limits need the POSIX resource module")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    frame = pd.DataFrame({"id": np.arange(ROWS), "k": np.arange(ROWS) % 500, "v": np.random.default_rng(0).random(ROWS)})
+    path = os.path.join(config.DATASETS_DIR, f"{DATASET}.parquet")
+    frame.to_parquet(path, index=False)
+    compute_pool.start_compute_pool(1, cpu_seconds=1, memory_mb=512, timeout=60)
+    yield compute_pool._pool
+    compute_pool.shutdown_compute_pool()
+    os.remove(path)
+
+
+def test_small_pipeline_runs_in_the_pool(pool):
+    result = compute_data._run(dataset_id=DATASET, steps=SMALL)
+
+    assert "Rows: 3" in result
+    assert "k (int), v_sum (float)" in result
+
+
+@pytest.mark.parametrize("steps, limit", [(OVER_MEMORY, "memory limit exceeded"), (OVER_CPU, "CPU time limit exceeded")])
+def test_over_limit_pipeline_fails_without_killing_the_pool(pool, steps, limit):
+    result = compute_data._run(dataset_id=DATASET, steps=steps)
+
+    assert result.startswith(f"Computation stopped: {limit}.")
+    # The worker raised instead of dying, so the same pool serves the next task
+    assert compute_pool._pool is pool
+    assert "Rows: 3" in compute_data._run(dataset_id=DATASET, steps=SMALL)
+
+
+@pytest.mark.parametrize("step", [
+    {"op": "eval", "expr": "__import__('os').system('id')"},
+    {"op": "query", "expr": "v > 0"},
+    {"column": "v"},
+])
+def test_unknown_op_is_rejected_before_running(pool, monkeypatch, step):
+    def fail(*args, **kwargs):
+        raise AssertionError("an invalid pipeline reached the compute pool")
+
+    monkeypatch.setattr("app.tools.compute_tools.run_compute", fail)
+
+    result = compute_data._run(dataset_id=DATASET, steps=[step])
+
+    assert result.startswith("Invalid computation: steps.0")
+
+
+def test_unknown_op_is_rejected_by_the_worker(pool):
+    # Pipelines are validated in the API process; the engine still only dispatches known ops
+    with pytest.raises(ComputeError, match=r"step 1 \(eval\)"):
+        compute_pool.run_compute(
+            os.path.join(config.DATASETS_DIR, f"{DATASET}.parquet"),
+            [{"op": "eval", "expr": "1"}],
+            os.path.join(config.DATASET_RESULTS_DIR, "unused.parquet")
+        )
+    assert compute_pool._pool is pool
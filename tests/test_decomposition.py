@@ -0,0 +1,90 @@
+"""Which questions are split into sub-analyses, and how the parts are merged."""
+
+import asyncio
+
+import pytest
+
+from offline_llm import OfflineCrewService, OfflineLLM
+
+from app.services.artifacts import ArtifactRegistry, current_artifact_registry
+from app.services.decomposition import SubAnalysis, may_have_parts, parse_sub_analyses
+
+
+@pytest.mark.parametrize("query", [
+    "Sales by region and month",
+    "Show sales by region, product and month",
+    "What was revenue last quarter?",
+    "Sales this year compared to last year",
+    "Top customers and their orders",
+])
+def test_single_analyses_skip_the_planner(query):
+    assert not may_have_parts(query)
+
+
+@pytest.mark.parametrize("query", [
+    "Compare revenue, churn and CAC by quarter",
+    "Compare sales by region and revenue by quarter",
+    "Revenue vs cost by month",
+    "What were revenue, margin and churn in 2023",
+    "Revenue by region?\nChurn by plan?",
+    "銷售、利潤和成本",
+])
+def test_several_analyses_go_to_the_planner(query):
+    assert may_have_parts(query)
+
+
+def test_parse_sub_analyses_tolerates_fences_and_caps_parts():
+    text = '```json\n{"sub_analyses": [{"title": "A", "question": "a?"}, {"question": ""}, {"question": "b?"}, {"question": "c?"}]}\n```'
+
+    parts = parse_sub_analyses(text, limit=2)
+
+    assert parts == [SubAnalysis("A", "a?"), SubAnalysis("b?", "b?")]
+    assert parse_sub_analyses("not json", limit=2) == []
+
+
+@pytest.fixture(scope="module")
+def crew_service():
+    service = OfflineCrewService()
+    yield service
+    service.close()
+
+
+def test_decompose_query_calls_the_planner_only_for_multi_part_questions(crew_service):
+    planner = crew_service.get_llm("planner")
+    calls = planner.calls
+
+    assert asyncio.run(crew_service.decompose_query("Sales by region and month")) == []
+    assert planner.calls == calls
+
+    parts = asyncio.run(crew_service.decompose_query("Compare sales by region and revenue by quarter"))
+    assert planner.calls == calls + 1
+    assert [part.question for part in parts] == ["Compare sales by region", "revenue by quarter"]
+
+
+def test_run_parallel_analyses_merges_every_part(crew_service, monkeypatch):
+    prompts = []
+    respond = OfflineLLM.respond
+
+    def recording_respond(self, messages):
+        prompts.append("\n".join(str(message.get("content", "")) for message in messages))
+        return respond(self, messages)
+
+    monkeypatch.setattr(OfflineLLM, "respond", recording_respond)
+    parts = [SubAnalysis("Sales", "Sales by region"), SubAnalysis("Revenue", "Revenue by quarter")]
+    artifacts = ArtifactRegistry()
+    reset = current_artifact_registry.set(artifacts)
+    try:
+        text, usage = asyncio.run(crew_service.run_parallel_analyses(
+            "Compare sales by region and revenue by quarter", parts, "", artifacts
+        ))
+    finally:
+        current_artifact_registry.reset(reset)
+
+    assert text
+    # One chart per part, both handed to the consultant with every part's findings
+    titles = sorted(chart.title for chart in artifacts.list(kind="image"))
+    assert titles == ["Revenue by quarter by region", "Sales by region by region"]
+    merge_prompt = next(prompt for prompt in prompts if "worked on its parts in parallel" in prompt)
+    assert "## Sales" in merge_prompt and "## Revenue" in merge_prompt
+    for title in titles:
+        assert title in merge_prompt
@@ -0,0 +1,137 @@
+"""Per-role LLM settings and tenant policies resolved from defaults, variables and a file."""
+
+import json
+from dataclasses import fields
+
+import pytest
+
+from app.core.llm_roles import ROLES, RoleLLMConfig, load_role_configs
+from app.core.tenants import TenantPolicy, load_tenant_policies
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    """Start from built-in defaults, whatever the test environment sets."""
+    for field in fields(RoleLLMConfig):
+        for prefix in ["LLM_"] + [f"LLM_{role.upper()}_" for role in ROLES]:
+            monkeypatch.delenv(f"{prefix}{field.name.upper()}", raising=False)
+    for field in fields(TenantPolicy):
+        monkeypatch.delenv(f"SCHEDULER_TENANT_{field.name.upper()}", raising=False)
+    monkeypatch.delenv("LLM_ROLES_FILE", raising=False)
+    monkeypatch.delenv("SCHEDULER_TENANTS_FILE", raising=False)
+
+
+def write_json(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_roles_default_to_built_in_settings():
+    assert load_role_configs() == {role: RoleLLMConfig() for role in ROLES}
+
+
+def test_role_layers_resolve_per_role(tmp_path, monkeypatch):
+    # 2. shared variables
+    monkeypatch.setenv("LLM_MODEL", "gpt-4o")
+    monkeypatch.setenv("LLM_TIMEOUT", "60")
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "4")
+    # 3. file: a default section, then role sections
+    monkeypatch.setenv("LLM_ROLES_FILE", write_json(tmp_path, "roles.json", {
+        "default": {"temperature": 0.3, "max_concurrency": 8},
+        "planner": {"model": "openai/qwen2.5-7b-instruct", "base_url": "http://localhost:8001/v1", "rate_limited": False},
+        "manager": {"max_tokens": 256},
+    }))
+    # 4. per-role variables
+    monkeypatch.setenv("LLM_PLANNER_TIMEOUT", "5")
+    monkeypatch.setenv("LLM_ANALYST_MODEL", "gpt-4.1")
+    monkeypatch.setenv("LLM_ANALYST_RATE_LIMITED", "no")
+
+    roles = load_role_configs()
+
+    assert roles["planner"] == RoleLLMConfig(
+        model="openai/qwen2.5-7b-instruct", temperature=0.3, timeout=5.0, max_concurrency=8,
+        base_url="http://localhost:8001/v1", rate_limited=False
+    )
+    assert roles["manager"] == RoleLLMConfig(
+        model="gpt-4o", temperature=0.3, max_tokens=256, timeout=60.0, max_concurrency=8
+    )
+    assert roles["analyst"] == RoleLLMConfig(
+        model="gpt-4.1", temperature=0.3, timeout=60.0, max_concurrency=8, rate_limited=False
+    )
+
+
+def test_role_variable_overrides_role_file_section(tmp_path, monkeypatch):
+    path = write_json(tmp_path, "roles.json", {"analyst": {"model": "gpt-4o", "temperature": 0.0}})
+    monkeypatch.setenv("LLM_ANALYST_MODEL", "gpt-4.1")
+
+    roles = load_role_configs(path)
+
+    assert (roles["analyst"].model, roles["analyst"].temperature) == ("gpt-4.1", 0.0)
+    assert roles["planner"].model == "gpt-4o-mini"
+
+
+def test_null_clears_only_optional_role_settings(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_MAX_TOKENS", "1024")
+    monkeypatch.setenv("LLM_BASE_URL", "http://localhost:8001/v1")
+    path = write_json(tmp_path, "roles.json", {"analyst": {"max_tokens": None, "base_url": None, "model": None}})
+
+    roles = load_role_configs(path)
+
+    assert (roles["analyst"].max_tokens, roles["analyst"].base_url, roles["analyst"].model) == (None, None, "gpt-4o-mini")
+    assert (roles["planner"].max_tokens, roles["planner"].base_url) == (1024, "http://localhost:8001/v1")
+
+
+def test_roles_yaml_file(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "roles.yaml"
+    path.write_text("default:\n  timeout: 30\nplanner:\n  model: openai/llama3\n  rate_limited: false\n")
+
+    roles = load_role_configs(str(path))
+
+    assert (roles["planner"].model, roles["planner"].timeout, roles["planner"].rate_limited) == ("openai/llama3", 30.0, False)
+    assert (roles["analyst"].model, roles["analyst"].timeout) == ("gpt-4o-mini", 30.0)
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"reviewer": {"model": "gpt-4o"}}, "Unknown roles in .*: reviewer"),
+    ({"planner": {"modle": "gpt-4o"}}, r"Unknown LLM settings in .* \(planner\): modle"),
+    (["planner"], "must contain a mapping of roles to settings"),
+])
+def test_invalid_roles_file_is_rejected(tmp_path, data, message):
+    with pytest.raises(ValueError, match=message):
+        load_role_configs(write_json(tmp_path, "roles.json", data))
+
+
+def test_tenant_layers_resolve_per_tenant(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCHEDULER_TENANT_MAX_QUEUED", "10")
+    monkeypatch.setenv("SCHEDULER_TENANT_TOKENS_PER_MINUTE", "50000")
+    # Keys never come from the default policy's variables
+    monkeypatch.setenv("SCHEDULER_TENANT_API_KEYS", "shared-key")
+    monkeypatch.setenv("SCHEDULER_TENANTS_FILE", write_json(tmp_path, "tenants.json", {
+        "default": {"max_concurrency": 2},
+        "analysts": {"weight": 3, "max_concurrency": 6},
+        "reporting": {"api_keys": ["nightly-key"], "weight": 0.5, "tokens_per_minute": 200000},
+        "gateway": None,
+    }))
+
+    default, tenants = load_tenant_policies()
+
+    assert default == TenantPolicy(max_concurrency=2, max_queued=10, tokens_per_minute=50000)
+    assert tenants == {
+        "analysts": TenantPolicy(weight=3.0, max_concurrency=6, max_queued=10, tokens_per_minute=50000),
+        "reporting": TenantPolicy(
+            weight=0.5, max_concurrency=2, max_queued=10, tokens_per_minute=200000, api_keys=("nightly-key",)
+        ),
+        "gateway": default,
+    }
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"a": {"api_keys": "key-1, key-2"}, "b": {"api_keys": ["key-2"]}}, "API key listed by both a and b"),
+    ({"a": {"weight": 0}}, r"Tenant weight must be positive in .* \(a\)"),
+    ({"default": {"priority": 1}}, r"Unknown tenant settings in .* \(default\): priority"),
+])
+def test_invalid_tenants_file_is_rejected(tmp_path, data, message):
+    with pytest.raises(ValueError, match=message):
+        load_tenant_policies(write_json(tmp_path, "tenants.json", data))
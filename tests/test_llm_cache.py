@@ -0,0 +1,110 @@
+"""Memoization of LLM completions by ManagedLLM through LLMResponseCache."""
+
+import itertools
+
+import pytest
+
+from offline_llm import OfflineLLM
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache
+
+MESSAGES = [{"role": "user", "content": "Plan the analysis of sales by region"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # conftest disables the service's cache; these tests use their own database
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=10, max_temperature=0.2)
+    yield cache
+    cache.close()
+
+
+def make_llm(cache, temperature=0.0):
+    return OfflineLLM(role="planner", cache=cache, temperature=temperature)
+
+
+def test_repeated_call_is_served_from_the_cache(cache):
+    llm = make_llm(cache)
+
+    first = llm.call(MESSAGES)
+    second = llm.call(MESSAGES)
+
+    assert second == first
+    assert llm.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["stores"] == 1
+
+
+def test_different_messages_miss(cache):
+    llm = make_llm(cache)
+
+    llm.call(MESSAGES)
+    llm.call([{"role": "user", "content": "Plan the analysis of revenue by quarter"}])
+
+    assert llm.calls == 2
+    assert cache.stats()["hits"] == 0
+
+
+def test_cached_completions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    first = LLMResponseCache(path)
+    make_llm(first).call(MESSAGES)
+    first.close()
+
+    second = LLMResponseCache(path)
+    llm = make_llm(second)
+    llm.call(MESSAGES)
+    second.close()
+
+    assert llm.calls == 0
+
+
+def test_calls_with_tools_bypass_the_cache(cache):
+    llm = make_llm(cache)
+    tools = [{"type": "function", "function": {"name": "create_chart", "parameters": {}}}]
+
+    llm.call(MESSAGES, tools=tools)
+    llm.call(MESSAGES, tools=tools)
+
+    assert llm.calls == 2
+    assert cache.stats()["stores"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_calls_above_the_temperature_limit_bypass_the_cache(cache):
+    llm = make_llm(cache, temperature=0.7)
+
+    llm.call(MESSAGES)
+    llm.call(MESSAGES)
+
+    assert llm.calls == 2
+    assert cache.stats()["stores"] == 0
+
+
+def test_key_is_stable_and_covers_everything_that_shapes_a_completion():
+    key = LLMResponseCache.make_key("gpt-4o-mini", 0.0, MESSAGES, ["\nObservation:"])
+
+    # Same inputs, even with the message fields in another order, give the same key
+    reordered = [{"content": MESSAGES[0]["content"], "role": "user"}]
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.0, reordered, ["\nObservation:"]) == key
+    assert len(key) == 64
+
+    assert LLMResponseCache.make_key("gpt-4o", 0.0, MESSAGES, ["\nObservation:"]) != key
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.1, MESSAGES, ["\nObservation:"]) != key
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.0, MESSAGES) != key
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.0, MESSAGES + MESSAGES, ["\nObservation:"]) != key
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    # A clock that ticks on every read, so no two entries share a last_used time
+    ticks = itertools.count(1)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(ticks)))
+    for index in range(10):
+        cache.set(f"key-{index}", "offline/stub", f"response {index}")
+    # Touch the oldest entry so it is kept
+    assert cache.get("key-0") == "response 0"
+
+    cache.set("key-10", "offline/stub", "response 10")
+
+    assert cache.stats()["entries"] == 9
+    assert cache.get("key-0") == "response 0"
+    assert cache.get("key-1") is None
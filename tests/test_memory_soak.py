@@ -0,0 +1,31 @@
+"""A shortened run of the memory soak benchmark (benchmarks/memory_soak.py)."""
+
+import argparse
+import asyncio
+
+import pytest
+
+from app.tools import visualization_tools
+
+
+@pytest.mark.slow
+def test_memory_stays_flat_over_repeated_queries(monkeypatch):
+    import memory_soak
+
+    # The soak points chart output at its scratch directory; put it back afterwards
+    monkeypatch.setattr(visualization_tools, "IMAGE_STORAGE_DIR", visualization_tools.IMAGE_STORAGE_DIR)
+    # Allocator arenas make RSS step by 10-20 MB now and then; a short run gets
+    # a wider margin than the CLI default so only steady growth fails it
+    args = argparse.Namespace(
+        requests=200, warmup=100, concurrency=4, sample_every=100, max_growth_mb=50,
+        tracemalloc=False, latency=0.0, answer_chars=2000
+    )
+
+    report = asyncio.run(memory_soak.soak(args))
+
+    baseline, final = report["baseline"], report["final"]
+    assert report["failures"] == 0
+    assert final["rss_mb"] - baseline["rss_mb"] <= args.max_growth_mb
+    for label in ("crewai_agents", "crewai_crews", "matplotlib_figures"):
+        assert final.get(label, 0) <= baseline.get(label, 0), f"{label} grew"
+    assert report["problems"] == []
@@ -0,0 +1,113 @@
+"""Metadata catalog retrieval over a small fixture catalog, with hashed embeddings."""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from app.services.datasets import DatasetCatalog
+from app.services.metadata_catalog import MetadataCatalog, tokenize
+
+DATASETS = {
+    "orders": (
+        {"order_id": [1, 2], "order_date": ["2024-01-01", "2024-02-01"], "revenue": [120.0, 80.5],
+         "discount": [0.1, 0.0], "region": ["East", "West"]},
+        {"description": "One row per order",
+         "columns": {"revenue": "Net revenue in USD", "discount": "Price reduction granted on the order"}},
+    ),
+    "customers": (
+        {"customer_id": [1, 2], "signup_date": ["2023-05-01", "2023-09-12"], "churned": [True, False],
+         "country": ["FR", "DE"]},
+        {"description": "One row per customer account",
+         "columns": {"churned": "Whether the customer cancelled their subscription"}},
+    ),
+    "web_sessions": (
+        {"session_id": [1, 2], "page_views": [3, 1], "bounce_rate": [0.5, 1.0], "device": ["mobile", "desktop"]},
+        {"description": "Website visits", "columns": {"bounce_rate": "Share of single-page visits"}},
+    ),
+}
+
+PAST_QUESTIONS = [
+    {"query": "Monthly revenue trend for the East region", "context": {}, "runs": 5},
+    {"query": "How many customers churned last quarter", "context": {}, "runs": 2},
+]
+
+
+class FakeHistory:
+    """The part of QueryHistoryStore the catalog reads."""
+
+    def top_queries(self, limit, since=None):
+        return PAST_QUESTIONS[:limit]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    datasets_dir = tmp_path / "datasets"
+    datasets_dir.mkdir()
+    for name, (columns, descriptions) in DATASETS.items():
+        pd.DataFrame(columns).to_csv(datasets_dir / f"{name}.csv", index=False)
+        (datasets_dir / f"{name}.meta.json").write_text(json.dumps(descriptions))
+    datasets = DatasetCatalog(str(datasets_dir), str(tmp_path / "results"))
+    return MetadataCatalog(datasets, query_history=FakeHistory(), embeddings="hashing")
+
+
+def ranked(catalog, query, kind):
+    return [document.id for document in catalog.retrieve(query) if document.kind == kind]
+
+
+@pytest.mark.parametrize("query, table, column", [
+    ("total revenue by region", "orders", "revenue"),
+    ("which customers churned", "customers", "churned"),
+    ("page views per device", "web_sessions", "page_views"),
+    # Matched through the column descriptions only
+    ("price reduction on each order", "orders", "discount"),
+    ("cancelled subscriptions by country", "customers", "churned"),
+])
+def test_lexical_query_ranks_expected_table_and_column_first(catalog, query, table, column):
+    assert ranked(catalog, query, "table")[0] == f"table:{table}"
+    assert ranked(catalog, query, "column")[0] == f"column:{table}.{column}"
+
+
+@pytest.mark.parametrize("query, table, column", [
+    ("bouncing visitors", "web_sessions", "bounce_rate"),
+    ("discounted", "orders", "discount"),
+    ("pageviews", "web_sessions", "page_views"),
+    ("countries", "customers", "country"),
+])
+def test_semantic_query_ranks_expected_table_and_column_first(catalog, query, table, column):
+    catalog.refresh(force=True)
+    vocabulary = {term for document in catalog._index.documents for term in tokenize(document.text)}
+    # No term in common, so only the embeddings can find the match
+    assert not set(tokenize(query)) & vocabulary
+
+    assert ranked(catalog, query, "table")[0] == f"table:{table}"
+    assert ranked(catalog, query, "column")[0] == f"column:{table}.{column}"
+
+
+def test_unrelated_query_retrieves_nothing(catalog):
+    assert catalog.retrieve("weather forecast for tomorrow") == []
+    assert catalog.prompt_section("weather forecast for tomorrow") == ""
+
+
+def test_similar_past_question_is_retrieved(catalog):
+    documents = catalog.retrieve("revenue trend in the East region")
+
+    assert [document.text for document in documents if document.kind == "query"][0] == PAST_QUESTIONS[0]["query"]
+    section = catalog.prompt_section("revenue trend in the East region")
+    assert section.startswith("- orders (2 rows, 5 columns): One row per order\n    revenue (float): Net revenue in USD")
+    assert "Similar questions answered before:\n- Monthly revenue trend for the East region" in section
+
+
+def test_changed_description_is_reindexed(catalog):
+    assert ranked(catalog, "shipping carrier", "table") == []
+
+    path = os.path.join(catalog.datasets.datasets_dir, "orders.meta.json")
+    descriptions = DATASETS["orders"][1]
+    with open(path, "w") as f:
+        json.dump({**descriptions, "columns": {**descriptions["columns"], "region": "Shipping carrier region"}}, f)
+    os.utime(path, ns=(0, 0))
+    catalog.refresh(force=True)
+
+    assert ranked(catalog, "shipping carrier", "column")[0] == "column:orders.region"
+    assert catalog.stats()["sources_reindexed"] == len(DATASETS) + len(PAST_QUESTIONS) + 1
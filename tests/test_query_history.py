@@ -0,0 +1,164 @@
+"""Query history: records written for every run outcome, and replays of the top queries."""
+
+import asyncio
+import time
+
+import pytest
+
+from offline_llm import OfflineCrewService, OfflineLLM
+
+from app.core import config
+from app.core.tenants import TenantPolicy
+from app.services.cancellation import CancellationToken, CrewCancelledError
+from app.services.query_history import QueryHistoryStore, QueryRecord
+from app.services.rate_limiter import BATCH
+from app.services.scheduler import REPLAY_TENANT, QueryScheduler
+
+
+def run(query: str, route: str = "query", status: str = "ok", created_at: float = None, **fields) -> QueryRecord:
+    return QueryRecord(
+        run_id=f"{query}-{time.perf_counter_ns()}", query=query, route=route, status=status,
+        created_at=created_at or time.time(), **fields
+    )
+
+
+def wait_written(store: QueryHistoryStore, count: int, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while store.stats()["written"] < count:
+        assert time.monotonic() < deadline, f"history writer wrote {store.stats()['written']} of {count} records"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QueryHistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def crew_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_ENABLED", True)
+    monkeypatch.setattr(config, "HISTORY_PATH", str(tmp_path / "history.db"))
+    # Slow enough completions that a run is still in flight when cancelled
+    service = OfflineCrewService(latency=0.1)
+    yield service
+    service.close()
+
+
+def test_top_queries_ranks_successful_runs_by_frequency(store):
+    old = time.time() - 86400
+    records = (
+        [run("Sales by region")] * 4
+        + [run("Revenue by quarter", context={"year": 2024})] * 2
+        + [run("revenue  BY quarter", context={"year": 2024})]
+        + [run("Top products")]
+        # Failures and replays do not count, nor do runs before `since`
+        + [run("Broken query", status="error")] * 5
+        + [run("Cancelled query", status="cancelled")] * 5
+        + [run("Replayed query", route="replay")] * 5
+        + [run("Old query", created_at=old)] * 5
+    )
+    for record in records:
+        store.record(record)
+    wait_written(store, len(records))
+
+    top = store.top_queries(10, since=old + 1)
+
+    # Repeats are grouped by fingerprint, ignoring case and whitespace
+    assert [(" ".join(entry["query"].lower().split()), entry["runs"]) for entry in top] == [
+        ("sales by region", 4), ("revenue by quarter", 3), ("top products", 1)
+    ]
+    assert top[1]["context"] == {"year": 2024}
+    assert [entry["query"] for entry in store.top_queries(1)] == ["Old query"]
+
+
+def test_records_survive_reopening(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = QueryHistoryStore(path)
+    store.record(run("Sales by region", chart_ids=["chart-1"], token_usage={"total_tokens": 120}))
+    # close() writes everything still queued
+    store.close()
+
+    reopened = QueryHistoryStore(path)
+    try:
+        [entry] = reopened.recent()
+        assert (entry["query"], entry["status"], entry["chart_ids"]) == ("Sales by region", "ok", ["chart-1"])
+        assert reopened.stats()["total_tokens"] == 120
+    finally:
+        reopened.close()
+
+
+def test_successful_run_is_recorded(crew_service):
+    asyncio.run(crew_service.process_query_with_crew("Sales by region", context={"year": 2024}, route="query"))
+    wait_written(crew_service.query_history, 1)
+
+    [entry] = crew_service.query_history.recent()
+    assert (entry["query"], entry["route"], entry["status"], entry["error"]) == ("Sales by region", "query", "ok", None)
+    assert entry["context"] == {"year": 2024}
+    assert entry["total_ms"] > 0
+    assert entry["stages_ms"]["crew"] > 0
+    assert entry["token_usage"]
+
+
+def test_failed_run_is_recorded(crew_service, monkeypatch):
+    def fail(self, messages):
+        raise RuntimeError("provider exploded")
+
+    monkeypatch.setattr(OfflineLLM, "respond", fail)
+
+    with pytest.raises(Exception):
+        asyncio.run(crew_service.process_query_with_crew("Sales by region", route="query"))
+    wait_written(crew_service.query_history, 1)
+
+    [entry] = crew_service.query_history.recent()
+    assert entry["status"] == "error"
+    assert "provider exploded" in entry["error"]
+
+
+def test_cancelled_run_is_recorded(crew_service):
+    token = CancellationToken()
+
+    async def cancel_after_first_llm_call() -> None:
+        while not any(llm.calls for llm in crew_service._llms.values()):
+            await asyncio.sleep(0.01)
+        token.cancel("client disconnected")
+
+    async def run_and_cancel() -> None:
+        canceller = asyncio.create_task(cancel_after_first_llm_call())
+        try:
+            await crew_service.process_query_with_crew("Sales by region", cancel_token=token, route="stream")
+        finally:
+            canceller.cancel()
+
+    with pytest.raises(CrewCancelledError):
+        asyncio.run(run_and_cancel())
+    wait_written(crew_service.query_history, 1)
+
+    [entry] = crew_service.query_history.recent()
+    assert (entry["route"], entry["status"]) == ("stream", "cancelled")
+    assert entry["total_ms"] > 0
+
+
+def test_replay_runs_the_most_frequent_queries(crew_service):
+    history = crew_service.query_history
+    seeded = [run("Sales by region")] * 3 + [run("Revenue by quarter")] * 2 + [run("Top products")]
+    for record in seeded:
+        history.record(record)
+    wait_written(history, len(seeded))
+    scheduler = QueryScheduler(1, TenantPolicy())
+
+    summary = asyncio.run(crew_service.replay_top_queries(2, scheduler, parallelism=2))
+
+    assert summary["queries"] == ["Sales by region", "Revenue by quarter"]
+    assert (summary["succeeded"], summary["failed"]) == (2, 0)
+    # Each replay took a crew slot under the replay tenant
+    assert scheduler.stats()["tenants"][REPLAY_TENANT]["completed"] == 2
+    wait_written(history, len(seeded) + 2)
+    replays = [entry for entry in history.recent() if entry["route"] == "replay"]
+    assert sorted(entry["query"] for entry in replays) == ["Revenue by quarter", "Sales by region"]
+    assert {(entry["priority"], entry["status"]) for entry in replays} == {(BATCH, "ok")}
+    # Replays do not make their queries look more popular
+    assert [(entry["query"], entry["runs"]) for entry in history.top_queries(2)] == [
+        ("Sales by region", 3), ("Revenue by quarter", 2)
+    ]
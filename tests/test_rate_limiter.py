@@ -0,0 +1,215 @@
+"""Token buckets, priority lanes, AIMD and the circuit breaker of the LLM rate limiter."""
+
+import threading
+import time
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.cancellation import CrewCancelledError
+from app.services.rate_limiter import BATCH, INTERACTIVE, LLMRateLimiter, LLMUnavailableError, TokenBucket
+
+
+class FakeTime:
+    """Stands in for the time module inside rate_limiter; the clock only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+class Timeout(Exception):
+    """Named like the provider's timeout error, which the limiter treats as transient."""
+
+
+class RateLimitError(Exception):
+    """Named like the provider's 429 error."""
+
+
+def fail(error):
+    def fn():
+        raise error
+    return fn
+
+
+def wait_until(condition, timeout=5.0):
+    # Real time: the limiter's waiters poll at least every _WAIT_SLICE seconds
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.advance(0.5)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+
+    clock.advance(600)
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.tokens == pytest.approx(60)
+    # Requests larger than the bucket wait only for a full bucket
+    assert bucket.wait_time(1000) == 0.0
+
+
+def test_bucket_rate_change_applies_from_now(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    bucket.set_rate(30)
+    assert bucket.wait_time(1) == pytest.approx(2.0)
+
+
+def test_interactive_calls_are_admitted_before_waiting_batch_calls(clock):
+    # A single request per minute: the first call empties the bucket
+    limiter = LLMRateLimiter(requests_per_minute=1, tokens_per_minute=10**9, queue_timeout=3600)
+    limiter.acquire(1)
+    admitted = []
+
+    def acquire(priority):
+        limiter.acquire(1, priority)
+        admitted.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=(BATCH,))]
+    threads[0].start()
+    wait_until(lambda: limiter.snapshot()["queue_depth"][BATCH] == 1)
+    threads.append(threading.Thread(target=acquire, args=(INTERACTIVE,)))
+    threads[1].start()
+    wait_until(lambda: limiter.snapshot()["queue_depth"][INTERACTIVE] == 1)
+
+    # One request's worth of refill: the later interactive call goes first
+    clock.advance(60)
+    wait_until(lambda: admitted)
+    assert admitted == [INTERACTIVE]
+    clock.advance(60)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert admitted == [INTERACTIVE, BATCH]
+
+
+def test_queue_timeout_fails_fast_when_buckets_cannot_refill_in_time(clock):
+    limiter = LLMRateLimiter(requests_per_minute=1, tokens_per_minute=10**9, queue_timeout=5)
+    limiter.acquire(1)
+
+    with pytest.raises(LLMUnavailableError) as error:
+        limiter.acquire(1)
+
+    assert error.value.retry_after == pytest.approx(60)
+    assert limiter.snapshot()["rejected_queue_timeout"] == 1
+
+
+def test_rate_limit_errors_halve_the_request_rate_and_successes_recover_it(clock):
+    limiter = LLMRateLimiter(requests_per_minute=100, tokens_per_minute=10**9, max_retries=0)
+
+    with pytest.raises(RateLimitError):
+        limiter.call(fail(RateLimitError()), tokens=1)
+    assert limiter.snapshot()["current_requests_per_minute"] == 50
+
+    limiter.call(lambda: "ok", tokens=1)
+    assert limiter.snapshot()["current_requests_per_minute"] == 51
+
+
+def test_transient_errors_are_retried_with_backoff(clock):
+    limiter = LLMRateLimiter(requests_per_minute=10**6, tokens_per_minute=10**9, max_retries=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(clock.now)
+        if len(attempts) < 3:
+            raise Timeout()
+        return "ok"
+
+    assert limiter.call(flaky, tokens=1) == "ok"
+    assert limiter.snapshot()["retries"] == 2
+    assert limiter.snapshot()["circuit_state"] == "closed"
+
+
+def open_circuit(limiter):
+    for _ in range(limiter.failure_threshold):
+        with pytest.raises(Timeout):
+            limiter.call(fail(Timeout()), tokens=1)
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    limiter = LLMRateLimiter(
+        requests_per_minute=10**6, tokens_per_minute=10**9, max_retries=0, failure_threshold=2, cooldown=30
+    )
+    open_circuit(limiter)
+    assert limiter.snapshot()["circuit_state"] == "open"
+
+    # Open: calls fail fast without reaching the provider
+    calls = []
+    with pytest.raises(LLMUnavailableError):
+        limiter.call(lambda: calls.append(1), tokens=1)
+    assert not calls
+
+    # After the cooldown one probe goes through; a failed probe reopens at once
+    clock.advance(30)
+    with pytest.raises(Timeout):
+        limiter.call(fail(Timeout()), tokens=1)
+    assert limiter.snapshot()["circuit_state"] == "open"
+    assert limiter.snapshot()["circuit_opens"] == 2
+
+    # A successful probe closes the circuit; concurrent calls are rejected meanwhile
+    clock.advance(30)
+    states = []
+
+    def probe():
+        states.append(limiter.snapshot()["circuit_state"])
+        with pytest.raises(LLMUnavailableError):
+            limiter.call(lambda: "second", tokens=1)
+        return "ok"
+
+    assert limiter.call(probe, tokens=1) == "ok"
+    assert states == ["half_open"]
+    assert limiter.snapshot()["circuit_state"] == "closed"
+    assert limiter.call(lambda: "ok", tokens=1) == "ok"
+
+
+def test_cancelled_probe_lets_the_next_call_probe(clock):
+    limiter = LLMRateLimiter(
+        requests_per_minute=10**6, tokens_per_minute=10**9, max_retries=0, failure_threshold=1, cooldown=30
+    )
+    open_circuit(limiter)
+    clock.advance(30)
+
+    with pytest.raises(CrewCancelledError):
+        limiter.call(fail(CrewCancelledError("client disconnected")), tokens=1)
+
+    # The cancelled run neither held on to the probe nor counted as a provider failure
+    assert limiter.snapshot()["circuit_opens"] == 1
+    assert limiter.call(lambda: "ok", tokens=1) == "ok"
+    assert limiter.snapshot()["circuit_state"] == "closed"
+
+
+def test_probe_timed_out_in_the_queue_is_released(clock):
+    limiter = LLMRateLimiter(
+        requests_per_minute=1, tokens_per_minute=10**9, queue_timeout=5,
+        max_retries=0, failure_threshold=1, cooldown=30
+    )
+    open_circuit(limiter)
+    clock.advance(30)
+
+    # The request bucket is empty, so the probe never reaches the provider
+    with pytest.raises(LLMUnavailableError, match="queue timeout"):
+        limiter.call(lambda: "ok", tokens=1)
+
+    clock.advance(60)
+    assert limiter.call(lambda: "ok", tokens=1) == "ok"
@@ -0,0 +1,138 @@
+"""Fair queuing, per-tenant quotas and admission errors of the query scheduler."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from offline_llm import OfflineCrewService
+
+from app.api.endpoints import chat
+from app.core.tenants import TenantPolicy
+from app.services.rate_limiter import BATCH
+from app.services.scheduler import QueryScheduler, QueueRejectedError
+
+
+async def admission_order(scheduler, arrivals):
+    """Queue one request per entry of `arrivals` (tenant, priority), then run them one by one."""
+    pending = []
+    for tenant, priority in arrivals:
+        pending.append((tenant, asyncio.create_task(scheduler.acquire(tenant, priority))))
+        # Let the request reach the queue before the next one arrives
+        await asyncio.sleep(0)
+    order = []
+    while pending:
+        done, _ = await asyncio.wait([task for _, task in pending], return_when=asyncio.FIRST_COMPLETED)
+        for entry in [entry for entry in pending if entry[1] in done]:
+            pending.remove(entry)
+            order.append(entry[0])
+            scheduler.release(entry[1].result())
+    return order
+
+
+def test_backlogged_tenant_does_not_starve_a_light_one():
+    scheduler = QueryScheduler(1, TenantPolicy())
+    arrivals = [("heavy", "interactive")] * 6 + [("light", "interactive")] * 2
+
+    order = asyncio.run(admission_order(scheduler, arrivals))
+
+    # The light tenant's requests are interleaved with the heavy backlog, not served after it
+    assert order[:4].count("light") == 2
+    assert order.count("heavy") == 6
+
+
+def test_weights_split_capacity_between_backlogged_tenants():
+    scheduler = QueryScheduler(1, TenantPolicy(), {"gold": TenantPolicy(weight=2.0)})
+    arrivals = [("gold", "interactive"), ("bronze", "interactive")] * 6
+
+    order = asyncio.run(admission_order(scheduler, arrivals))
+
+    assert order[:6].count("gold") == 4
+
+
+def test_interactive_requests_go_before_batch():
+    scheduler = QueryScheduler(1, TenantPolicy())
+    arrivals = [("a", BATCH)] * 3 + [("b", "interactive")]
+
+    order = asyncio.run(admission_order(scheduler, arrivals))
+
+    # The first batch request was admitted on arrival; the interactive one is next
+    assert order[:2] == ["a", "b"]
+
+
+def test_full_tenant_queue_is_rejected_without_affecting_others():
+    scheduler = QueryScheduler(2, TenantPolicy(), {"small": TenantPolicy(max_concurrency=1, max_queued=1)})
+
+    async def run():
+        first = await scheduler.acquire("small")
+        waiting = asyncio.create_task(scheduler.acquire("small"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueRejectedError) as rejected:
+            await scheduler.acquire("small")
+        # The tenant's concurrency limit holds the second request back, not the global one
+        other = await scheduler.acquire("other")
+        assert not waiting.done()
+        scheduler.release(first)
+        scheduler.release(await waiting)
+        scheduler.release(other)
+        return rejected.value
+
+    error = asyncio.run(run())
+    assert error.retry_after >= 1
+    assert scheduler.stats()["tenants"]["small"]["rejected"] == 1
+
+
+def test_tenant_over_its_token_quota_waits_until_rejected():
+    scheduler = QueryScheduler(
+        4, TenantPolicy(), {"metered": TenantPolicy(tokens_per_minute=60)}, queue_timeout=0.3
+    )
+
+    async def run():
+        ticket = await scheduler.acquire("metered")
+        ticket.tokens = 60
+        scheduler.release(ticket)
+        # The bucket is empty: no new run starts although crews are free
+        with pytest.raises(QueueRejectedError):
+            await scheduler.acquire("metered")
+        scheduler.release(await scheduler.acquire("unmetered"))
+
+    asyncio.run(run())
+    stats = scheduler.stats()["tenants"]
+    assert stats["metered"]["timed_out"] == 1
+    assert stats["metered"]["tokens"] == 60
+    assert stats["unmetered"]["completed"] == 1
+
+
+@pytest.fixture(scope="module")
+def crew_service():
+    service = OfflineCrewService()
+    yield service
+    service.close()
+
+
+def make_app(scheduler, crew_service):
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.state.scheduler = scheduler
+    app.state.crew_service = crew_service
+    return app
+
+
+def test_rejected_query_returns_429_with_retry_after(crew_service):
+    app = make_app(QueryScheduler(1, TenantPolicy(max_queued=0)), crew_service)
+
+    response = TestClient(app).post("/query", json={"query": "Sales by region"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "X-Queue-Wait-Ms" in response.headers
+
+
+def test_admitted_query_reports_its_queue_wait(crew_service):
+    app = make_app(QueryScheduler(1, TenantPolicy()), crew_service)
+
+    response = TestClient(app).post("/query", json={"query": "Sales by region"})
+
+    assert response.status_code == 200
+    assert float(response.headers["X-Queue-Wait-Ms"]) >= 0
@@ -0,0 +1,19 @@
+from app.services.session_store import ConversationTurn, SessionStore
+
+
+def test_summary_describes_charts_by_spec():
+    store = SessionStore()
+    store.record_turn("s", ConversationTurn(
+        query="Revenue by month?",
+        response="Revenue grew.",
+        charts=[
+            {"title": "Revenue", "chart_type": "bar", "x": "month", "y": ["revenue", "cost"], "value": None},
+            {"title": "Sales", "chart_type": "heatmap", "x": "month", "y": ["region"], "value": "sales"},
+        ],
+    ))
+
+    summary = store.summarize("s")
+
+    assert "Chart: bar chart 'Revenue' of revenue, cost by month" in summary
+    assert "Chart: heatmap chart 'Sales' of sales by month and region" in summary
+    assert "Image ID" not in summary